@@ -0,0 +1,46 @@
+# ------------------------------------------------------------
+# アルミニウム合金 RAG パッケージ
+# ------------------------------------------------------------
+# - `import alloy_rag` 自体は標準ライブラリしか読み込まない
+# - 公開名は初めて参照された時点でサブモジュールを読み込む（PEP 562）
+#   → pandas / numpy はエンジンを使う時点まで、openpyxl は
+#     スナップショットが無く .xlsx をパースする時点まで読み込まれない
+# ------------------------------------------------------------
+
+import importlib
+from pathlib import Path
+
+# GitHub に置くデフォルトデータのパス
+DEFAULT_DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "temp_data.xlsx"
+
+# 公開名 -> 定義しているサブモジュール
+_LAZY_EXPORTS = {
+    "AluminumAlloyRAG": "engine",
+    "AlloyAPI": "api",
+    "KnowledgeBaseLease": "kb_registry",
+    "KnowledgeBaseRegistry": "kb_registry",
+    "ResponseCache": "response_cache",
+    "file_sha256": "hashing",
+    "read_workbook": "workbook_cache",
+    "iter_markdown": "renderers",
+    "render_markdown": "renderers",
+    "to_json": "renderers",
+    "to_table": "renderers",
+    "paginate": "results",
+    "paged_length": "results",
+}
+
+__all__ = ["DEFAULT_DATA_PATH", *_LAZY_EXPORTS]
+
+
+def __getattr__(name: str):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
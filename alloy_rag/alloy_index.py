@@ -0,0 +1,344 @@
+# ------------------------------------------------------------
+# 合金記号の転置インデックス（全シート横断）
+# ------------------------------------------------------------
+# - 正規化した合金記号（"6061", "6061-T6"）-> (シート番号, 行番号) の
+#   ポスティングを build_indexes で 1 度だけ作る
+# - 合金番号は前後が数字でない 4 桁のみを拾うので、
+#   "16061" や "0.6061" のような数値の一部には一致しない
+# ------------------------------------------------------------
+
+import re
+import unicodedata
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .workbook_cache import remap_sheet_ids
+
+TEMPER_PATTERN = r"(?:T\d+|H\d+|O|F|W)"
+
+# セル内テキスト中の合金記号（A6061 / AA6061 / 6061 / A6061-T6）
+_DESIGNATION_RE = re.compile(
+    r"(?<![0-9A-Z.])(?:AA|A)?(\d{4})(?:-(" + TEMPER_PATTERN + r"))?(?![0-9]|\.[0-9])"
+)
+# 問い合わせ側の合金記号（"A6061-T6" / "6061T6" / "AA6061" / "EN AW-6061 T6" / "A6O61"）
+# - 合金番号中の O は 0 の打ち間違いとみなす（調質の O とは位置で区別する）
+_PREFIX_PATTERN = r"(?:(?:EN\s*AW|JIS)[\s\-]*)?(?:AA|A)?"
+_QUERY_RE = re.compile(
+    r"^" + _PREFIX_PATTERN + r"[\s\-]*(\d[\dO]{3})(?:[\s\-_]*(" + TEMPER_PATTERN + r"))?"
+)
+# 文中の合金記号。数値の誤検出を避けるため、接頭辞（A / AA）か調質のどちらかを必須にする
+_TEXT_RE = re.compile(
+    r"(?<![0-9A-Z])(?:(?:EN\s?AW|JIS)[\s\-]?)?(?P<prefix>AA|A)?[\-]?"
+    r"(?P<code>[1-9][\dO]{3})(?:[\s\-_]?(?P<temper>" + TEMPER_PATTERN + r"))?(?![0-9A-Z])"
+)
+_TEMPER_RE = re.compile(r"^" + TEMPER_PATTERN + r"$")
+# 「A6000系」「A8000番台」は合金記号ではなく系列（query_router の系列と同じ語尾）
+_SERIES_SUFFIX_RE = re.compile(r"\s*(?:系|番台|SERIES)")
+
+# 列名で判定する合金列・調質列
+_ALLOY_COL_KEYS = ["合金", "alloy"]
+_TEMPER_COL_KEYS = ["temper", "質別", "調質"]
+
+
+def _normalize_text(value) -> str:
+    return unicodedata.normalize("NFKC", str(value)).upper()
+
+
+def parse_designation(text: str) -> Tuple[Optional[str], Optional[str]]:
+    # 全角・接頭辞・区切りの表記ゆれを吸収して (合金番号 4 桁, 調質) を返す
+    m = _QUERY_RE.match(_normalize_text(text).strip())
+    if not m:
+        return None, None
+    return m.group(1).replace("O", "0"), m.group(2)
+
+
+def format_designation(code: str, temper: Optional[str] = None) -> str:
+    return f"A{code}-{temper}" if temper else f"A{code}"
+
+
+def find_designations(text: str) -> List[str]:
+    # 文中の合金記号を正規形（"A6061-T6"）で出現順に返す
+    out: List[str] = []
+    text = _normalize_text(text)
+    for m in _TEXT_RE.finditer(text):
+        code, temper = m.group("code").replace("O", "0"), m.group("temper")
+        if not temper and code.endswith("000") and _SERIES_SUFFIX_RE.match(text, m.end()):
+            continue
+        if m.group("prefix") or temper:
+            out.append(format_designation(code, temper))
+    return out
+
+
+def _alloy_codes_in_cell(value, alloy_column: bool) -> Iterable[Tuple[str, Optional[str]]]:
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        # 数値セルは合金列のときだけ合金番号とみなす
+        if alloy_column and 0 < value < 10000:
+            yield f"{int(value):04d}", None
+        return
+    if isinstance(value, (float, np.floating)):
+        if alloy_column and value.is_integer() and 0 < value < 10000:
+            yield f"{int(value):04d}", None
+        return
+    if not isinstance(value, str):
+        return
+    for m in _DESIGNATION_RE.finditer(_normalize_text(value)):
+        yield m.group(1), m.group(2)
+
+
+def _tempers_in_cell(value) -> List[str]:
+    if not isinstance(value, str):
+        return []
+    parts = re.split(r"[/,、\s]+", _normalize_text(value))
+    return [p for p in parts if _TEMPER_RE.match(p)]
+
+
+class AlloyInvertedIndex:
+    def __init__(self, sheet_names: List[str], postings: Dict[str, np.ndarray]):
+        self.sheet_names = sheet_names
+        # key -> int32 配列 (n, 2) = [シート番号, 行番号]（シート順・行順に整列済み）
+        self.postings = postings
+
+    # --------------------------------------------------------
+    # 構築
+    # --------------------------------------------------------
+    @classmethod
+    def build(cls, data: Dict[str, pd.DataFrame]) -> "AlloyInvertedIndex":
+        sheet_names = list(data.keys())
+        raw: Dict[str, List[Tuple[int, int]]] = {}
+
+        for sid, df in enumerate(data.values()):
+            for key, rows in cls._sheet_postings(df).items():
+                raw.setdefault(key, []).extend((sid, r) for r in rows)
+
+        postings = {
+            key: np.array(sorted(set(v)), dtype=np.int32).reshape(-1, 2)
+            for key, v in raw.items()
+        }
+        return cls(sheet_names, postings)
+
+    def updated(
+        self, data: Dict[str, pd.DataFrame], touched: Set[str]
+    ) -> "AlloyInvertedIndex":
+        # 変更のないシートのポスティングはシート番号を付け替えて引き継ぎ、
+        # 変更・追加されたシートだけを走査し直す（self は変更しない）
+        sheet_names = list(data.keys())
+        sid_map = remap_sheet_ids(self.sheet_names, sheet_names, touched)
+
+        parts: Dict[str, List[np.ndarray]] = {}
+        for key, arr in self.postings.items():
+            new_sid = sid_map[arr[:, 0]]
+            keep = new_sid >= 0
+            if keep.any():
+                kept = arr[keep].copy()
+                kept[:, 0] = new_sid[keep]
+                parts[key] = [kept]
+
+        reused = set(sid_map[sid_map >= 0].tolist())
+        for sid, df in enumerate(data.values()):
+            if sid in reused:
+                continue
+            for key, rows in self._sheet_postings(df).items():
+                arr = np.empty((len(rows), 2), dtype=np.int32)
+                arr[:, 0] = sid
+                arr[:, 1] = rows
+                parts.setdefault(key, []).append(arr)
+
+        postings = {
+            key: np.unique(np.concatenate(arrs), axis=0).astype(np.int32, copy=False)
+            for key, arrs in parts.items()
+        }
+        return AlloyInvertedIndex(sheet_names, postings)
+
+    @staticmethod
+    def _sheet_postings(df: pd.DataFrame) -> Dict[str, List[int]]:
+        cols = [str(c).lower() for c in df.columns]
+        alloy_cols = [any(k in c for k in _ALLOY_COL_KEYS) for c in cols]
+        temper_cols = [any(k in c for k in _TEMPER_COL_KEYS) for c in cols]
+
+        row_alloys: Dict[int, Set[str]] = {}
+        row_keys: Dict[int, Set[str]] = {}
+        row_tempers: Dict[int, Set[str]] = {}
+
+        for ci in range(df.shape[1]):
+            values = df.iloc[:, ci].tolist()
+            if temper_cols[ci]:
+                for r, v in enumerate(values):
+                    ts = _tempers_in_cell(v)
+                    if ts:
+                        row_tempers.setdefault(r, set()).update(ts)
+            for r, v in enumerate(values):
+                for code, temper in _alloy_codes_in_cell(v, alloy_cols[ci]):
+                    row_alloys.setdefault(r, set()).add(code)
+                    keys = row_keys.setdefault(r, set())
+                    keys.add(code)
+                    if temper:
+                        keys.add(f"{code}-{temper}")
+
+        # 合金列と調質列が別セルの行は「合金-調質」キーも張る
+        for r, codes in row_alloys.items():
+            for t in row_tempers.get(r, ()):
+                row_keys[r].update(f"{code}-{t}" for code in codes)
+
+        out: Dict[str, List[int]] = {}
+        for r, keys in row_keys.items():
+            for key in keys:
+                out.setdefault(key, []).append(r)
+        return out
+
+    # --------------------------------------------------------
+    # 検索
+    # --------------------------------------------------------
+    def lookup(self, designation: str) -> np.ndarray:
+        code, temper = parse_designation(designation)
+        if code is None:
+            return np.empty((0, 2), dtype=np.int32)
+        if temper:
+            hits = self.postings.get(f"{code}-{temper}")
+            if hits is not None:
+                return hits
+        return self.postings.get(code, np.empty((0, 2), dtype=np.int32))
+
+    def iter_rows(self, designation: str) -> Iterable[Tuple[str, int]]:
+        for sid, row in self.lookup(designation):
+            yield self.sheet_names[sid], int(row)
+
+
+# ------------------------------------------------------------
+# 合金名（セルの文字列そのまま）-> (シート番号, 行番号) のポスティング
+# ------------------------------------------------------------
+# - 旧 all_alloys（行を dict にコピーして保持）の置き換え
+# - 合金列ごとにベクトル演算で名前を取り出し、名前ごとにまとめた
+#   int32 配列 (n, 2) だけを持つ。行の中身は参照時に DataFrame から解決する
+# ------------------------------------------------------------
+class AlloyNamePostings(Mapping):
+    def __init__(
+        self,
+        data: Dict[str, pd.DataFrame],
+        names: np.ndarray,
+        indptr: np.ndarray,
+        refs: np.ndarray,
+    ):
+        self._data = data
+        self.sheet_names = list(data.keys())
+        # 名前（昇順）と CSR 形式のポスティング [シート番号, 行番号]
+        self.names = names
+        self.indptr = indptr
+        self.refs = refs
+        self._pos = {name: i for i, name in enumerate(names.tolist())}
+
+    # --------------------------------------------------------
+    # 構築
+    # --------------------------------------------------------
+    @staticmethod
+    def _sheet_names(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        name_parts: List[np.ndarray] = []
+        row_parts: List[np.ndarray] = []
+        for ci, col in enumerate(df.columns):
+            if not any(k in str(col).lower() for k in _ALLOY_COL_KEYS):
+                continue
+            text = df.iloc[:, ci].astype(str).str.strip()
+            ok = (text.notna() & (text != "") & (text.str.lower() != "nan")).to_numpy(bool)
+            rows = np.flatnonzero(ok)
+            name_parts.append(text.to_numpy(dtype=object)[rows])
+            row_parts.append(rows)
+        if not name_parts:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+        return np.concatenate(name_parts), np.concatenate(row_parts)
+
+    @classmethod
+    def _from_flat(
+        cls,
+        data: Dict[str, pd.DataFrame],
+        names: List[np.ndarray],
+        sids: List[np.ndarray],
+        rows: List[np.ndarray],
+    ) -> "AlloyNamePostings":
+        # 入力はシート内で「列順 -> 行順」に並んだ平坦なポスティング
+        if not names or not sum(len(n) for n in names):
+            return cls(
+                data,
+                np.empty(0, dtype=object),
+                np.zeros(1, dtype=np.int64),
+                np.empty((0, 2), dtype=np.int32),
+            )
+        flat_names = np.concatenate(names)
+        flat_sids = np.concatenate(sids)
+        # ハッシュで番号付けしてから、異なり語だけを昇順に並べ替える
+        codes, uniques = pd.factorize(flat_names)
+        perm = np.argsort(uniques)
+        rank = np.empty(len(perm), dtype=np.int64)
+        rank[perm] = np.arange(len(perm))
+        uniq = np.asarray(uniques, dtype=object)[perm]
+        inverse = rank[codes]
+        # 名前ごとにまとめ、名前の中はシート順（シート内は元の順序）を保つ
+        order = np.lexsort((flat_sids, inverse))
+
+        refs = np.empty((len(order), 2), dtype=np.int32)
+        refs[:, 0] = flat_sids[order]
+        refs[:, 1] = np.concatenate(rows)[order]
+        counts = np.bincount(inverse, minlength=len(uniq))
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(data, uniq, indptr, refs)
+
+    @classmethod
+    def build(cls, data: Dict[str, pd.DataFrame]) -> "AlloyNamePostings":
+        names, sids, rows = [], [], []
+        for sid, df in enumerate(data.values()):
+            n, r = cls._sheet_names(df)
+            names.append(n)
+            sids.append(np.full(len(r), sid, dtype=np.int64))
+            rows.append(r)
+        return cls._from_flat(data, names, sids, rows)
+
+    def updated(
+        self, data: Dict[str, pd.DataFrame], touched: Set[str]
+    ) -> "AlloyNamePostings":
+        # 変更のないシートのポスティングは番号を付け替えて引き継ぐ（self は変更しない）
+        sid_map = remap_sheet_ids(self.sheet_names, list(data.keys()), touched)
+        flat_names = np.repeat(self.names, np.diff(self.indptr))
+        new_sid = sid_map[self.refs[:, 0]] if len(sid_map) else np.empty(0, dtype=np.int64)
+        keep = new_sid >= 0
+
+        names = [flat_names[keep]]
+        sids = [new_sid[keep]]
+        rows = [self.refs[keep, 1].astype(np.int64)]
+        reused = set(sid_map[sid_map >= 0].tolist())
+        for sid, df in enumerate(data.values()):
+            if sid in reused:
+                continue
+            n, r = self._sheet_names(df)
+            names.append(n)
+            sids.append(np.full(len(r), sid, dtype=np.int64))
+            rows.append(r)
+        return self._from_flat(data, names, sids, rows)
+
+    # --------------------------------------------------------
+    # 参照（Mapping インターフェース。行は参照時に dict 化する）
+    # --------------------------------------------------------
+    def postings(self, name: str) -> np.ndarray:
+        i = self._pos.get(name)
+        if i is None:
+            return np.empty((0, 2), dtype=np.int32)
+        return self.refs[self.indptr[i] : self.indptr[i + 1]]
+
+    def iter_rows(self, name: str) -> Iterable[Tuple[str, pd.Series]]:
+        for sid, row in self.postings(name):
+            sheet = self.sheet_names[sid]
+            yield sheet, self._data[sheet].iloc[int(row)]
+
+    def __getitem__(self, name: str) -> List[Dict]:
+        if name not in self._pos:
+            raise KeyError(name)
+        return [{"sheet": sheet, "data": row.to_dict()} for sheet, row in self.iter_rows(name)]
+
+    def __contains__(self, name) -> bool:
+        return name in self._pos
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._pos)
+
+    def __len__(self) -> int:
+        return len(self._pos)
@@ -0,0 +1,348 @@
+# ------------------------------------------------------------
+# アルミニウム合金 RAG - HTTP/JSON API（ASGI / Streamlit 非依存）
+# ------------------------------------------------------------
+# 起動例:
+#   uvicorn alloy_rag.api:app --workers 4 --port 8000
+#
+# エンドポイント:
+#   GET  /health
+#   POST /query                 {"q": "A6061-T6 の詳細", "session": "任意の ID"}
+#   GET  /strength?min=400&limit=10
+#   GET  /select?objective=tensile:2&objective=corrosion&where=elongation>=10&limit=10
+#   GET  /alloys/{合金記号}       例: /alloys/A6061-T6
+#   GET  /tempers/compare?t1=T6&t2=T651
+#   GET  /suggest?q=A6016-T6&limit=5
+#   GET  /similar?alloy=A7075-T6&weight=corrosion:2&limit=10
+#   GET  /metrics               Prometheus テキスト（?format=json で JSON）
+#
+# - プロセスごとに AluminumAlloyRAG を 1 つだけ読み込み、全リクエストで共有
+# - エンジン呼び出しはスレッドに逃がし、イベントループを塞がない
+# - 環境変数 ALLOY_RAG_DATA にディレクトリを指定すると、中の .xlsx をすべて統合して読み込む
+#   （/health の sources に統合したワークブックを列挙）
+# - /query に session を付けると、同じ session の直前の回答を文脈にして
+#   「その耐力は？」などの追質問に答える（セッション数・有効期限に上限）
+# ------------------------------------------------------------
+
+import asyncio
+import json
+import logging
+import math
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, unquote
+
+from . import DEFAULT_DATA_PATH
+from .conversation import ConversationStore
+from .engine import AluminumAlloyRAG
+from .query_router import RoutedQuery
+from .renderers import render_markdown, to_json
+from .response_cache import ResponseCache
+from .results import LoadingResult
+from .selection import parse_constraint_spec, parse_objective_spec
+from .similarity import validate_query
+from .tracing import render_json, render_prometheus, span
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH_ENV = "ALLOY_RAG_DATA"
+SESSIONS_ENV = "ALLOY_RAG_SESSIONS"
+
+Handler = Callable[[AluminumAlloyRAG, Dict[str, List[str]], Any], Any]
+
+
+class TextResponse(NamedTuple):
+    body: str
+    content_type: str = "text/plain; charset=utf-8"
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ------------------------------------------------------------
+# JSON 変換
+# ------------------------------------------------------------
+def _dumps(obj: Any) -> bytes:
+    # NaN / Infinity は JSON ではないので、混入したら 500 にする（黙って不正な JSON を返さない）
+    return json.dumps(obj, ensure_ascii=False, default=str, allow_nan=False).encode("utf-8")
+
+
+# ------------------------------------------------------------
+# 構造化レスポンス
+# ------------------------------------------------------------
+def query_result(
+    rag: AluminumAlloyRAG,
+    routed: RoutedQuery,
+    result: Any,
+    answer: str,
+    followup: Optional[str] = None,
+) -> Dict[str, Any]:
+    # routed: 回答に使った振り分け結果 / followup: 会話の文脈で解決した追質問の種類
+    return {
+        "query": routed.text,
+        "intent": routed.intent,
+        "followup": followup,
+        "entities": {
+            "alloys": routed.alloys,
+            "tempers": routed.tempers,
+            "numbers": routed.numbers,
+            "keywords": sorted(routed.keywords),
+        },
+        "result": to_json(result, rag),
+        "markdown": answer,
+    }
+
+
+# ------------------------------------------------------------
+# ASGI アプリ
+# ------------------------------------------------------------
+class AlloyAPI:
+    def __init__(self, excel_path: Optional[str] = None, cache: Optional[ResponseCache] = None):
+        self.excel_path = excel_path or os.environ.get(DATA_PATH_ENV) or str(DEFAULT_DATA_PATH)
+        self.cache = cache or ResponseCache()
+        # 応答と同じキーで結果レコードを保持する（メモリ層のみ）
+        # → キャッシュ済みの質問は検索も整形もせずに構造化データまで返せる
+        self.results = ResponseCache(max_entries=self.cache.max_entries, ttl=self.cache.ttl)
+        self.sessions = ConversationStore(int(os.environ.get(SESSIONS_ENV, "1024")))
+        self.rag: Optional[AluminumAlloyRAG] = None
+        self._load_lock: Optional[asyncio.Lock] = None
+
+        self._routes: Dict[Tuple[str, str], Handler] = {
+            ("GET", "/health"): self._health,
+            ("POST", "/query"): self._query,
+            ("GET", "/query"): self._query,
+            ("GET", "/strength"): self._strength,
+            ("GET", "/select"): self._select,
+            ("GET", "/tempers/compare"): self._temper_compare,
+            ("GET", "/suggest"): self._suggest,
+            ("GET", "/similar"): self._similar,
+            ("GET", "/metrics"): self._metrics,
+        }
+
+    # --------------------------------------------------------
+    # 読み込み（プロセスあたり 1 回）
+    # --------------------------------------------------------
+    def _load(self) -> AluminumAlloyRAG:
+        rag = AluminumAlloyRAG(self.excel_path)
+        rag.freeze()
+        return rag
+
+    async def _ensure_loaded(self) -> AluminumAlloyRAG:
+        if self.rag is None:
+            if self._load_lock is None:
+                self._load_lock = asyncio.Lock()
+            async with self._load_lock:
+                if self.rag is None:
+                    self.rag = await asyncio.to_thread(self._load)
+        return self.rag
+
+    # --------------------------------------------------------
+    # ハンドラー（スレッドで実行される）
+    # --------------------------------------------------------
+    def _health(self, rag, params, body):
+        return {
+            "status": "ok" if rag.load_error is None else "error",
+            "workbook": rag.source_hash,
+            "sheets": list(rag.data.keys()),
+            "sources": [
+                {"label": src.label, "sha256": src.sha256, "sheets": list(src.sheets)}
+                for src in rag.sources
+            ],
+            "cache": self.cache.stats(),
+            "sessions": self.sessions.stats()["sessions"],
+        }
+
+    def _query(self, rag, params, body):
+        body = body if isinstance(body, dict) else {}
+        q = body.get("q") if "q" in body else _param(params, "q")
+        if not isinstance(q, str) or not q.strip():
+            raise HTTPError(400, "q must be a non-empty string")
+        session = body.get("session") or _param(params, "session")
+        context = self.sessions.get(str(session)) if session else None
+        # 振り分けは 1 回だけ（追質問の判定・キャッシュのキー・回答で共有）
+        routed = rag.router.route(q)
+        followup = rag.followup_for(q, context, routed)
+        # キャッシュを先に引き、当たれば検索も整形もしない（追質問は文脈の指紋を含めたキー）
+        key = rag.cache_key(q, context, routed)
+        cacheable = bool(rag.source_hash)
+        answer = self.cache.get(rag.source_hash, key) if cacheable else None
+        result = self.results.get(rag.source_hash, key) if answer is not None else None
+        if result is not None:
+            if context is not None:
+                context.remember(result, rag)
+        else:
+            # 未キャッシュか、ディスク層にだけ残っていた回答（構造化データのために検索する）
+            result = rag.query(q, context, routed)
+            # 読み込み中の案内はキャッシュしない
+            cacheable = cacheable and not isinstance(result, LoadingResult)
+            if cacheable:
+                self.results.put(rag.source_hash, key, result)
+        if answer is None:
+            answer = render_markdown(result, rag)
+            if cacheable:
+                self.cache.put(rag.source_hash, key, answer)
+        return query_result(rag, routed, result, answer, followup.kind if followup else None)
+
+    def _strength(self, rag, params, body):
+        try:
+            min_strength = float(_param(params, "min", "400"))
+            limit = int(_param(params, "limit", "10"))
+        except ValueError:
+            raise HTTPError(400, "min and limit must be numeric")
+        if not math.isfinite(min_strength):
+            raise HTTPError(400, "min must be a finite number")
+        if limit < 1:
+            raise HTTPError(400, "limit must be at least 1")
+        return to_json(rag.get_alloy_by_strength(min_strength, limit), rag)
+
+    def _select(self, rag, params, body):
+        try:
+            objectives = [parse_objective_spec(o) for o in params.get("objective", [])]
+            constraints = [parse_constraint_spec(w) for w in params.get("where", [])]
+            limit = int(_param(params, "limit", "10"))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        if limit < 1:
+            raise HTTPError(400, "limit must be at least 1")
+        return to_json(rag.select_materials(objectives, constraints, limit), rag)
+
+    def _temper_compare(self, rag, params, body):
+        t1, t2 = _param(params, "t1"), _param(params, "t2")
+        if not t1 or not t2:
+            raise HTTPError(400, "t1 and t2 are required")
+        return to_json(rag.compare_tempers(t1, t2), rag)
+
+    def _suggest(self, rag, params, body):
+        q = _param(params, "q")
+        if not q:
+            raise HTTPError(400, "q is required")
+        try:
+            limit = int(_param(params, "limit", "5"))
+        except ValueError:
+            raise HTTPError(400, "limit must be numeric")
+        found = rag.suggest_designations(q, limit)
+        return {
+            "query": q,
+            **{kind: [s._asdict() for s in items] for kind, items in found.items()},
+        }
+
+    def _similar(self, rag, params, body):
+        alloy = _param(params, "alloy")
+        if not alloy:
+            raise HTTPError(400, "alloy is required")
+        try:
+            weights = {o.prop: o.weight for o in map(parse_objective_spec, params.get("weight", []))}
+            limit = int(_param(params, "limit", "10"))
+            # 件数 0・重みがすべて 0 などは「近い合金なし」ではなく 400
+            validate_query(limit, weights)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return to_json(rag.find_similar_alloys(alloy, weights, limit), rag)
+
+    def _metrics(self, rag, params, body):
+        gauges = {f"cache_{k}": v for k, v in self.cache.stats().items()}
+        gauges["sessions"] = len(self.sessions)
+        if _param(params, "format") == "json":
+            return render_json(gauges=gauges)
+        return TextResponse(
+            render_prometheus(gauges=gauges), "text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    def _resolve(self, method: str, path: str) -> Tuple[str, Handler]:
+        # (計測用のスパン名, ハンドラー)
+        handler = self._routes.get((method, path))
+        if handler is not None:
+            return "api" + path.replace("/", "."), handler
+        if path.startswith("/alloys/") and method == "GET":
+            designation = unquote(path[len("/alloys/") :])
+            return "api.alloys", lambda rag, params, body: to_json(
+                rag.get_alloy_detailed_info(designation), rag
+            )
+        if any(p == path for _, p in self._routes):
+            raise HTTPError(405, "method not allowed")
+        raise HTTPError(404, "not found")
+
+    # --------------------------------------------------------
+    # ASGI エントリーポイント
+    # --------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        status = 200
+        try:
+            name, handler = self._resolve(scope["method"], scope["path"].rstrip("/") or "/")
+            params = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+            body = await _read_json(receive) if scope["method"] == "POST" else None
+            rag = await self._ensure_loaded()
+            payload = await asyncio.to_thread(_call, name, handler, rag, params, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": e.message}
+        except Exception as e:
+            logger.exception("API エラー")
+            status, payload = 500, {"error": str(e)}
+
+        if isinstance(payload, TextResponse):
+            data, ctype = payload.body.encode("utf-8"), payload.content_type
+        else:
+            data, ctype = _dumps(payload), "application/json; charset=utf-8"
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", ctype.encode()),
+                    (b"content-length", str(len(data)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self._ensure_loaded()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _call(name: str, handler: Handler, rag, params, body):
+    with span(name):
+        return handler(rag, params, body)
+
+
+def _param(params: Dict[str, List[str]], name: str, default: Optional[str] = None) -> Optional[str]:
+    values = params.get(name)
+    return values[0] if values else default
+
+
+async def _read_json(receive) -> Any:
+    chunks = []
+    more = True
+    while more:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    raw = b"".join(chunks)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        raise HTTPError(400, "invalid JSON body")
+
+
+app = AlloyAPI()
@@ -0,0 +1,204 @@
+# ------------------------------------------------------------
+# バッチ実行（CSV / JSONL の質問をまとめて回答し JSONL に書き出す）
+# ------------------------------------------------------------
+# 使い方:
+#   python -m alloy_rag.batch queries.csv -o answers.jsonl --workers 4
+#   python -m alloy_rag.batch queries.jsonl -o - --no-markdown
+#   python -m alloy_rag.batch queries.csv --data vendor_a.xlsx vendor_b.xlsx
+#
+# - 入力: CSV は q / query / 質問 列（無ければ先頭列）、JSONL は
+#   {"q": ...} / {"query": ...} のオブジェクトか文字列。その他の列（id・期待値など）は
+#   そのまま出力へ引き継ぐ
+# - AluminumAlloyRAG は親プロセスで 1 回だけ構築し、その後に fork した
+#   ワーカーで共有する（読み取り専用のページは子プロセスへコピーされない。
+#   gc.freeze() で GC による参照カウント領域の書き込みも避ける）
+# - 結果は入力順に 1 行ずつ書き出し、終了時に件数・スループット・レイテンシを表示
+# - fork が使えない環境（Windows など）や --workers 1 では同一プロセスで順に処理する
+# ------------------------------------------------------------
+
+import argparse
+import csv
+import gc
+import json
+import logging
+import multiprocessing
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from . import DEFAULT_DATA_PATH
+from .api import query_result
+from .engine import AluminumAlloyRAG
+from .renderers import render_markdown, to_json
+
+logger = logging.getLogger(__name__)
+
+# 質問文として扱う列名・キー（先に見つかったもの）
+QUERY_FIELDS = ["q", "query", "質問"]
+
+# fork 後のワーカーが参照するエンジン（親プロセスで設定してから fork する）
+_RAG: Optional[AluminumAlloyRAG] = None
+_WITH_MARKDOWN = True
+
+
+# ------------------------------------------------------------
+# 入力の読み込み（逐次。巨大なファイルも全体を読み込まない）
+# ------------------------------------------------------------
+def _split_record(record: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    key = next((k for k in QUERY_FIELDS if k in record), None)
+    if key is None:
+        key = next(iter(record), None)
+    q = "" if key is None or record[key] is None else str(record[key])
+    return q, {k: v for k, v in record.items() if k != key}
+
+
+def iter_queries(path: Path) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    stream = sys.stdin if str(path) == "-" else path.open(encoding="utf-8-sig", newline="")
+    try:
+        if path.suffix.lower() in (".jsonl", ".ndjson") or str(path) == "-":
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                obj = json.loads(line)
+                yield _split_record(obj) if isinstance(obj, dict) else (str(obj), {})
+        else:
+            for row in csv.DictReader(stream):
+                yield _split_record(row)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+# ------------------------------------------------------------
+# 1 件の処理（ワーカーで実行される）
+# ------------------------------------------------------------
+def answer(rag: AluminumAlloyRAG, q: str, with_markdown: bool = True) -> Dict[str, Any]:
+    routed = rag.router.route(q)
+    result = rag.query(q, routed=routed)
+    if with_markdown:
+        return query_result(rag, routed, result, render_markdown(result, rag))
+    return {"query": q, "intent": routed.intent, "result": to_json(result, rag)}
+
+
+def _work(item: Tuple[int, str, Dict[str, Any]]) -> Dict[str, Any]:
+    index, q, extra = item
+    t0 = time.perf_counter()
+    try:
+        out = answer(_RAG, q, _WITH_MARKDOWN)
+    except Exception as e:  # 1 件の失敗でバッチ全体を止めない
+        logger.exception("質問の処理に失敗しました: %s", q)
+        out = {"query": q, "error": f"{type(e).__name__}: {e}"}
+    out["elapsed_ms"] = (time.perf_counter() - t0) * 1000.0
+    return {"index": index, **extra, **out}
+
+
+# ------------------------------------------------------------
+# 実行
+# ------------------------------------------------------------
+def run(
+    rag: AluminumAlloyRAG,
+    queries: Iterator[Tuple[str, Dict[str, Any]]],
+    out,
+    workers: int = 1,
+    chunksize: int = 16,
+    with_markdown: bool = True,
+) -> Dict[str, Any]:
+    global _RAG, _WITH_MARKDOWN
+    _RAG, _WITH_MARKDOWN = rag, with_markdown
+
+    items = ((i, q, extra) for i, (q, extra) in enumerate(queries))
+    can_fork = "fork" in multiprocessing.get_all_start_methods()
+    if workers > 1 and not can_fork:
+        logger.warning("fork が使えないため 1 プロセスで処理します")
+        workers = 1
+
+    latencies = []
+    errors = 0
+    t0 = time.perf_counter()
+
+    def emit(rec: Dict[str, Any]):
+        nonlocal errors
+        latencies.append(rec["elapsed_ms"])
+        errors += "error" in rec
+        out.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+    if workers > 1:
+        # 構築済みのオブジェクトを GC の対象から外してから fork する
+        gc.collect()
+        gc.freeze()
+        try:
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                for rec in pool.imap(_work, items, chunksize=chunksize):
+                    emit(rec)
+        finally:
+            gc.unfreeze()
+    else:
+        for item in items:
+            emit(_work(item))
+    out.flush()
+
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "queries": n,
+        "errors": errors,
+        "workers": workers,
+        "seconds": elapsed,
+        "qps": n / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": statistics.median(latencies) if n else 0.0,
+        "p99_ms": latencies[min(n - 1, int(n * 0.99))] if n else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="質問をまとめて回答し JSONL に書き出す")
+    parser.add_argument("input", type=Path, help="CSV / JSONL（- は標準入力の JSONL）")
+    parser.add_argument("-o", "--output", default="-", help="出力 JSONL（既定は標準出力）")
+    parser.add_argument(
+        "--data",
+        nargs="+",
+        default=[str(DEFAULT_DATA_PATH)],
+        help="読み込む Excel（複数のファイル・ディレクトリは統合して 1 つの索引にする）",
+    )
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--no-markdown", action="store_true", help="Markdown を出力しない")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    rag = AluminumAlloyRAG(args.data[0] if len(args.data) == 1 else args.data)
+    if rag.load_error is not None:
+        print(f"データの読み込みに失敗しました: {rag.load_error}", file=sys.stderr)
+        return 1
+    rag.freeze()
+    load_s = time.perf_counter() - t0
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = run(
+            rag,
+            iter_queries(args.input),
+            out,
+            workers=max(1, args.workers),
+            chunksize=max(1, args.chunksize),
+            with_markdown=not args.no_markdown,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f"{stats['queries']} 件（エラー {stats['errors']} 件） / {stats['workers']} プロセス / "
+        f"読み込み {load_s:.2f} s / 処理 {stats['seconds']:.2f} s / "
+        f"{stats['qps']:.1f} 件/s / p50 {stats['p50_ms']:.1f} ms / p99 {stats['p99_ms']:.1f} ms",
+        file=sys.stderr,
+    )
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+# ------------------------------------------------------------
+# 段階的な読み込みで公開される機能
+# ------------------------------------------------------------
+# - AluminumAlloyRAG(background=True) はバックグラウンドで読み込み、
+#   軽い索引から順に（下の定義順に）機能を利用可能にする
+# - 質問の種類ごとに必要な機能は engine.INTENT_CAPABILITIES で対応付ける
+# - 標準ライブラリのみ（UI から import してもエンジンを読み込まない）
+# ------------------------------------------------------------
+
+from typing import Dict, Tuple
+
+CAP_TEMPERS = "tempers"
+CAP_SERIES = "series"
+CAP_MECHANICAL = "mechanical"
+CAP_ALLOYS = "alloys"
+CAP_FULLTEXT = "fulltext"
+
+CAPABILITY_LABELS: Dict[str, str] = {
+    CAP_TEMPERS: "調質（T6 など）の説明・比較",
+    CAP_SERIES: "合金系列の情報",
+    CAP_MECHANICAL: "機械特性による検索・材料選定",
+    CAP_ALLOYS: "合金ごとの詳細（全シート横断）",
+    CAP_FULLTEXT: "全文検索",
+}
+
+CAPABILITIES: Tuple[str, ...] = tuple(CAPABILITY_LABELS)
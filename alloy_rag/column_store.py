@@ -0,0 +1,300 @@
+# ------------------------------------------------------------
+# 機械特性テーブルの列指向ストア & ベクトル化クエリ
+# ------------------------------------------------------------
+# - aluminum_handbook_table の数値列を読み込み時に 1 度だけ
+#   float64（欠損は NaN）へ変換して保持する
+# - 範囲検索・複合条件・top-k を NumPy の配列演算で処理する
+# - 定性評価（耐食性・溶接性など A〜E）も順序尺度の数値に変換して同列に扱う
+# ------------------------------------------------------------
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# 特性キー -> 機械特性テーブルの列名
+NUMERIC_COLUMNS: Dict[str, str] = {
+    "tensile": "引張強さ (MPa)",
+    "proof": "耐力 (MPa)",
+    "elongation": "伸び (%)",
+    "fatigue": "疲れ強さ (MPa)",
+}
+
+# 特性キー -> 定性評価（A〜E）の列名
+RATING_COLUMNS: Dict[str, str] = {
+    "corrosion": "耐食性",
+    "weldability": "溶接性",
+    "machinability": "切削性",
+    "formability": "成形性",
+}
+
+# 評価記号 -> 順序尺度（凡例：A 優れる / B 良好 / C 可 / D あまり適さない / E 不適）
+RATING_SCORES: Dict[str, float] = {"A": 5.0, "B": 4.0, "C": 3.0, "D": 2.0, "E": 1.0}
+SCORE_RATINGS: Dict[float, str] = {v: k for k, v in RATING_SCORES.items()}
+
+# 特性キー -> 強度ランク（高・中・低）の列名と順序尺度
+RANK_COLUMNS: Dict[str, str] = {"strength_rank": "強度ランク"}
+RANK_SCORES: Dict[str, float] = {"高": 3.0, "中": 2.0, "低": 1.0}
+SCORE_RANKS: Dict[float, str] = {v: k for k, v in RANK_SCORES.items()}
+
+# 表示用の名称と単位
+PROPERTY_LABELS: Dict[str, str] = {
+    "tensile": "引張強さ",
+    "proof": "耐力",
+    "elongation": "伸び",
+    "fatigue": "疲れ強さ",
+    "corrosion": "耐食性",
+    "weldability": "溶接性",
+    "machinability": "切削性",
+    "formability": "成形性",
+    "strength_rank": "強度ランク",
+}
+PROPERTY_UNITS: Dict[str, str] = {
+    "tensile": "MPa",
+    "proof": "MPa",
+    "elongation": "%",
+    "fatigue": "MPa",
+    "corrosion": "",
+    "weldability": "",
+    "machinability": "",
+    "formability": "",
+    "strength_rank": "",
+}
+
+# クエリ中の表記ゆれ -> 特性キー（長いものから照合する）
+PROPERTY_ALIASES: Dict[str, str] = {
+    "引張強さ": "tensile",
+    "引張強度": "tensile",
+    "引張": "tensile",
+    "tensile strength": "tensile",
+    "tensile": "tensile",
+    "0.2%耐力": "proof",
+    "耐力": "proof",
+    "proof stress": "proof",
+    "yield strength": "proof",
+    "proof": "proof",
+    "yield": "proof",
+    "伸び": "elongation",
+    "elongation": "elongation",
+    "疲れ強さ": "fatigue",
+    "疲労強度": "fatigue",
+    "疲労強さ": "fatigue",
+    "fatigue strength": "fatigue",
+    "fatigue": "fatigue",
+}
+
+
+class Predicate(NamedTuple):
+    prop: str
+    op: str
+    value: float
+
+
+_OPS = {
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "<=": np.less_equal,
+    "<": np.less,
+}
+
+_OP_SYMBOLS = {
+    ">=": ">=", "≥": ">=", "＞＝": ">=", "=>": ">=",
+    ">": ">", "＞": ">",
+    "<=": "<=", "≤": "<=", "＜＝": "<=", "=<": "<=",
+    "<": "<", "＜": "<",
+}
+_OP_WORDS = {
+    "以上": ">=",
+    "超": ">",
+    "より大きい": ">",
+    "以下": "<=",
+    "未満": "<",
+    "より小さい": "<",
+}
+
+_PREDICATE_RE = re.compile(
+    r"(?P<prop>"
+    + "|".join(re.escape(a) for a in sorted(PROPERTY_ALIASES, key=len, reverse=True))
+    + r")\s*(?:が|は|:|：)?\s*"
+    r"(?P<sym>>=|=>|<=|=<|≥|≤|＞＝|＜＝|>|<|＞|＜)?\s*"
+    r"(?P<num>\d+(?:\.\d+)?)\s*(?:mpa|n/mm2|n/mm²|%|％)?\s*"
+    r"(?P<word>以上|以下|未満|超|より大きい|より小さい)?",
+    re.IGNORECASE,
+)
+
+
+# ------------------------------------------------------------
+# 条件式のパース（「引張強さ 400 以上 かつ 伸び 10% 以上」など）
+# ------------------------------------------------------------
+def parse_predicates(query: str) -> List[Predicate]:
+    preds: List[Predicate] = []
+    for m in _PREDICATE_RE.finditer(query):
+        prop = PROPERTY_ALIASES[m.group("prop").lower()]
+        if m.group("sym"):
+            op = _OP_SYMBOLS[m.group("sym")]
+        elif m.group("word"):
+            op = _OP_WORDS[m.group("word")]
+        else:
+            op = ">="
+        preds.append(Predicate(prop, op, float(m.group("num"))))
+    return preds
+
+
+def describe_predicate(p: Predicate) -> str:
+    if p.prop in RATING_COLUMNS:
+        return f"{PROPERTY_LABELS[p.prop]} {p.op} {SCORE_RATINGS.get(p.value, p.value)}"
+    if p.prop in RANK_COLUMNS:
+        return f"{PROPERTY_LABELS[p.prop]} {p.op} {SCORE_RANKS.get(p.value, p.value)}"
+    value = int(p.value) if p.value.is_integer() else p.value
+    return f"{PROPERTY_LABELS[p.prop]} {p.op} {value} {PROPERTY_UNITS[p.prop]}"
+
+
+def validate_limit(limit: int):
+    # 表示件数。0 以下は「該当なし」ではなく ValueError（API では 400）
+    if limit < 1:
+        raise ValueError(f"件数は 1 以上で指定してください: {limit}")
+
+
+def format_property(prop: str, value: float) -> str:
+    if np.isnan(value):
+        return "—"
+    if prop in RATING_COLUMNS:
+        return SCORE_RATINGS.get(value, "—")
+    if prop in RANK_COLUMNS:
+        return SCORE_RANKS.get(value, "—")
+    value = int(value) if float(value).is_integer() else value
+    return f"{value} {PROPERTY_UNITS[prop]}"
+
+
+# ------------------------------------------------------------
+# 列指向ストア
+# ------------------------------------------------------------
+class MechanicalColumnStore:
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+
+        # 数値列は 1 度だけ変換（数値でないセルは NaN）
+        self.values: Dict[str, np.ndarray] = {}
+        for key, col in NUMERIC_COLUMNS.items():
+            if col in df.columns:
+                arr = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+            else:
+                arr = np.full(self.n, np.nan)
+            self.values[key] = arr
+
+        # 定性評価は A〜E -> 5〜1（それ以外・欠損は NaN）
+        for key, col in RATING_COLUMNS.items():
+            if col in df.columns:
+                letters = df[col].astype(str).str.strip().str.upper()
+                arr = letters.map(RATING_SCORES).to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                arr = np.full(self.n, np.nan)
+            self.values[key] = arr
+
+        # 強度ランクは 高・中・低 -> 3〜1
+        for key, col in RANK_COLUMNS.items():
+            if col in df.columns:
+                ranks = df[col].astype(str).str.strip()
+                arr = ranks.map(RANK_SCORES).to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                arr = np.full(self.n, np.nan)
+            self.values[key] = arr
+
+        if "系列" in df.columns:
+            self.series = pd.to_numeric(df["系列"], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            self.series = np.full(self.n, np.nan)
+
+        # 合金番号（4 桁ゼロ埋め）での照合用
+        alloys = df["Alloy"].tolist() if "Alloy" in df.columns else [""] * self.n
+        self.alloy_codes = np.array([str(a).zfill(4) for a in alloys], dtype=object)
+        tempers = df["Temper"].tolist() if "Temper" in df.columns else [""] * self.n
+        self.temper_codes = np.array([str(t).strip().upper() for t in tempers], dtype=object)
+
+        # 特性ベース検索用：行のセルを空白で連結して小文字にしたテキスト
+        # （全行を \0 区切りで 1 本の文字列にし、検索は find で先頭から走査する）
+        cells = [[str(v) for v in df.iloc[:, j].tolist()] for j in range(df.shape[1])]
+        rows = [" ".join(vals).lower() for vals in zip(*cells)] if cells else [""] * self.n
+        lengths = np.array([len(r) + 1 for r in rows], dtype=np.int64)
+        self.row_starts = np.concatenate(([0], np.cumsum(lengths)))
+        self.text = "\0".join(rows)
+
+    # --------------------------------------------------------
+    # 条件マスク
+    # --------------------------------------------------------
+    def mask(
+        self, predicates: Sequence[Predicate], rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        # rows を渡すとその行だけを評価する（マスクは rows と同じ長さ）
+        m = np.ones(self.n if rows is None else len(rows), dtype=bool)
+        for p in predicates:
+            vals = self.values[p.prop] if rows is None else self.values[p.prop][rows]
+            # NaN との比較は常に False になるので欠損は自動的に除外される
+            m &= _OPS[p.op](vals, p.value)
+        return m
+
+    def select(
+        self, predicates: Sequence[Predicate], rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        if rows is None:
+            return np.flatnonzero(self.mask(predicates))
+        return rows[self.mask(predicates, rows)]
+
+    # --------------------------------------------------------
+    # top-k（argpartition で候補を絞ってから安定ソート）
+    # --------------------------------------------------------
+    def top_k(
+        self,
+        prop: str,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        descending: bool = True,
+        rows: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        # rows を渡すとその行の中だけで選ぶ（mask は全行に対するもの）
+        vals = self.values[prop]
+        if rows is None:
+            valid = ~np.isnan(vals)
+            if mask is not None:
+                valid &= mask
+            idx = np.flatnonzero(valid)
+        else:
+            valid = ~np.isnan(vals[rows])
+            if mask is not None:
+                valid &= mask[rows]
+            idx = rows[valid]
+        if k <= 0 or idx.size == 0:
+            return idx[:0]
+
+        key = -vals[idx] if descending else vals[idx]
+        if k < idx.size:
+            kth = key[np.argpartition(key, k - 1)[k - 1]]
+            # 境界の同値も残し、元の行順で安定に並べる
+            keep = key <= kth
+            idx, key = idx[keep], key[keep]
+
+        order = np.lexsort((idx, key))[:k]
+        return idx[order]
+
+    # --------------------------------------------------------
+    # 行の絞り込み
+    # --------------------------------------------------------
+    def rows_for_alloy(self, code: str) -> np.ndarray:
+        return np.flatnonzero(self.alloy_codes == code)
+
+    def rows_containing(self, keys: Sequence[str], limit: int) -> np.ndarray:
+        # keys（小文字）をすべて含む行を、行順に先頭から limit 件
+        # 最も長いキーの出現位置から候補行を引き、残りのキーはその行の中だけで確かめる
+        if not keys or self.n == 0:
+            return np.arange(min(limit, self.n), dtype=np.int64)
+        anchor = max(keys, key=len)
+        out: List[int] = []
+        pos = self.text.find(anchor)
+        while pos >= 0 and len(out) < limit:
+            row = int(np.searchsorted(self.row_starts, pos, side="right")) - 1
+            start, end = int(self.row_starts[row]), int(self.row_starts[row + 1]) - 1
+            if all(k in self.text[start:end] for k in keys):
+                out.append(row)
+            pos = self.text.find(anchor, end + 1)
+        return np.array(out, dtype=np.int64)
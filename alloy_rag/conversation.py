@@ -0,0 +1,332 @@
+# ------------------------------------------------------------
+# 会話の文脈（セッションごとの直前の実体）と追質問の解決
+# ------------------------------------------------------------
+# - 直前の回答で確定した合金記号・調質・系列と、結果の行番号（機械特性テーブル、
+#   最大 MAX_CONTEXT_ROWS 行）だけを保持する → 1 セッションあたり数 KB
+# - 「その耐力は？」「T651 と比べて」「その中で伸び 10% 以上」「それに近い合金」などの
+#   追質問は、保持した実体・行だけを対象に答える（ワークブック全体を走査し直さない）
+# - 行番号はワークブックごとに異なるので、内容ハッシュが変わったら文脈は捨てる
+# - 文脈に依存する回答は、応答キャッシュのキーに文脈の指紋を含める（engine.cache_key）
+# - API 用にセッション ID -> 文脈の LRU（件数・TTL に上限）も用意する
+# ------------------------------------------------------------
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import singledispatch
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .alloy_index import parse_designation
+from .column_store import PROPERTY_LABELS, Predicate, describe_predicate, parse_predicates
+from .query_router import RoutedQuery
+from .results import (
+    AlloyDetailResult,
+    ConditionResult,
+    PropertySearchResult,
+    PureAluminumResult,
+    SelectionResult,
+    SeriesStatsResult,
+    SimilarityResult,
+    StrengthResult,
+    TemperCompareResult,
+    TemperInfoResult,
+)
+from .selection import OBJECTIVE_ALIASES, Objective, parse_objectives, parse_rating_constraints
+from .series_stats import STAT_LABELS
+
+# 文脈に残す結果の行数の上限
+MAX_CONTEXT_ROWS = int(os.environ.get("ALLOY_RAG_CONTEXT_ROWS", "200"))
+
+# 追質問の種類
+FOLLOWUP_PROPERTY = "property"
+FOLLOWUP_FILTER = "filter"
+FOLLOWUP_RANK = "rank"
+FOLLOWUP_SIMILAR = "similar"
+FOLLOWUP_TEMPER = "temper"
+FOLLOWUP_TEMPER_COMPARE = "temper_compare"
+FOLLOWUP_DETAIL = "detail"
+
+_EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+# 特性名を除くと助詞・指示語・疑問の言い回ししか残らない質問（「耐力は？」「その伸びを教えて」）
+_ALIAS_RE = re.compile(
+    "|".join(re.escape(a) for a in sorted(OBJECTIVE_ALIASES, key=len, reverse=True)),
+    re.IGNORECASE,
+)
+_FILLER_RE = re.compile(
+    r"その|それ|この|これ|って|教えて|ください|ですか|どれくらい|いくつ|どう|だと|なら|場合|"
+    r"[はのをがもで]|[\s、。,.？?！!]"
+)
+
+
+class FollowUp(NamedTuple):
+    kind: str
+    props: Tuple[str, ...] = ()
+    predicates: Tuple[Predicate, ...] = ()
+    objectives: Tuple[Objective, ...] = ()
+    temper: Optional[str] = None
+
+
+# ------------------------------------------------------------
+# セッションの文脈
+# ------------------------------------------------------------
+class ConversationContext:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # 文脈を作ったワークブックの内容ハッシュ
+        self.source_hash: Optional[str] = None
+        # 直前の合金記号（A6061-T6）・調質・系列
+        self.designation: Optional[str] = None
+        self.temper: Optional[str] = None
+        self.series: Optional[int] = None
+        # 直前の結果の行番号（機械特性テーブル）と、その結果の説明
+        self.rows: np.ndarray = _EMPTY_ROWS
+        self.subject: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def empty(self) -> bool:
+        return self.designation is None and self.temper is None and not self.rows.size
+
+    def bind(self, source_hash: Optional[str]):
+        # 別のワークブックの行番号は意味を持たないので捨てる
+        if source_hash != self.source_hash:
+            self.clear()
+            self.source_hash = source_hash
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            h.update(repr((self.designation, self.temper, self.series, self.subject)).encode())
+            h.update(self.rows.tobytes())
+            self._fingerprint = h.hexdigest()[:16]
+        return self._fingerprint
+
+    def update(self, **entities):
+        for name, value in entities.items():
+            setattr(self, name, value)
+        self.rows = self.rows[:MAX_CONTEXT_ROWS]
+        self._fingerprint = None
+
+    def remember(self, result: Any, rag):
+        _remember(result, self, rag)
+
+    def __repr__(self) -> str:
+        return (
+            f"ConversationContext({self.designation!r}, temper={self.temper!r}, "
+            f"series={self.series!r}, rows={self.rows.size})"
+        )
+
+
+# ------------------------------------------------------------
+# 回答から文脈へ（結果型ごと。該当しない型では文脈を変えない）
+# ------------------------------------------------------------
+@singledispatch
+def _remember(result: Any, context: ConversationContext, rag):
+    pass
+
+
+def _series_of(rag, row: int) -> Optional[int]:
+    series = rag.mechanical_store.series[row]
+    return None if np.isnan(series) else int(series)
+
+
+def _remember_rows(context: ConversationContext, rows: Optional[np.ndarray], subject: str):
+    # 一覧の回答：個別の合金は確定しないので、合金記号は捨てて行だけを残す
+    if rows is None or not rows.size:
+        return
+    context.update(designation=None, series=None, rows=rows, subject=subject)
+
+
+@_remember.register
+def _(result: AlloyDetailResult, context: ConversationContext, rag):
+    if not result.found:
+        return
+    designation = result.designation.upper()
+    row = result.mechanical_row
+    if row is None:
+        context.update(designation=designation, series=None, rows=_EMPTY_ROWS, subject=designation)
+        return
+    # 調質が無い記号では別の調質の行を表示するので、説明は実際の行の記号にする
+    shown = rag.mechanical_table.iloc[row]
+    context.update(
+        designation=designation,
+        temper=parse_designation(designation)[1] or context.temper,
+        series=_series_of(rag, row),
+        rows=np.array([row], dtype=np.int64),
+        subject=rag.safe_alloy_format(shown.get("Alloy", ""), shown.get("Temper", "")),
+    )
+
+
+@_remember.register
+def _(result: SimilarityResult, context: ConversationContext, rag):
+    if not result.found:
+        return
+    designation = result.designation.upper()
+    context.update(
+        designation=designation,
+        temper=parse_designation(designation)[1] or context.temper,
+        series=_series_of(rag, result.origin),
+        rows=result.rows,
+        subject=f"{designation} に近い合金",
+    )
+
+
+@_remember.register
+def _(result: TemperInfoResult, context: ConversationContext, rag):
+    if result.found:
+        context.update(temper=result.symbol.upper())
+
+
+@_remember.register
+def _(result: TemperCompareResult, context: ConversationContext, rag):
+    if result.found:
+        context.update(temper=result.t2)
+
+
+@_remember.register
+def _(result: StrengthResult, context: ConversationContext, rag):
+    _remember_rows(context, result.rows, f"引張強さ {result.min_strength:g} MPa 以上の合金")
+
+
+@_remember.register
+def _(result: ConditionResult, context: ConversationContext, rag):
+    cond = " かつ ".join(describe_predicate(p) for p in result.predicates)
+    scope = f"{result.scope}のうち " if result.scope else ""
+    _remember_rows(context, result.rows, f"{scope}{cond} の合金")
+
+
+@_remember.register
+def _(result: SelectionResult, context: ConversationContext, rag):
+    subject = f"{result.scope}の上位" if result.scope else "多目的選定の上位"
+    _remember_rows(context, result.rows, subject)
+
+
+@_remember.register
+def _(result: PureAluminumResult, context: ConversationContext, rag):
+    _remember_rows(context, result.rows, "純アルミ（1000系）")
+    if result.rows.size:
+        context.update(series=1000)
+
+
+@_remember.register
+def _(result: PropertySearchResult, context: ConversationContext, rag):
+    if result.rows.size:
+        _remember_rows(context, result.rows, "検索結果の合金")
+    elif result.series and rag.series_stats is not None:
+        series = result.series[0]
+        _remember_rows(context, rag.series_stats.rows_in(series), f"{series}系")
+    if result.series:
+        context.update(series=result.series[0])
+
+
+@_remember.register
+def _(result: SeriesStatsResult, context: ConversationContext, rag):
+    # 最大・最小はその行、平均などは系列の行（「その中で伸び 10% 以上」に続けられる）
+    if not result.found:
+        return
+    series = result.series[0]
+    if result.rows.size:
+        labels = "・".join(PROPERTY_LABELS[p] for p in result.props)
+        subject = f"{series}系で{labels}が{STAT_LABELS[result.stat]}の合金"
+        _remember_rows(context, result.rows, subject)
+    else:
+        _remember_rows(context, rag.series_stats.rows_in(series), f"{series}系")
+    context.update(series=series)
+
+
+# ------------------------------------------------------------
+# 追質問の判定（文脈が無い・合金記号を含む質問は対象外 → 通常の振り分け）
+# ------------------------------------------------------------
+def _is_bare(text: str, pattern: "re.Pattern") -> bool:
+    rest = pattern.sub("", text)
+    return rest != text and not _FILLER_RE.sub("", rest)
+
+
+def is_bare_property_question(text: str) -> bool:
+    return _is_bare(text, _ALIAS_RE)
+
+
+def resolve_followup(routed: RoutedQuery, context: ConversationContext) -> Optional[FollowUp]:
+    if context.empty or routed.alloys or routed.temper_symbol:
+        return None
+    text = routed.text
+    cues = set(routed.triggers)
+    anaphora = "anaphora" in cues
+
+    # 「それに近い合金」「代替材は？」
+    if "similar" in cues and context.designation and not routed.numbers:
+        return FollowUp(FOLLOWUP_SIMILAR, objectives=tuple(parse_objectives(text)))
+
+    # 「T651 と比べて」→ 直前の調質と比較 /「T651 は？」→ 同じ合金の別の調質
+    if len(routed.tempers) == 1 and not routed.predicates:
+        temper = routed.tempers[0]
+        if "compare" in cues:
+            if context.temper and context.temper != temper:
+                return FollowUp(FOLLOWUP_TEMPER_COMPARE, temper=temper)
+        elif context.designation and _is_bare(
+            text, re.compile(re.escape(temper) + "材?", re.IGNORECASE)
+        ):
+            return FollowUp(FOLLOWUP_TEMPER, temper=temper)
+
+    if context.rows.size:
+        predicates = parse_predicates(text) + parse_rating_constraints(text)
+        # 「その中で伸び 10% 以上」→ 直前の結果の行だけを条件で絞る
+        if anaphora and predicates:
+            return FollowUp(FOLLOWUP_FILTER, predicates=tuple(predicates))
+        objectives = parse_objectives(text)
+        if objectives and not predicates:
+            # 「その耐力は？」「伸びは？」→ 直前の結果の特性値
+            if is_bare_property_question(text):
+                return FollowUp(FOLLOWUP_PROPERTY, props=tuple(o.prop for o in objectives))
+            # 「その中で耐食性が良いもの」→ 直前の結果の中で順位付け
+            if anaphora:
+                return FollowUp(FOLLOWUP_RANK, objectives=tuple(objectives))
+
+    # 「その詳細」
+    if anaphora and "detail" in cues and context.designation:
+        return FollowUp(FOLLOWUP_DETAIL)
+    return None
+
+
+# ------------------------------------------------------------
+# セッション ID -> 文脈（API 用。LRU + TTL）
+# ------------------------------------------------------------
+class ConversationStore:
+    def __init__(self, max_sessions: int = 1024, ttl: Optional[float] = 3600.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # セッション ID -> (最終利用時刻, 文脈)
+        self._sessions: "OrderedDict[str, Tuple[float, ConversationContext]]" = OrderedDict()
+
+    def get(self, session: str) -> ConversationContext:
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(session, None)
+            if entry is None or (self.ttl is not None and now - entry[0] > self.ttl):
+                context = ConversationContext()
+            else:
+                context = entry[1]
+            self._sessions[session] = (now, context)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return context
+
+    def discard(self, session: str):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions)}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,232 @@
+# ------------------------------------------------------------
+# 合金記号・調質記号のあいまい照合（対称削除 = SymSpell）
+# ------------------------------------------------------------
+# - 既知の記号（転置インデックスのキー・合金列の値・熱処理シートの記号）から
+#   max_distance 文字までを削除した変形 -> 記号番号 の辞書を build 時に 1 度だけ作る
+# - 照合時は問い合わせ側の削除変形だけを引き、候補を編集距離
+#   （隣接文字の入れ替えを 1 とする Damerau–Levenshtein）で確かめる
+# - 合金記号は「合金番号 4 桁」と「調質」に分けて照合し、実在する組み合わせだけを返す
+#   （"6061-T6" 全体で削除変形を作ると、似た記号が密集していて候補が膨らむ）
+#   → 記号が数万件あっても 1 回の照合は 1 ms 未満
+# - 順位は (編集距離, 出現件数の多い順, 記号順)
+# ------------------------------------------------------------
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .alloy_index import (
+    TEMPER_PATTERN,
+    AlloyInvertedIndex,
+    AlloyNamePostings,
+    format_designation,
+    parse_designation,
+)
+
+# 正規化できない入力（桁の過不足・未知の調質）を照合用に分解する
+_LOOSE_RE = re.compile(r"^(?:AA|A)?[\s\-]*([\dO]{3,5})(?:[\s\-_]*([A-Z]\d*))?$")
+_TEMPER_ONLY_RE = re.compile(r"^" + TEMPER_PATTERN + r"$")
+
+
+class Suggestion(NamedTuple):
+    term: str
+    distance: int
+    count: int
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    # 制限付き Damerau–Levenshtein（OSA）。limit を超えたら limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: Optional[List[int]] = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+def _distance_within_one(a: str, b: str) -> int:
+    # 距離 0 / 1 / 2（1 を超える）だけを線形時間で判定する
+    if a == b:
+        return 0
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return 1
+        i, j = diff[0], diff[-1]
+        if len(diff) == 2 and j == i + 1 and a[i] == b[j] and a[j] == b[i]:
+            return 1
+        return 2
+    if abs(len(a) - len(b)) != 1:
+        return 2
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return 1 if a[i:] == b[i + 1 :] else 2
+
+
+def _deletes(term: str, distance: int) -> Set[str]:
+    out = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1 :] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+class SymSpellIndex:
+    def __init__(self, counts: Dict[str, int], max_distance: int = 2):
+        self.max_distance = max_distance
+        self.terms: List[str] = sorted(counts)
+        self.counts: List[int] = [counts[t] for t in self.terms]
+        self._exact = {t: i for i, t in enumerate(self.terms)}
+        # 削除変形 -> 記号番号（同じ変形を持つ記号が 1 つなら int のまま持ってメモリを抑える）
+        deletes: Dict[str, object] = {}
+        for i, term in enumerate(self.terms):
+            for d in _deletes(term, max_distance):
+                hit = deletes.get(d)
+                if hit is None:
+                    deletes[d] = i
+                elif isinstance(hit, list):
+                    hit.append(i)
+                else:
+                    deletes[d] = [hit, i]
+        self._deletes = deletes
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term) -> bool:
+        return term in self._exact
+
+    def lookup(
+        self, text: str, limit: Optional[int] = 5, max_distance: Optional[int] = None
+    ) -> List[Suggestion]:
+        # 短い記号ほど許す距離を小さくする（"T6" が全調質に一致しないように）
+        d = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        d = min(d, len(text) // 3)
+
+        i = self._exact.get(text)
+        if i is not None and d == 0:
+            return [Suggestion(text, 0, self.counts[i])]
+
+        seen: Set[int] = set()
+        for variant in _deletes(text, d):
+            hit = self._deletes.get(variant)
+            if hit is None:
+                continue
+            seen.update(hit if isinstance(hit, list) else (hit,))
+
+        out = []
+        for i in seen:
+            term = self.terms[i]
+            dist = _distance_within_one(text, term) if d <= 1 else edit_distance(text, term, d)
+            if dist <= d:
+                out.append(Suggestion(term, dist, self.counts[i]))
+        out.sort(key=lambda s: (s.distance, -s.count, s.term))
+        return out if limit is None else out[:limit]
+
+
+# ------------------------------------------------------------
+# 合金記号・調質記号の索引
+# ------------------------------------------------------------
+class DesignationIndex:
+    def __init__(self, combos: Dict[str, Dict[str, int]], temper_counts: Dict[str, int]):
+        # 合金番号 -> {調質（無指定は ""）: 出現件数}
+        self.combos = combos
+        self.codes = SymSpellIndex({c: sum(t.values()) for c, t in combos.items()}, 1)
+        self.tempers = SymSpellIndex(temper_counts, 1)
+
+    @classmethod
+    def build(
+        cls,
+        alloy_index: Optional[AlloyInvertedIndex],
+        all_alloys: Optional[AlloyNamePostings],
+        tempers: Iterable[str] = (),
+    ) -> "DesignationIndex":
+        combos: Dict[str, Dict[str, int]] = {}
+        temper_counts: Dict[str, int] = {}
+
+        def add(code: Optional[str], temper: Optional[str], n: int):
+            if code is None:
+                return
+            by_temper = combos.setdefault(code, {})
+            by_temper[temper or ""] = by_temper.get(temper or "", 0) + n
+            if temper:
+                temper_counts[temper] = temper_counts.get(temper, 0) + n
+
+        if alloy_index is not None:
+            for key, postings in alloy_index.postings.items():
+                code, _, temper = key.partition("-")
+                add(code, temper, len(postings))
+        if all_alloys is not None and len(all_alloys):
+            counts = np.diff(all_alloys.indptr)
+            for name, n in zip(all_alloys.names.tolist(), counts.tolist()):
+                add(*parse_designation(name), n)
+        for t in tempers:
+            t = str(t).strip().upper()
+            if _TEMPER_ONLY_RE.match(t):
+                temper_counts[t] = temper_counts.get(t, 0) + 1
+        return cls(combos, temper_counts)
+
+    @staticmethod
+    def _split(text: str) -> Tuple[Optional[str], Optional[str]]:
+        code, temper = parse_designation(text)
+        if code is not None:
+            return code, temper
+        m = _LOOSE_RE.match(str(text).strip().upper())
+        if not m:
+            return None, None
+        return m.group(1).replace("O", "0"), m.group(2)
+
+    def suggest(self, text: str, limit: int = 5) -> List[Suggestion]:
+        code, temper = self._split(text)
+        if code is None:
+            return []
+        codes = self.codes.lookup(code, None)
+        out: Dict[str, Suggestion] = {}
+        if temper:
+            tempers = self.tempers.lookup(temper, None)
+            for c in codes:
+                by_temper = self.combos[c.term]
+                for t in tempers:
+                    n = by_temper.get(t.term)
+                    if n:
+                        term = format_designation(c.term, t.term)
+                        out[term] = Suggestion(term, c.distance + t.distance, n)
+        if not out:
+            # 調質が合わない（または無指定）なら合金番号だけで照合する
+            # 調質を外した分は距離 1 として数える
+            penalty = 1 if temper else 0
+            for c in codes:
+                term = format_designation(c.term)
+                out[term] = Suggestion(term, c.distance + penalty, c.count)
+        ranked = sorted(out.values(), key=lambda s: (s.distance, -s.count, s.term))
+        return ranked[:limit]
+
+    def suggest_temper(self, symbol: str, limit: int = 5) -> List[Suggestion]:
+        return self.tempers.lookup(str(symbol).strip().upper(), limit)
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self.combos.values()) + len(self.tempers)
+
+
+def unique_best(suggestions: Sequence[Suggestion], max_distance: int = 1) -> Optional[Suggestion]:
+    # 最も近い候補が 1 つに決まり、十分近い場合だけ返す（自動補正用）
+    if not suggestions or not 0 < suggestions[0].distance <= max_distance:
+        return None
+    if len(suggestions) > 1 and suggestions[1].distance == suggestions[0].distance:
+        return None
+    return suggestions[0]
@@ -0,0 +1,1040 @@
+# ------------------------------------------------------------
+# アルミニウム合金 RAG エンジン（Streamlit に依存しない）
+# ------------------------------------------------------------
+# - app.py（Streamlit UI）と api.py（HTTP/JSON）の両方から利用する
+# ------------------------------------------------------------
+
+import io
+import logging
+import re
+import threading
+from dataclasses import replace
+from types import MappingProxyType
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .alloy_index import AlloyInvertedIndex, AlloyNamePostings, parse_designation
+from .capabilities import (
+    CAP_ALLOYS,
+    CAP_FULLTEXT,
+    CAP_MECHANICAL,
+    CAP_SERIES,
+    CAP_TEMPERS,
+    CAPABILITIES,
+)
+from .column_store import NUMERIC_COLUMNS, MechanicalColumnStore, Predicate, validate_limit
+from .conversation import (
+    FOLLOWUP_DETAIL,
+    FOLLOWUP_FILTER,
+    FOLLOWUP_PROPERTY,
+    FOLLOWUP_SIMILAR,
+    FOLLOWUP_TEMPER,
+    FOLLOWUP_TEMPER_COMPARE,
+    ConversationContext,
+    FollowUp,
+    resolve_followup,
+)
+from .designation_index import DesignationIndex, Suggestion, unique_best
+from .federation import (
+    SourceInfo,
+    SourceSpec,
+    describe_source,
+    federation_root,
+    is_federation,
+    read_federation,
+)
+from .hashing import WorkbookBuffer, file_sha256
+from .query_router import (
+    INTENT_ALLOY_DETAIL,
+    INTENT_CONDITIONS,
+    INTENT_PROPERTIES,
+    INTENT_PURE_ALUMINUM,
+    INTENT_SELECTION,
+    INTENT_SERIES_INFO,
+    INTENT_SERIES_STATS,
+    INTENT_SIMILAR,
+    INTENT_STRENGTH,
+    INTENT_TEMPER_COMPARE,
+    INTENT_TEMPER_INFO,
+    SYNONYM_SHEETS,
+    QueryRouter,
+    RoutedQuery,
+)
+from .renderers import render_markdown
+from .results import (
+    AlloyDetailResult,
+    ConditionResult,
+    FullTextResult,
+    HelpResult,
+    LoadingResult,
+    PropertyLookupResult,
+    PropertySearchResult,
+    PureAluminumResult,
+    SelectionResult,
+    SeriesStatsResult,
+    SimilarityResult,
+    StrengthResult,
+    TemperCompareResult,
+    TemperInfoResult,
+)
+from .retrieval import HybridRetriever
+from .selection import (
+    DEFAULT_OBJECTIVES,
+    Objective,
+    objective_matrix,
+    pareto_front,
+    top_k_by_score,
+    weighted_scores,
+)
+from .series_stats import STAT_MAX, STAT_MIN, STAT_SUMMARY, SeriesAggregates
+from .similarity import SimilarityIndex, validate_query
+from .tracing import span, traced
+from .workbook_cache import (
+    has_snapshot,
+    parse_sheets,
+    read_workbook,
+    read_workbook_buffer,
+    snapshot_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+# インデックスの元になるシート
+MECHANICAL_SHEET = "aluminum_handbook_table"
+SERIES_SHEET = "アルミニウム合金の特性"
+HEAT_TREATMENT_SHEET = "熱処理"
+
+# query() の分岐ごとに必要な機能（上から順に判定。どれにも当たらなければ全文検索）
+INTENT_CAPABILITIES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    (INTENT_TEMPER_INFO, (CAP_TEMPERS,)),
+    (INTENT_SIMILAR, (CAP_MECHANICAL,)),
+    (INTENT_ALLOY_DETAIL, (CAP_MECHANICAL, CAP_ALLOYS)),
+    (INTENT_TEMPER_COMPARE, (CAP_TEMPERS,)),
+    (INTENT_SERIES_STATS, (CAP_MECHANICAL,)),
+    (INTENT_PURE_ALUMINUM, (CAP_SERIES, CAP_MECHANICAL)),
+    (INTENT_SELECTION, (CAP_MECHANICAL,)),
+    (INTENT_CONDITIONS, (CAP_MECHANICAL,)),
+    (INTENT_STRENGTH, (CAP_MECHANICAL,)),
+    (INTENT_PROPERTIES, (CAP_SERIES, CAP_MECHANICAL)),
+    (INTENT_SERIES_INFO, (CAP_SERIES, CAP_MECHANICAL)),
+)
+
+# 追質問の種類ごとに必要な機能（conversation.py。どれにも当たらなければ機械特性）
+FOLLOWUP_CAPABILITIES: Dict[str, Tuple[str, ...]] = {
+    FOLLOWUP_TEMPER_COMPARE: (CAP_TEMPERS,),
+    FOLLOWUP_TEMPER: (CAP_MECHANICAL, CAP_ALLOYS),
+    FOLLOWUP_DETAIL: (CAP_MECHANICAL, CAP_ALLOYS),
+}
+
+# ------------------------------------------------------------
+# RAG クラス
+# ------------------------------------------------------------
+
+
+class AluminumAlloyRAG:
+    def __init__(
+        self,
+        excel_path: SourceSpec,
+        base: Optional["AluminumAlloyRAG"] = None,
+        background: bool = False,
+    ):
+        self.data: Dict[str, pd.DataFrame] = {}
+        # 読み込み元のパスと内容ハッシュ（SHA-256）、シート単位のハッシュ
+        self.source_path: Optional[str] = None
+        self.source_hash: Optional[str] = None
+        self.sheet_hashes: Dict[str, str] = {}
+        # 読み込んだワークブック（複数ならフェデレーション。data は統合済み）
+        self.sources: List[SourceInfo] = []
+        # 読み込みに失敗した場合のエラー（UI 側で表示する）
+        self.load_error: Optional[Exception] = None
+        self.series_info: Dict[int, Dict[str, str]] = {}
+        # 合金名 -> (シート番号, 行番号) の配列（行は参照時に解決）
+        self.all_alloys: AlloyNamePostings = AlloyNamePostings.build({})
+        self.mechanical_table: Optional[pd.DataFrame] = None
+        # 機械特性テーブルの数値列（ベクトル化検索用）
+        self.mechanical_store: Optional[MechanicalColumnStore] = None
+        # 特性ベクトルの KD 木（類似合金の検索）
+        self.similarity: Optional[SimilarityIndex] = None
+        # 系列ごとの集計（行・代表合金・最小/中央値/平均/最大・評価の分布）
+        self.series_stats: Optional[SeriesAggregates] = None
+        # 合金記号 -> (シート, 行) の転置インデックス
+        self.alloy_index: Optional[AlloyInvertedIndex] = None
+        # 合金記号・調質記号のあいまい照合
+        self.designations: Optional[DesignationIndex] = None
+        # 全文検索（BM25 + 埋め込み）
+        self.retriever: Optional[HybridRetriever] = None
+        # クエリルーター（同義語・意図のコンパイル済み照合器）
+        self.router: Optional[QueryRouter] = None
+        # 実際の中身は List[Dict[str,str]] なのでコメントだけ補足
+        self.heat_treatment_dict: Dict[str, List[Dict[str, str]]] = {}
+        # 利用可能になった機能（capabilities.py）。バックグラウンド読み込みでは段階的に増える
+        self.ready: FrozenSet[str] = frozenset()
+        # 読み込みの完了（失敗した場合も load_error を設定して完了扱い）
+        self.loaded = threading.Event()
+        self.loader: Optional[threading.Thread] = None
+        self._load_lock = threading.Lock()
+        self._freeze_pending = False
+
+        # 調質の概要（簡易説明）
+        self.temper_descriptions = {
+            "T6": "溶体化処理後、人工時効硬化処理を施したもの。",
+            "T651": "T6に加え、残留応力除去のため引張処理。",
+            "T3": "溶体化→冷間加工→自然時効。",
+            "T4": "溶体化→自然時効。",
+            "T5": "高温加工後に人工時効硬化。",
+            "O": "焼なまし材で最も柔らかい。",
+            "H12": "1/4硬化",
+            "H14": "1/2硬化",
+            "H16": "3/4硬化",
+            "H18": "完全硬化",
+        }
+
+        # 曖昧検索用・同義語辞書
+        self.semantic_dict = {
+            "8000系": ["8000", "al-li", "アルミリチウム", "aluminum lithium", "al li"],
+            "7000系": ["超高強度", "航空機", "7075", "7050"],
+            "6000系": ["汎用", "押出", "6061", "6063"],
+            "1000系": ["純アルミ", "純アルミニウム"],
+            "軽量": ["軽い", "低密度", "軽量化"],
+            "高強度": ["強い", "高強度", "引張"],
+            "耐食": ["耐食", "耐食性", "腐食"],
+            "溶接": ["溶接", "溶接性"],
+            "切削": ["切削", "加工しやすい"],
+            "航空": ["航空", "宇宙", "ロケット", "機体"],
+            "構造材": ["構造", "フレーム", "骨組み"],
+        }
+
+        # データ読み込み
+        # base（編集前のワークブックのインスタンス）があれば、内容の変わった
+        # シートだけを読み直し、それ以外の索引は base と共有する（base は変更しない）
+        # background=True ならスレッドで読み込み、コンストラクタはすぐに戻る
+        if background:
+            # 同義語シートを反映する前の仮のルーター（読み込み後に差し替える）
+            self.router = QueryRouter(self.semantic_dict)
+            self.loader = threading.Thread(
+                target=self._load_in_background,
+                args=(excel_path, base),
+                name="alloy-rag-loader",
+                daemon=True,
+            )
+            self.loader.start()
+        else:
+            self._load(excel_path, base)
+
+    def _load(
+        self,
+        excel_path: SourceSpec,
+        base: Optional["AluminumAlloyRAG"] = None,
+        progressive: bool = False,
+    ):
+        with span("load", path=describe_source(excel_path), incremental=base is not None):
+            if progressive and base is None and not is_federation(excel_path):
+                self._load_quick(excel_path)
+            self.load_data(excel_path, base)
+            touched = self.touched_sheets(base)
+            if touched is None:
+                self.parse_all_sheets()
+                self.build_indexes()
+            else:
+                logger.info("差分再インデックス: %s", sorted(touched))
+                self.parse_all_sheets(base, touched)
+                self.update_indexes(base, touched)
+        self._mark_loaded()
+
+    def _load_in_background(self, excel_path: SourceSpec, base: Optional["AluminumAlloyRAG"]):
+        try:
+            if base is not None:
+                base.wait_loaded()
+            self._load(excel_path, base, progressive=True)
+        except Exception as e:
+            logger.exception("バックグラウンド読み込みに失敗しました")
+            self.load_error = e
+            self._mark_loaded()
+
+    # --------------------------------------------------------
+    # 段階的な公開（索引は組み立て終えてから属性へ代入し、その後に機能を公開する）
+    # --------------------------------------------------------
+    def _publish(self, capability: str):
+        self.ready = self.ready | {capability}
+
+    def _mark_loaded(self):
+        with self._load_lock:
+            self.ready = frozenset(CAPABILITIES)
+            self.loaded.set()
+            freeze = self._freeze_pending
+        if freeze:
+            self._freeze()
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> bool:
+        return self.loaded.wait(timeout)
+
+    def missing_capabilities(self, intents: Set[str]) -> Tuple[str, ...]:
+        ready = self.ready
+        for intent, needed in INTENT_CAPABILITIES:
+            if intent in intents:
+                break
+        else:
+            needed = (CAP_FULLTEXT,)
+        return tuple(c for c in needed if c not in ready)
+
+    # --------------------------------------------------------
+    # 共有用に読み取り専用化（KnowledgeBaseRegistry から呼ばれる）
+    # --------------------------------------------------------
+    def freeze(self):
+        # バックグラウンド読み込み中なら完了時に行う
+        with self._load_lock:
+            if not self.loaded.is_set():
+                self._freeze_pending = True
+                return
+        self._freeze()
+
+    def _freeze(self):
+        self.data = MappingProxyType(self.data)
+        self.series_info = MappingProxyType(self.series_info)
+        self.heat_treatment_dict = MappingProxyType(self.heat_treatment_dict)
+
+    # --------------------------------------------------------
+    # 安全な合金名フォーマット
+    # --------------------------------------------------------
+    def safe_alloy_format(self, alloy_value, temper) -> str:
+        s = str(alloy_value)
+        nums = re.findall(r"\d+", s)
+        if nums:
+            n = int(nums[0])
+            return f"A{n:04d}-{temper}"
+        return f"{s}-{temper}"
+
+    # --------------------------------------------------------
+    # Excel 読み込み（1 回のパース + 列指向スナップショット）
+    # --------------------------------------------------------
+    @traced("load.read_workbook")
+    def load_data(self, excel_path: SourceSpec, base: Optional["AluminumAlloyRAG"] = None):
+        federated = is_federation(excel_path)
+        # アップロード（メモリ上のワークブック）はディスク上の置き場所を持たない
+        uploaded = isinstance(excel_path, WorkbookBuffer)
+        if federated:
+            self.source_path = federation_root(excel_path)
+        else:
+            self.source_path = None if uploaded else str(excel_path)
+        previous = None
+        if base is not None and base.sheet_hashes:
+            previous = (base.data, base.sheet_hashes)
+        try:
+            if federated:
+                # ディレクトリ・複数ファイル：統合した data と、ソースごとの情報
+                self.data, self.source_hash, self.sheet_hashes, self.sources = read_federation(
+                    excel_path
+                )
+            else:
+                read = read_workbook_buffer if uploaded else read_workbook
+                self.data, self.source_hash, self.sheet_hashes = read(
+                    excel_path, previous=previous
+                )
+                name = describe_source(excel_path)
+                self.sources = [
+                    SourceInfo(Path(name).stem, name, self.source_hash, tuple(self.data))
+                ]
+        except Exception as e:
+            logger.error("ファイル読み込みエラー: %s", e)
+            self.data = {}
+            self.load_error = e
+
+    def touched_sheets(self, base: Optional["AluminumAlloyRAG"]) -> Optional[Set[str]]:
+        # 変更・追加・削除されたシート名。差分で更新できない場合は None
+        if base is None or base.load_error is not None or self.load_error is not None:
+            return None
+        if not base.sheet_hashes or not self.sheet_hashes:
+            return None
+        touched = {
+            name for name, h in self.sheet_hashes.items() if base.sheet_hashes.get(name) != h
+        }
+        touched.update(name for name in base.sheet_hashes if name not in self.sheet_hashes)
+        return touched
+
+    # --------------------------------------------------------
+    # 先行読み込み：熱処理・系列シートだけを読み、調質の説明などを先に使えるようにする
+    # （スナップショットがあれば全体の読み込みも速いので省略）
+    # --------------------------------------------------------
+    @traced("load.quick")
+    def _load_quick(self, excel_path: SourceSpec):
+        sheets = [HEAT_TREATMENT_SHEET, SERIES_SHEET]
+        try:
+            if isinstance(excel_path, WorkbookBuffer):
+                self.data = parse_sheets(io.BytesIO(excel_path.data), sheets)
+            elif has_snapshot(excel_path, file_sha256(excel_path)):
+                return
+            else:
+                self.data = parse_sheets(excel_path, sheets)
+        except Exception as e:
+            logger.warning("先行読み込みに失敗しました: %s", e)
+            return
+        self._build_heat_treatment()
+        self._publish(CAP_TEMPERS)
+        self._build_series_info()
+        self._publish(CAP_SERIES)
+
+    # --------------------------------------------------------
+    # 全シート走査して合金名インデックス作成（列単位のベクトル演算）
+    # --------------------------------------------------------
+    @traced("index.alloy_names")
+    def parse_all_sheets(
+        self,
+        base: Optional["AluminumAlloyRAG"] = None,
+        touched: Optional[Set[str]] = None,
+    ):
+        if base is not None and touched is not None:
+            self.all_alloys = base.all_alloys.updated(self.data, touched)
+        else:
+            self.all_alloys = AlloyNamePostings.build(self.data)
+
+    # --------------------------------------------------------
+    # 系列情報 & 機械特性テーブル & 熱処理テーブル
+    # --------------------------------------------------------
+    @traced("index.build")
+    def build_indexes(self):
+        # 軽いものから順に作り、できたものから公開する
+        self._build_heat_treatment()
+        self._publish(CAP_TEMPERS)
+        self._build_series_info()
+        self._publish(CAP_SERIES)
+
+        # クエリルーター（「同義語」シートがあれば辞書に追加）
+        with span("index.router"):
+            self.router = QueryRouter.from_data(self.semantic_dict, self.data)
+
+        self._build_mechanical()
+        self._publish(CAP_MECHANICAL)
+
+        # 全シート横断の合金記号インデックス
+        with span("index.alloy_index"):
+            self.alloy_index = AlloyInvertedIndex.build(self.data)
+        self._build_designations()
+        self._publish(CAP_ALLOYS)
+
+        # 全文検索インデックス（スナップショットの隣に保存）
+        with span("index.retriever"):
+            self.retriever = HybridRetriever.load_or_build(
+                self._retrieval_dir(), self.data, self.series_info
+            )
+        self._publish(CAP_FULLTEXT)
+
+    # --------------------------------------------------------
+    # 差分再インデックス（変更されたシートに依存する索引だけ作り直す）
+    # --------------------------------------------------------
+    @traced("index.update")
+    def update_indexes(self, base: "AluminumAlloyRAG", touched: Set[str]):
+        if MECHANICAL_SHEET in touched:
+            self._build_mechanical()
+        else:
+            self.mechanical_table = base.mechanical_table
+            self.mechanical_store = base.mechanical_store
+            self.similarity = base.similarity
+            self.series_stats = base.series_stats
+
+        with span("index.alloy_index", incremental=True):
+            self.alloy_index = base.alloy_index.updated(self.data, touched)
+
+        if touched.isdisjoint(SYNONYM_SHEETS):
+            self.router = base.router
+        else:
+            self.router = QueryRouter.from_data(self.semantic_dict, self.data)
+
+        series_changed = SERIES_SHEET in touched
+        if series_changed:
+            self._build_series_info()
+        else:
+            self.series_info = dict(base.series_info)
+
+        if HEAT_TREATMENT_SHEET in touched:
+            self._build_heat_treatment()
+        else:
+            self.heat_treatment_dict = dict(base.heat_treatment_dict)
+        self._build_designations()
+
+        with span("index.retriever", incremental=True):
+            self.retriever = HybridRetriever.load_or_build(
+                self._retrieval_dir(),
+                self.data,
+                self.series_info,
+                previous=base.retriever,
+                old_sheets=list(base.data.keys()),
+                touched=touched,
+                series_changed=series_changed,
+            )
+
+    def _retrieval_dir(self) -> Optional[Path]:
+        if self.source_path and self.source_hash:
+            return snapshot_dir(self.source_path, self.source_hash) / "retrieval"
+        return None
+
+    # --------------------------------------------------------
+    # 機械特性テーブル
+    # --------------------------------------------------------
+    @traced("index.mechanical")
+    def _build_mechanical(self):
+        table = self.data.get(MECHANICAL_SHEET)
+        store = MechanicalColumnStore(table) if table is not None else None
+        with span("index.similarity"):
+            self.similarity = SimilarityIndex(store) if store is not None else None
+        with span("index.series_stats"):
+            self.series_stats = (
+                SeriesAggregates.build(
+                    store,
+                    table["Alloy"] if "Alloy" in table else [""] * len(table),
+                    table["Temper"] if "Temper" in table else [""] * len(table),
+                    self.safe_alloy_format,
+                )
+                if store is not None
+                else None
+            )
+        self.mechanical_store = store
+        self.mechanical_table = table
+
+    # --------------------------------------------------------
+    # 系列情報
+    # --------------------------------------------------------
+    @traced("index.series_info")
+    def _build_series_info(self):
+        # 読み込み中の参照に備え、組み立て終えてから差し替える
+        series_info: Dict[int, Dict[str, str]] = {}
+        series_sheet = self.data.get(SERIES_SHEET)
+        if series_sheet is not None:
+            for _, r in series_sheet.iterrows():
+                name = r.get("合金系")
+                if isinstance(name, str) and "系" in name:
+                    m = re.search(r"(\d{4})", name)
+                    if m:
+                        s = int(m.group(1)) // 1000 * 1000
+                        series_info[s] = {
+                            "name": name.replace("\n", " "),
+                            "overview": r.get("概要", ""),
+                            "features": r.get(
+                                "代表的な特性（強度、溶接性、耐食性）", ""
+                            ),
+                        }
+        self.series_info = series_info
+
+    # --------------------------------------------------------
+    # 合金記号・調質記号のあいまい照合索引
+    # --------------------------------------------------------
+    @traced("index.designations")
+    def _build_designations(self):
+        tempers = list(self.heat_treatment_dict) + list(self.temper_descriptions)
+        self.designations = DesignationIndex.build(self.alloy_index, self.all_alloys, tempers)
+
+    # --------------------------------------------------------
+    # 熱処理（調質）ワークシートの読み込み
+    # --------------------------------------------------------
+    @traced("index.heat_treatment")
+    def _build_heat_treatment(self):
+        heat_treatment: Dict[str, List[Dict[str, str]]] = {}
+        heat_sheet = self.data.get(HEAT_TREATMENT_SHEET)
+        if heat_sheet is not None:
+            for _, row in heat_sheet.iterrows():
+                symbol = str(row.get("記号", "")).strip().upper()
+                if not symbol:
+                    continue
+
+                definition = str(row.get("定義", "")).strip()
+                meaning = str(row.get("意味", "")).strip()
+
+                if symbol not in heat_treatment:
+                    heat_treatment[symbol] = []
+
+                heat_treatment[symbol].append(
+                    {
+                        "定義": definition,
+                        "意味": meaning,
+                    }
+                )
+        self.heat_treatment_dict = heat_treatment
+
+    # --------------------------------------------------------
+    # 熱処理情報
+    # --------------------------------------------------------
+    @traced("engine.get_heat_treatment_info")
+    def get_heat_treatment_info(self, symbol: str) -> TemperInfoResult:
+        infos = self.heat_treatment_dict.get(symbol.upper()) or []
+        if not infos and symbol.upper() in self.temper_descriptions:
+            # 熱処理シートに無い基本記号（O など）は組み込みの簡易説明で答える
+            entry = {"定義": self.temper_descriptions[symbol.upper()], "意味": ""}
+            return TemperInfoResult(symbol, (entry,), builtin=True)
+        if not infos and self.designations is not None:
+            # 熱処理シートに説明のある記号だけを候補にする
+            suggestions = tuple(
+                s.term
+                for s in self.designations.suggest_temper(symbol, limit=10)
+                if s.distance and s.term in self.heat_treatment_dict
+            )
+            return TemperInfoResult(symbol, (), suggestions[:5])
+        return TemperInfoResult(symbol, tuple(infos))
+
+    # --------------------------------------------------------
+    # 熱処理の比較（T6 と T651 など）
+    # --------------------------------------------------------
+    @traced("engine.compare_tempers")
+    def compare_tempers(self, t1: str, t2: str) -> TemperCompareResult:
+        t1 = t1.upper()
+        t2 = t2.upper()
+        return TemperCompareResult(
+            t1,
+            t2,
+            tuple(self.heat_treatment_dict.get(t1) or []),
+            tuple(self.heat_treatment_dict.get(t2) or []),
+        )
+
+    # --------------------------------------------------------
+    # 純アルミ情報
+    # --------------------------------------------------------
+    @traced("engine.get_pure_aluminum_info")
+    def get_pure_aluminum_info(self) -> PureAluminumResult:
+        if self.mechanical_table is None:
+            return PureAluminumResult()
+        return PureAluminumResult(self.series_stats.rows_in(1000))
+
+    # --------------------------------------------------------
+    # 系列の集計（索引構築時に計算済みの値を引くだけ）
+    # --------------------------------------------------------
+    @traced("engine.get_series_stats")
+    def get_series_stats(
+        self, series: Sequence[int], props: Sequence[str] = (), stat: str = STAT_SUMMARY
+    ) -> SeriesStatsResult:
+        stats = self.series_stats
+        if stats is None:
+            return SeriesStatsResult((), stat, tuple(props), missing=tuple(series))
+
+        props = tuple(p for p in dict.fromkeys(props) if p in stats.props)
+        if not props:
+            # 最大・最小は引張強さ、平均・中央値は数値の特性、統計は全特性
+            if stat in (STAT_MAX, STAT_MIN):
+                props = ("tensile",)
+            elif stat == STAT_SUMMARY:
+                props = stats.props
+            else:
+                props = tuple(p for p in stats.props if p in NUMERIC_COLUMNS)
+        found = tuple(s for s in series if s in stats)
+        missing = tuple(s for s in series if s not in stats)
+
+        rows = np.empty(0, dtype=np.int64)
+        if stat in (STAT_MAX, STAT_MIN):
+            best = (stats.best(s, p, stat) for s in found for p in props)
+            rows = np.array(
+                list(dict.fromkeys(r for r in best if r is not None)), dtype=np.int64
+            )
+        return SeriesStatsResult(found, stat, props, rows, missing)
+
+    # --------------------------------------------------------
+    # 引張強さで検索
+    # --------------------------------------------------------
+    @traced("engine.get_alloy_by_strength")
+    def get_alloy_by_strength(self, min_strength: float, limit: int = 10) -> StrengthResult:
+        validate_limit(limit)
+        if self.mechanical_table is None:
+            return StrengthResult(min_strength)
+        return StrengthResult(min_strength, self.strength_rows(min_strength, limit))
+
+    def strength_rows(self, min_strength: float, limit: int = 10) -> np.ndarray:
+        store = self.mechanical_store
+        mask = store.mask([Predicate("tensile", ">=", min_strength)])
+        return store.top_k("tensile", limit, mask=mask)
+
+    # --------------------------------------------------------
+    # 複合条件で検索（引張強さ ≥ 400 かつ 伸び ≥ 10 など）
+    # --------------------------------------------------------
+    @traced("engine.get_alloys_by_conditions")
+    def get_alloys_by_conditions(
+        self,
+        predicates: List[Predicate],
+        limit: int = 10,
+        within: Optional[np.ndarray] = None,
+        scope: Optional[str] = None,
+    ) -> ConditionResult:
+        # within: 対象にする行（追質問で直前の結果だけを絞り込む場合）。scope はその説明
+        if self.mechanical_table is None:
+            return ConditionResult(predicates, scope=scope)
+
+        store = self.mechanical_store
+        if within is None:
+            mask = store.mask(predicates)
+            top = store.top_k(predicates[0].prop, limit, mask=mask)
+            return ConditionResult(predicates, top, int(mask.sum()))
+        hits = store.select(predicates, within)
+        top = store.top_k(predicates[0].prop, limit, rows=hits)
+        return ConditionResult(predicates, top, int(hits.size), scope)
+
+    # --------------------------------------------------------
+    # 多目的の材料選定（重み付きスコア上位 + パレート最適）
+    # --------------------------------------------------------
+    @traced("engine.select_materials")
+    def select_materials(
+        self,
+        objectives: Sequence[Objective] = (),
+        constraints: Sequence[Predicate] = (),
+        limit: int = 10,
+        within: Optional[np.ndarray] = None,
+        scope: Optional[str] = None,
+    ) -> SelectionResult:
+        validate_limit(limit)
+        objectives = list(objectives) or list(DEFAULT_OBJECTIVES)
+        constraints = list(constraints)
+        if self.mechanical_table is None:
+            return SelectionResult(objectives, constraints, scope=scope)
+
+        store = self.mechanical_store
+        rows = store.select(constraints, within)
+        points = objective_matrix(store, objectives, rows)
+        scores = weighted_scores(points, [o.weight for o in objectives])
+
+        top = top_k_by_score(rows, scores, limit)
+        front = np.flatnonzero(pareto_front(points))
+        front = front[np.lexsort((rows[front], -scores[front]))]
+        return SelectionResult(
+            objectives,
+            constraints,
+            rows[top],
+            scores[top],
+            rows[front],
+            scores[front],
+            int(rows.size),
+            scope,
+        )
+
+    # --------------------------------------------------------
+    # 特定合金の詳細表示
+    # --------------------------------------------------------
+    def mechanical_row_for(self, alloy: str) -> Optional[int]:
+        code, temper = parse_designation(alloy)
+        if code is None or self.mechanical_table is None:
+            return None
+        rows = self.mechanical_store.rows_for_alloy(code)
+        if not rows.size:
+            return None
+        # 調質が指定されていればその行を優先
+        if temper:
+            for i in rows:
+                if str(self.mechanical_table["Temper"].iat[i]).upper() == temper:
+                    return int(i)
+        return int(rows[0])
+
+    @traced("engine.get_alloy_detailed_info")
+    def get_alloy_detailed_info(self, alloy: str) -> AlloyDetailResult:
+        # 他シートは転置インデックスのポスティングのまま保持（描画時に行へ解決）
+        result = AlloyDetailResult(
+            alloy, self.mechanical_row_for(alloy), self.alloy_index.lookup(alloy)
+        )
+        if result.found or self.designations is None:
+            return result
+
+        # 見つからなければ近い記号を探し、1 文字違いの候補が 1 つに決まればその詳細を返す
+        suggestions = self.designations.suggest(alloy)
+        best = unique_best(suggestions)
+        if best is not None:
+            return AlloyDetailResult(
+                best.term,
+                self.mechanical_row_for(best.term),
+                self.alloy_index.lookup(best.term),
+                requested=alloy,
+            )
+        return replace(result, suggestions=tuple(s.term for s in suggestions))
+
+    # --------------------------------------------------------
+    # 類似合金（特性ベクトルの最近傍。在庫切れの代替材の検討など）
+    # --------------------------------------------------------
+    @traced("engine.find_similar_alloys")
+    def find_similar_alloys(
+        self, alloy: str, weights: Optional[Dict[str, float]] = None, k: int = 10
+    ) -> SimilarityResult:
+        # 件数・重みの不正な指定は ValueError（API では 400）
+        validate_query(k, weights)
+        if self.similarity is None:
+            return SimilarityResult(alloy)
+        requested = None
+        row = self.mechanical_row_for(alloy)
+        if row is None and self.designations is not None:
+            suggestions = self.designations.suggest(alloy)
+            best = unique_best(suggestions)
+            if best is None:
+                return SimilarityResult(alloy, suggestions=tuple(s.term for s in suggestions))
+            requested, alloy = alloy, best.term
+            row = self.mechanical_row_for(alloy)
+        if row is None:
+            return SimilarityResult(alloy, requested=requested)
+
+        # 基準と同じ合金 × 調質の行（重複行・他のワークブックの同じ行）は候補から外す
+        store = self.mechanical_store
+        exclude = (store.alloy_codes == store.alloy_codes[row]) & (
+            store.temper_codes == store.temper_codes[row]
+        )
+
+        hits = self.similarity.query(row, k, weights, exclude)
+        w = self.similarity.weight_vector(weights)
+        w[self.similarity.missing[row]] = 0.0
+        error = None
+        if not (w > 0).any():
+            error = f"{alloy.upper()} は重みを付けた特性の値がすべて欠損しているため、比較できません。"
+        return SimilarityResult(
+            alloy,
+            row,
+            tuple(zip(self.similarity.props, w.tolist())),
+            hits.rows,
+            hits.distances,
+            hits.contributions,
+            requested=requested,
+            error=error,
+        )
+
+    # --------------------------------------------------------
+    # 合金記号・調質記号の候補（あいまい照合）
+    # --------------------------------------------------------
+    @traced("engine.suggest_designations")
+    def suggest_designations(self, text: str, limit: int = 5) -> Dict[str, List[Suggestion]]:
+        if self.designations is None:
+            return {"alloys": [], "tempers": []}
+        return {
+            "alloys": self.designations.suggest(text, limit),
+            "tempers": self.designations.suggest_temper(text, limit),
+        }
+
+    # --------------------------------------------------------
+    # 全文検索（BM25 + 埋め込み）
+    # --------------------------------------------------------
+    @traced("engine.search_full_text")
+    def search_full_text(self, query: str, k: int = 5) -> FullTextResult:
+        hits = self.retriever.search(query, k=k) if self.retriever else []
+        if not hits:
+            return FullTextResult(query)
+        docs, scores = zip(*hits)
+        return FullTextResult(
+            query, np.array(docs, dtype=np.int64), np.array(scores, dtype=np.float64)
+        )
+
+    # --------------------------------------------------------
+    # 特性ベース検索
+    # --------------------------------------------------------
+    @traced("engine.search_by_properties")
+    def search_by_properties(
+        self, keywords: List[str], limit: int = 10
+    ) -> PropertySearchResult:
+        keys = [k.lower() for k in keywords]
+
+        # 系列レベル
+        series_hit = []
+        for series, info in self.series_info.items():
+            text = f"{info['name']} {info['overview']} {info['features']}".lower()
+            if all(k in text for k in keys):
+                series_hit.append(series)
+
+        # 合金レベル（行テキストは読み込み時に 1 度だけ作ってある）
+        if self.mechanical_store is not None:
+            alloy_hit = self.mechanical_store.rows_containing(keys, limit)
+        else:
+            alloy_hit = np.array([], dtype=np.int64)
+
+        if not series_hit and not alloy_hit.size:
+            # 完全一致しない場合は全文検索の結果を返す
+            return PropertySearchResult(
+                keywords, fallback=self.search_full_text(" ".join(keywords))
+            )
+
+        return PropertySearchResult(
+            keywords, tuple(sorted(series_hit)), alloy_hit
+        )
+
+    @traced("engine.get_series_overview")
+    def get_series_overview(
+        self, keywords: List[str], series: Sequence[int]
+    ) -> PropertySearchResult:
+        # 言及された系列の概要（代表合金は描画時に series_stats から引く）
+        known = tuple(sorted(s for s in set(series) if s in self.series_info))
+        if not known:
+            # 系列シートに無い系列は全文検索の結果を返す
+            return PropertySearchResult(
+                keywords, fallback=self.search_full_text(" ".join(keywords))
+            )
+        return PropertySearchResult(keywords, known)
+
+    # --------------------------------------------------------
+    # 曖昧検索ワードの正規化（コンパイル済みルーターで 1 回走査）
+    # --------------------------------------------------------
+    @traced("normalize_query")
+    def normalize_query(self, query: str) -> List[str]:
+        return self.router.route(query).keywords
+
+    # --------------------------------------------------------
+    # 追質問（会話の文脈。conversation.py）
+    # --------------------------------------------------------
+    # routed: 振り分け済みのクエリ（呼び出し側で 1 回だけ route したものを渡す）
+    def followup_for(
+        self,
+        q: str,
+        context: Optional[ConversationContext],
+        routed: Optional[RoutedQuery] = None,
+    ) -> Optional[FollowUp]:
+        if context is None:
+            return None
+        context.bind(self.source_hash)
+        return resolve_followup(routed or self.router.route(q), context)
+
+    def cache_key(
+        self,
+        q: str,
+        context: Optional[ConversationContext] = None,
+        routed: Optional[RoutedQuery] = None,
+    ) -> str:
+        # 応答キャッシュのキー。文脈に依存する追質問だけ文脈の指紋を含める
+        if self.followup_for(q, context, routed) is None:
+            return q
+        return f"{q} ⟨文脈 {context.fingerprint()}⟩"
+
+    @traced("engine.answer_followup")
+    def answer_followup(self, followup: FollowUp, context: ConversationContext) -> Any:
+        kind = followup.kind
+        if kind == FOLLOWUP_SIMILAR:
+            weights = {o.prop: o.weight for o in followup.objectives}
+            return self.find_similar_alloys(context.designation, weights)
+        if kind == FOLLOWUP_TEMPER:
+            code, _ = parse_designation(context.designation)
+            return self.get_alloy_detailed_info(f"A{code}-{followup.temper}")
+        if kind == FOLLOWUP_TEMPER_COMPARE:
+            return self.compare_tempers(context.temper, followup.temper)
+        if kind == FOLLOWUP_DETAIL:
+            return self.get_alloy_detailed_info(context.designation)
+
+        # 以下は直前の結果の行だけを対象にする（全行は走査しない）
+        if kind == FOLLOWUP_PROPERTY:
+            return PropertyLookupResult(context.subject, followup.props, context.rows)
+        if kind == FOLLOWUP_FILTER:
+            return self.get_alloys_by_conditions(
+                list(followup.predicates), within=context.rows, scope=context.subject
+            )
+        return self.select_materials(
+            followup.objectives, within=context.rows, scope=context.subject
+        )
+
+    # --------------------------------------------------------
+    # クエリ振り分け（確定・安全版）
+    # --------------------------------------------------------
+    @traced("process_query")
+    def process_query(self, q: str, context: Optional[ConversationContext] = None) -> str:
+        return render_markdown(self.query(q, context), self)
+
+    @traced("query")
+    def query(
+        self,
+        q: str,
+        context: Optional[ConversationContext] = None,
+        routed: Optional[RoutedQuery] = None,
+    ) -> Any:
+        # context: セッションの文脈。渡すと追質問を解決し、回答の実体を文脈に残す
+        routed = routed or self.router.route(q)
+        followup = None
+        if context is not None:
+            context.bind(self.source_hash)
+            followup = resolve_followup(routed, context)
+
+        # バックグラウンド読み込み中で、必要な索引がまだ無い
+        if not self.loaded.is_set():
+            if followup is not None:
+                needed = FOLLOWUP_CAPABILITIES.get(followup.kind, (CAP_MECHANICAL,))
+                pending = tuple(c for c in needed if c not in self.ready)
+            else:
+                pending = self.missing_capabilities(routed.intents)
+            if pending:
+                return LoadingResult(pending, tuple(c for c in CAPABILITIES if c in self.ready))
+
+        if followup is not None:
+            result = self.answer_followup(followup, context)
+        else:
+            result = self._answer(routed)
+        if context is not None:
+            context.remember(result, self)
+        return result
+
+    def _answer(self, routed: RoutedQuery) -> Any:
+        q = routed.text
+        intents = routed.intents
+
+        # --------------------------------------------------
+        # ① 🔥 熱処理単体（T6とは？ / T6処理について教えて / O材とは？）
+        #    → 「A6061-T6 の詳細」にはマッチしないよう fullmatch で判定
+        # --------------------------------------------------
+        if INTENT_TEMPER_INFO in intents:
+            return self.get_heat_treatment_info(routed.temper_symbol)
+
+        # --------------------------------------------------
+        # ②' 類似合金（「A7075-T6 に近い合金」「A6061-T6 の代替材（耐食性重視）」）
+        # --------------------------------------------------
+        if INTENT_SIMILAR in intents:
+            weights = {o.prop: o.weight for o in routed.objectives}
+            return self.find_similar_alloys(routed.alloys[0], weights)
+
+        # --------------------------------------------------
+        # ② 🧱 合金記号（A6061-T6 など）※ A + 4桁 必須
+        # --------------------------------------------------
+        if INTENT_ALLOY_DETAIL in intents:
+            return self.get_alloy_detailed_info(routed.alloys[0])
+
+        # --------------------------------------------------
+        # ③ 🔥 熱処理の比較（T6 と T651）
+        # --------------------------------------------------
+        if INTENT_TEMPER_COMPARE in intents:
+            return self.compare_tempers(routed.tempers[0], routed.tempers[1])
+
+        # --------------------------------------------------
+        # ③' 系列の集計（「6000系の平均引張強さ」「7000系で最も強い調質」）
+        # --------------------------------------------------
+        if INTENT_SERIES_STATS in intents:
+            props = [o.prop for o in routed.objectives]
+            return self.get_series_stats(routed.series, props, routed.stat)
+
+        # --------------------------------------------------
+        # ④ 純アルミ
+        # --------------------------------------------------
+        if INTENT_PURE_ALUMINUM in intents:
+            return self.get_pure_aluminum_info()
+
+        # --------------------------------------------------
+        # ⑤'' 多目的選定（「強度と耐食性のバランスが良い合金」など）
+        # --------------------------------------------------
+        if INTENT_SELECTION in intents:
+            return self.select_materials(routed.objectives, routed.predicates)
+
+        # --------------------------------------------------
+        # ⑤' 数値条件（「引張強さ 400 以上 かつ 伸び 10% 以上」など）
+        # --------------------------------------------------
+        if INTENT_CONDITIONS in intents:
+            return self.get_alloys_by_conditions(routed.predicates)
+
+        # --------------------------------------------------
+        # ⑤ 引張強さ
+        # --------------------------------------------------
+        if INTENT_STRENGTH in intents:
+            val = routed.numbers[0] if routed.numbers else 400
+            return self.get_alloy_by_strength(val)
+
+        # --------------------------------------------------
+        # ⑥ 系列・特性検索
+        # --------------------------------------------------
+        if INTENT_PROPERTIES in intents:
+            return self.search_by_properties(routed.keywords)
+
+        # --------------------------------------------------
+        # ⑥' 系列の概要（「8000系の材料について教えて」）
+        # --------------------------------------------------
+        if INTENT_SERIES_INFO in intents:
+            return self.get_series_overview(routed.keywords, routed.series)
+
+        # --------------------------------------------------
+        # ⑦ どの分岐にも当たらなければ全文検索
+        # --------------------------------------------------
+        full_text = self.search_full_text(q)
+        if full_text.found:
+            return full_text
+
+        # --------------------------------------------------
+        # デフォルト
+        # --------------------------------------------------
+        return HelpResult()
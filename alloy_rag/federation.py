@@ -0,0 +1,212 @@
+# ------------------------------------------------------------
+# 複数ワークブックのフェデレーション（仕入先別・規格別のハンドブックを 1 つの索引に）
+# ------------------------------------------------------------
+# - AluminumAlloyRAG にディレクトリ（中の .xlsx すべて）かパスのリストを渡すと、
+#   全ワークブックを読み込んで 1 つの data（シート名 -> DataFrame）にまとめる
+#   → 既存の索引・ルーター・全文検索はそのまま全ソースを 1 回で検索する
+# - 同名のシートは縦に連結し、合金 × 調質（合金列が無いシートは行全体）が同じ行は
+#   先に指定したソースの行だけを残す（1 つのソース内の重複は元のまま）。
+#   各行の「出典」列に、その行を持つソースを列挙する
+# - スナップショットの無いワークブックは共有のプロセスプール（workbook_cache）で並列に
+#   パースしてスナップショットを書き、親プロセスはスナップショット（memory-map）から読む
+# - アップロード（WorkbookBuffer）はメモリ上のまま読み込む（ディスクには書かない）
+# - 内容ハッシュは各ファイルのハッシュから、シートのハッシュは各ソースの同名シートの
+#   ハッシュから求める（差分再インデックスがそのまま使える）
+# ------------------------------------------------------------
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .alloy_index import parse_designation
+from .hashing import WorkbookBuffer, combined_sha256, file_sha256
+from .workbook_cache import has_snapshot, map_in_pool, read_workbook, read_workbook_buffer
+
+# 出典（ソースのラベル）を入れる列
+SOURCE_COLUMN = "出典"
+
+_WORKBOOK_SUFFIXES = (".xlsx", ".xlsm")
+_ALLOY_COL_KEYS = ["合金", "alloy"]
+_TEMPER_COL_KEYS = ["temper", "質別", "調質"]
+
+Source = Union[str, os.PathLike, WorkbookBuffer]
+SourceSpec = Union[Source, Sequence[Source]]
+
+
+class SourceInfo(NamedTuple):
+    label: str
+    path: str
+    sha256: str
+    sheets: Tuple[str, ...]
+
+
+# ------------------------------------------------------------
+# ソースの列挙
+# ------------------------------------------------------------
+def is_federation(spec: SourceSpec) -> bool:
+    if isinstance(spec, WorkbookBuffer):
+        return False
+    if isinstance(spec, (str, os.PathLike)):
+        return Path(spec).is_dir()
+    return True
+
+
+def describe_source(spec: SourceSpec) -> str:
+    # ログ・トレース用（バイト列そのものは出さない）
+    if isinstance(spec, WorkbookBuffer):
+        return spec.name
+    if isinstance(spec, (str, os.PathLike)):
+        return str(spec)
+    return ", ".join(describe_source(s) for s in spec)
+
+
+def discover_sources(spec: SourceSpec) -> List[Source]:
+    # ディレクトリは中の .xlsx をファイル名順に（Excel の一時ファイル ~$ は除く）
+    if isinstance(spec, WorkbookBuffer):
+        return [spec]
+    if isinstance(spec, (str, os.PathLike)):
+        p = Path(spec)
+        if not p.is_dir():
+            return [str(p)]
+        return sorted(
+            str(f)
+            for f in p.iterdir()
+            if f.is_file()
+            and f.suffix.lower() in _WORKBOOK_SUFFIXES
+            and not f.name.startswith(("~$", "."))
+        )
+    return [s if isinstance(s, WorkbookBuffer) else str(s) for s in spec]
+
+
+def federation_root(spec: SourceSpec) -> Optional[str]:
+    # 全文検索索引などの置き場所（ディレクトリ指定ならそのディレクトリ）
+    # アップロードだけの場合はディスク上の置き場所が無いので None
+    if isinstance(spec, (str, os.PathLike)):
+        return str(spec)
+    parents = [
+        str(Path(s).resolve().parent) for s in spec if not isinstance(s, WorkbookBuffer)
+    ]
+    return os.path.commonpath(parents) if parents else None
+
+
+def source_labels(sources: Sequence[Source]) -> List[str]:
+    # ファイル名（拡張子なし）。重複したら親ディレクトリ名や連番を付ける
+    names = [s.name if isinstance(s, WorkbookBuffer) else str(s) for s in sources]
+    stems = [Path(n).stem for n in names]
+    labels = []
+    for name, stem in zip(names, stems):
+        label = stem
+        if stems.count(stem) > 1 and Path(name).parent.name:
+            label = f"{Path(name).parent.name}/{stem}"
+        while label in labels:
+            label += "'"
+        labels.append(label)
+    return labels
+
+
+# ------------------------------------------------------------
+# 読み込み（スナップショットの無いものを共有のプロセスプールで並列にパース）
+# ------------------------------------------------------------
+def _prepare_snapshot(path: str) -> None:
+    # ワーカープロセス：パースしてスナップショットを書くだけ（DataFrame は返さない）
+    read_workbook(path)
+
+
+def load_sources(
+    sources: Sequence[Source],
+) -> List[Tuple[str, Dict[str, pd.DataFrame], str, Dict[str, str]]]:
+    paths = [s for s in sources if not isinstance(s, WorkbookBuffer)]
+    pending = [p for p in paths if not has_snapshot(p, file_sha256(p))]
+    if len(pending) > 1:
+        map_in_pool(_prepare_snapshot, pending)
+
+    out = []
+    for label, source in zip(source_labels(sources), sources):
+        if isinstance(source, WorkbookBuffer):
+            frames, content_hash, sheet_hashes = read_workbook_buffer(source)
+        else:
+            frames, content_hash, sheet_hashes = read_workbook(source)
+        out.append((label, frames, content_hash, sheet_hashes))
+    return out
+
+
+# ------------------------------------------------------------
+# 統合（同名シートの連結と重複行の除去）
+# ------------------------------------------------------------
+def _find_column(columns: Sequence[str], keys: Sequence[str]) -> Optional[int]:
+    for i, c in enumerate(columns):
+        if any(k in str(c).lower() for k in keys):
+            return i
+    return None
+
+
+def _row_keys(df: pd.DataFrame) -> pd.Series:
+    # 重複判定のキー：合金番号（表記を正規化）| 調質。合金が空の行は行全体の値
+    whole = pd.Series(
+        ["\x1f".join(map(str, row)) for row in df.to_numpy(dtype=object)], index=df.index
+    )
+    ai = _find_column(df.columns, _ALLOY_COL_KEYS)
+    if ai is None:
+        return whole
+    alloy = df.iloc[:, ai]
+    code = alloy.map(lambda v: parse_designation(str(v))[0] or str(v).strip())
+    ti = _find_column(df.columns, _TEMPER_COL_KEYS)
+    temper = (
+        df.iloc[:, ti].map(lambda v: str(v).strip().upper() if pd.notna(v) else "")
+        if ti is not None
+        else ""
+    )
+    keys = "alloy:" + code + "|" + temper
+    return keys.where(alloy.notna().to_numpy(), whole)
+
+
+def merge_sheet(parts: Sequence[Tuple[str, pd.DataFrame]]) -> pd.DataFrame:
+    merged = pd.concat(
+        [df.assign(**{SOURCE_COLUMN: label}) for label, df in parts], ignore_index=True
+    )
+    keys = _row_keys(merged.drop(columns=SOURCE_COLUMN)).to_numpy()
+    by_key = merged[SOURCE_COLUMN].groupby(keys, sort=False)
+    sources = by_key.agg(lambda s: ", ".join(dict.fromkeys(s)))
+    # 同じキーの行は最初に現れたソースのものだけを残す（同じソース内の重複はそのまま）
+    keep = (merged[SOURCE_COLUMN] == by_key.transform("first")).to_numpy()
+    out = merged[keep].reset_index(drop=True)
+    out[SOURCE_COLUMN] = sources.reindex(keys[keep]).to_numpy()
+    return out
+
+
+def merge_sources(
+    sources: Sequence[Tuple[str, Dict[str, pd.DataFrame], str, Dict[str, str]]]
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    # シート名 -> [(ラベル, DataFrame, シートハッシュ)]（シートは最初に現れた順）
+    by_sheet: Dict[str, List[Tuple[str, pd.DataFrame, str]]] = {}
+    for label, frames, content_hash, sheet_hashes in sources:
+        for name, df in frames.items():
+            by_sheet.setdefault(name, []).append((label, df, sheet_hashes.get(name, content_hash)))
+
+    data: Dict[str, pd.DataFrame] = {}
+    hashes: Dict[str, str] = {}
+    for name, parts in by_sheet.items():
+        data[name] = merge_sheet([(label, df) for label, df, _ in parts])
+        h = hashlib.sha256()
+        for label, _, sheet_hash in parts:
+            h.update(f"{label}\0{sheet_hash}\n".encode("utf-8"))
+        hashes[name] = h.hexdigest()
+    return data, hashes
+
+
+def read_federation(
+    spec: SourceSpec,
+) -> Tuple[Dict[str, pd.DataFrame], str, Dict[str, str], List[SourceInfo]]:
+    found = discover_sources(spec)
+    if not found:
+        raise FileNotFoundError(f"ワークブックが見つかりません: {describe_source(spec)}")
+    sources = load_sources(found)
+    data, sheet_hashes = merge_sources(sources)
+    infos = [
+        SourceInfo(label, describe_source(source), content_hash, tuple(frames))
+        for source, (label, frames, content_hash, _) in zip(found, sources)
+    ]
+    return data, combined_sha256(s.sha256 for s in infos), sheet_hashes, infos
@@ -0,0 +1,47 @@
+# ------------------------------------------------------------
+# ワークブックの内容ハッシュ（標準ライブラリのみ）
+# ------------------------------------------------------------
+# - レジストリや UI からも使うため、pandas / numpy を読み込まない
+# ------------------------------------------------------------
+
+import hashlib
+from typing import NamedTuple
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def combined_sha256(hashes) -> str:
+    # 複数ワークブック（フェデレーション）の内容ハッシュ：各ファイルのハッシュを順に連結
+    h = hashlib.sha256()
+    for digest in hashes:
+        h.update(digest.encode("ascii"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def bytes_sha256(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# ------------------------------------------------------------
+# メモリ上のワークブック（アップロード）。ディスクに書かずに内容ハッシュで識別する
+# ------------------------------------------------------------
+class WorkbookBuffer(NamedTuple):
+    name: str
+    data: bytes
+    sha256: str
+
+    @classmethod
+    def from_bytes(cls, name: str, data) -> "WorkbookBuffer":
+        data = bytes(data)
+        return cls(name, data, bytes_sha256(data))
+
+    def __repr__(self) -> str:
+        # 中身（数 MB のバイト列）はログやトレースに出さない
+        return f"WorkbookBuffer({self.name!r}, {len(self.data)} bytes, {self.sha256[:12]})"
@@ -0,0 +1,163 @@
+# ------------------------------------------------------------
+# プロセス共有のナレッジベース・レジストリ
+# ------------------------------------------------------------
+# - ワークブックの内容ハッシュをキーに、読み込み済みの
+#   AluminumAlloyRAG を全セッションで共有する（読み取り専用）
+# - セッションは lease（貸出）を通じて参照し、参照カウントで管理
+# - 参照されていないアップロード分は LRU で破棄する
+# - 読み込みに失敗したもの（バックグラウンド読み込みでは後から load_error が立つ）は
+#   使い回さず、次の acquire で作り直す
+# ------------------------------------------------------------
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .hashing import file_sha256
+
+
+class _Entry:
+    __slots__ = ("kb", "refcount", "pinned", "ready", "error")
+
+    def __init__(self, pinned: bool):
+        self.kb: Any = None
+        self.refcount = 0
+        self.pinned = pinned
+        # 最初の利用者が構築するあいだ、他の利用者はここで待つ
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+def _failed(kb: Any) -> bool:
+    return getattr(kb, "load_error", None) is not None
+
+
+class KnowledgeBaseLease:
+    def __init__(self, registry: "KnowledgeBaseRegistry", key: str, entry: _Entry):
+        self.key = key
+        self.kb = entry.kb
+        # セッションが破棄（GC）されたら自動的に返却する
+        # （作り直しで同じキーに別のエントリが入っても、借りたエントリに返す）
+        self._finalizer = weakref.finalize(self, registry._release, entry)
+
+    def release(self):
+        self._finalizer()
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+
+class KnowledgeBaseRegistry:
+    def __init__(
+        self,
+        factory: Callable[[str], Any],
+        max_unpinned: int = 4,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self._factory = factory
+        self._max_unpinned = max_unpinned
+        # 破棄されたワークブックのハッシュを通知（応答キャッシュの破棄など）
+        self._on_evict = on_evict
+        self._lock = threading.Lock()
+        # 内容ハッシュ -> エントリ（末尾ほど最近使用）
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    # --------------------------------------------------------
+    # 取得（なければ構築）
+    # --------------------------------------------------------
+    def acquire(
+        self,
+        excel_path: str,
+        content_hash: Optional[str] = None,
+        pinned: bool = False,
+        base: Any = None,
+    ) -> KnowledgeBaseLease:
+        # base: 編集前のナレッジベース。構築する場合は変更シートだけ差分で作る
+        key = content_hash or file_sha256(excel_path)
+
+        failed = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.ready.is_set() and _failed(entry.kb):
+                # 読み込みに失敗したナレッジベースは登録から外して作り直す
+                # （貸出中のものはそのまま。返却は外したエントリに対して行われる）
+                failed = self._entries.pop(key)
+                pinned = pinned or failed.pinned
+                entry = None
+            builder = entry is None
+            if builder:
+                entry = _Entry(pinned)
+                self._entries[key] = entry
+            else:
+                entry.pinned = entry.pinned or pinned
+                self._entries.move_to_end(key)
+            entry.refcount += 1
+
+        if failed is not None and self._on_evict is not None:
+            self._on_evict(key)
+
+        if builder:
+            try:
+                if base is None:
+                    kb = self._factory(excel_path)
+                else:
+                    kb = self._factory(excel_path, base=base)
+                freeze = getattr(kb, "freeze", None)
+                if freeze is not None:
+                    freeze()
+                entry.kb = kb
+            except BaseException as e:
+                entry.error = e
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                raise
+            finally:
+                entry.ready.set()
+            self._evict()
+        else:
+            entry.ready.wait()
+            if entry.error is not None:
+                with self._lock:
+                    entry.refcount -= 1
+                raise entry.error
+
+        return KnowledgeBaseLease(self, key, entry)
+
+    # --------------------------------------------------------
+    # 返却 & LRU 破棄
+    # --------------------------------------------------------
+    def _release(self, entry: _Entry):
+        with self._lock:
+            if entry.refcount > 0:
+                entry.refcount -= 1
+        self._evict()
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            unpinned = [k for k, e in self._entries.items() if not e.pinned]
+            excess = len(unpinned) - self._max_unpinned
+            for k in unpinned:
+                if excess <= 0:
+                    break
+                e = self._entries[k]
+                if e.refcount == 0 and e.ready.is_set():
+                    del self._entries[k]
+                    evicted.append(k)
+                    excess -= 1
+        if self._on_evict is not None:
+            for k in evicted:
+                self._on_evict(k)
+
+    # --------------------------------------------------------
+    # 状態確認
+    # --------------------------------------------------------
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                k: {"refcount": e.refcount, "pinned": e.pinned, "ready": e.ready.is_set()}
+                for k, e in self._entries.items()
+            }
@@ -0,0 +1,354 @@
+# ------------------------------------------------------------
+# クエリルーター（起動時にコンパイル / 1 回の走査で意図と実体を抽出）
+# ------------------------------------------------------------
+# - 同義語・意図トリガー・特性名は Aho–Corasick オートマトンに
+#   まとめ、クエリ長に比例する 1 回の走査で全一致を得る
+#   （辞書が数千語に増えてもクエリあたりのコストは増えない）
+# - 合金記号・調質はキーワード用のトークン走査の中で分類する
+# - 同義語辞書は「同義語」シートから追加読み込みできる
+# ------------------------------------------------------------
+
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from .alloy_index import find_designations
+from .column_store import PROPERTY_ALIASES, Predicate, parse_predicates
+from .selection import Objective, parse_objectives, parse_rating_constraints
+from .series_stats import STAT_MAX, STAT_MEAN, STAT_MEDIAN, STAT_MIN, STAT_SUMMARY
+from .tracing import span
+
+# 意図（優先順）
+INTENT_TEMPER_INFO = "temper_info"
+INTENT_SIMILAR = "similar"
+INTENT_ALLOY_DETAIL = "alloy_detail"
+INTENT_TEMPER_COMPARE = "temper_compare"
+INTENT_SERIES_STATS = "series_stats"
+INTENT_PURE_ALUMINUM = "pure_aluminum"
+INTENT_SELECTION = "selection"
+INTENT_CONDITIONS = "conditions"
+INTENT_STRENGTH = "strength"
+INTENT_PROPERTIES = "properties"
+INTENT_SERIES_INFO = "series_info"
+INTENT_FULL_TEXT = "full_text"
+
+# 特性・系列検索に回すキーワード
+PROPERTY_SEARCH_KEYS = ["耐食", "溶接", "軽量", "高強度", "航空", "8000"]
+
+# 同義語シートの候補名と列名
+SYNONYM_SHEETS = ["同義語", "synonyms"]
+_CANONICAL_COLS = ["正規語", "canonical"]
+_VARIANT_COLS = ["同義語", "variants", "synonym"]
+
+# 熱処理単体（T6とは？ / O材とは？）。「A6061-T6 の詳細」には当たらないよう fullmatch
+_TEMPER_ONLY_RE = re.compile(
+    r"\s*(T\d+|O|O材|H\d+)\s*(処理)?\s*(とは|について|について教えて)?\s*[？?]?\s*"
+)
+_TOKEN_RE = re.compile(r"[一-龥A-Za-z0-9\-]+")
+_TEMPER_RE = re.compile(r"(?<![A-Z0-9])(T\d+|O|H\d+)(?![A-Z0-9])")
+_NUMBER_RE = re.compile(r"\d+")
+_SERIES_RE = re.compile(r"(?<![0-9])([1-8])000\s*(?:系|番台|SERIES)")
+
+# Aho–Corasick の出力種別
+_KIND_SYNONYM = 0
+_KIND_TRIGGER = 1
+_KIND_PROPERTY = 2
+
+# 部分一致で意図を立てる語
+_TRIGGERS = {
+    "純アルミ": "pure",
+    "1000系": "pure",
+    "引張": "tensile",
+    "強度": "strength_word",
+    "切削": "machining_word",
+    "バランス": "selection",
+    "両立": "selection",
+    "トレードオフ": "selection",
+    "パレート": "selection",
+    "多目的": "selection",
+    "総合的": "selection",
+    "重視": "emphasis",
+    "優先": "emphasis",
+    "似た": "similar",
+    "似て": "similar",
+    "類似": "similar",
+    "近い": "similar",
+    "代替": "similar",
+    "代わり": "similar",
+    "同等": "similar",
+    "similar": "similar",
+    "substitute": "similar",
+    "alternative": "similar",
+    # 追質問の手がかり（conversation.py で直前の回答の実体に結び付ける）
+    "その": "anaphora",
+    "それ": "anaphora",
+    "この": "anaphora",
+    "これ": "anaphora",
+    "同じ": "anaphora",
+    "さっき": "anaphora",
+    "先ほど": "anaphora",
+    "上記": "anaphora",
+    "比べ": "compare",
+    "比較": "compare",
+    "違い": "compare",
+    "vs": "compare",
+    "詳細": "detail",
+    "詳しく": "detail",
+    # 系列の集計（「6000系の平均引張強さ」「7000系で最も強い調質」）
+    "平均": STAT_MEAN,
+    "average": STAT_MEAN,
+    "中央値": STAT_MEDIAN,
+    "median": STAT_MEDIAN,
+    "最大": STAT_MAX,
+    "最高": STAT_MAX,
+    "最も": STAT_MAX,
+    "一番": STAT_MAX,
+    "highest": STAT_MAX,
+    "strongest": STAT_MAX,
+    "最小": STAT_MIN,
+    "最低": STAT_MIN,
+    "lowest": STAT_MIN,
+    "weakest": STAT_MIN,
+    "範囲": STAT_SUMMARY,
+    "統計": STAT_SUMMARY,
+    "分布": STAT_SUMMARY,
+    "ばらつき": STAT_SUMMARY,
+    "低い": "low_word",
+    "小さい": "low_word",
+    "弱い": "low_word",
+    "柔らかい": "low_word",
+}
+
+# 集計の語が重なった場合の優先順
+_STAT_PRIORITY = (STAT_MEDIAN, STAT_MEAN, STAT_MIN, STAT_MAX, STAT_SUMMARY)
+
+
+# ------------------------------------------------------------
+# Aho–Corasick オートマトン
+# ------------------------------------------------------------
+class AhoCorasick:
+    def __init__(self, patterns: Iterable[Tuple[str, Tuple[int, str]]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            s = 0
+            for ch in pattern:
+                nxt = self._goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[s][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                s = nxt
+            self._out[s].append(payload)
+
+        # 失敗リンクを幅優先で張る
+        queue = deque(self._goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, nxt in self._goto[s].items():
+                queue.append(nxt)
+                f = self._fail[s]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find_all(self, text: str) -> Set[Tuple[int, str]]:
+        found: Set[Tuple[int, str]] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        s = 0
+        for ch in text:
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                found.update(out[s])
+        return found
+
+
+# ------------------------------------------------------------
+# ルーティング結果
+# ------------------------------------------------------------
+@dataclass
+class RoutedQuery:
+    text: str
+    intent: str
+    intents: List[str] = field(default_factory=list)
+    keywords: List[str] = field(default_factory=list)
+    temper_symbol: Optional[str] = None
+    alloys: List[str] = field(default_factory=list)
+    tempers: List[str] = field(default_factory=list)
+    numbers: List[int] = field(default_factory=list)
+    predicates: List[Predicate] = field(default_factory=list)
+    objectives: List[Objective] = field(default_factory=list)
+    # 一致したトリガー名（_TRIGGERS の値。ソート済み）
+    triggers: List[str] = field(default_factory=list)
+    # 言及された系列（1000 / 6000 など）と、系列の集計の種類（series_stats.STAT_*）
+    series: List[int] = field(default_factory=list)
+    stat: Optional[str] = None
+
+
+# ------------------------------------------------------------
+# 同義語シートの読み込み
+# ------------------------------------------------------------
+def load_synonym_sheet(data: Dict[str, pd.DataFrame]) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = {}
+    for name in SYNONYM_SHEETS:
+        df = data.get(name)
+        if df is None:
+            continue
+        canon_col = next((c for c in _CANONICAL_COLS if c in df.columns), None)
+        var_col = next((c for c in _VARIANT_COLS if c in df.columns), None)
+        if canon_col is None or var_col is None:
+            continue
+        for canon, variants in zip(df[canon_col], df[var_col]):
+            if not isinstance(canon, str) or not canon.strip():
+                continue
+            vs = re.split(r"[,、，/／\n]+", str(variants)) if pd.notna(variants) else []
+            out.setdefault(canon.strip(), []).extend(v.strip() for v in vs if v.strip())
+    return out
+
+
+# ------------------------------------------------------------
+# ルーター本体
+# ------------------------------------------------------------
+class QueryRouter:
+    def __init__(self, semantic_dict: Dict[str, List[str]]):
+        self.semantic_dict = semantic_dict
+
+        patterns: List[Tuple[str, Tuple[int, str]]] = []
+        for canonical, variants in semantic_dict.items():
+            for v in variants:
+                patterns.append((v.lower(), (_KIND_SYNONYM, canonical)))
+        for word, name in _TRIGGERS.items():
+            patterns.append((word.lower(), (_KIND_TRIGGER, name)))
+        for alias in PROPERTY_ALIASES:
+            patterns.append((alias.lower(), (_KIND_PROPERTY, alias)))
+        self._automaton = AhoCorasick(patterns)
+
+    @classmethod
+    def from_data(
+        cls, semantic_dict: Dict[str, List[str]], data: Dict[str, pd.DataFrame]
+    ) -> "QueryRouter":
+        merged = {k: list(v) for k, v in semantic_dict.items()}
+        for canonical, variants in load_synonym_sheet(data).items():
+            merged.setdefault(canonical, [])
+            merged[canonical].extend(v for v in variants if v not in merged[canonical])
+        return cls(merged)
+
+    def route(self, q: str) -> RoutedQuery:
+        with span("route") as sp:
+            q_u = unicodedata.normalize("NFKC", q).upper()
+
+            # 同義語・トリガー・特性名（1 回の走査）
+            canonical: Set[str] = set()
+            triggers: Set[str] = set()
+            has_property = False
+            with span("route.automaton"):
+                for kind, value in self._automaton.find_all(q.lower()):
+                    if kind == _KIND_SYNONYM:
+                        canonical.add(value)
+                    elif kind == _KIND_TRIGGER:
+                        triggers.add(value)
+                    else:
+                        has_property = True
+
+            # トークン走査：キーワード・調質。合金記号は表記ゆれを正規化して拾う
+            tokens: List[str] = []
+            tempers: List[str] = []
+            with span("route.tokens"):
+                for m in _TOKEN_RE.finditer(q):
+                    tok = m.group(0)
+                    tokens.append(tok)
+                    tempers.extend(_TEMPER_RE.findall(tok.upper()))
+                alloys = find_designations(q)
+                numbers = [int(n) for n in _NUMBER_RE.findall(q)]
+
+            # 入力順のトークン → 正規語（プロセスのハッシュシードに依存しない順序）
+            keywords = list(dict.fromkeys(tokens + sorted(canonical)))
+            with span("route.conditions"):
+                predicates = parse_predicates(q) if has_property else []
+
+                # 多目的選定：「バランス」などの語、または 2 つ以上の目的のどれかを「重視」
+                objectives: List[Objective] = []
+                if "selection" in triggers or "emphasis" in triggers:
+                    objectives = parse_objectives(q)
+                    if "selection" not in triggers and len(objectives) < 2:
+                        objectives = []
+                    else:
+                        triggers.add("selection")
+                        predicates = parse_predicates(q) + parse_rating_constraints(q)
+
+                # 類似検索（「A7075-T6 に近い合金（耐食性重視）」）は言及した特性を重みにする
+                if "similar" in triggers and alloys and not objectives:
+                    objectives = parse_objectives(q)
+
+                m = _TEMPER_ONLY_RE.fullmatch(q_u)
+                temper_symbol = m.group(1).replace("材", "") if m else None
+
+                # 系列の集計：集計の語と系列の両方がある場合だけ。特性は言及されたもの
+                series = list(dict.fromkeys(int(d) * 1000 for d in _SERIES_RE.findall(q_u)))
+                stat = next((st for st in _STAT_PRIORITY if st in triggers), None) if series else None
+                if stat == STAT_MAX and "low_word" in triggers:
+                    stat = STAT_MIN
+                if stat and not objectives:
+                    objectives = parse_objectives(q)
+
+            intents: List[str] = []
+            if temper_symbol:
+                intents.append(INTENT_TEMPER_INFO)
+            if alloys and "similar" in triggers:
+                intents.append(INTENT_SIMILAR)
+            if alloys:
+                intents.append(INTENT_ALLOY_DETAIL)
+            if len(tempers) >= 2:
+                intents.append(INTENT_TEMPER_COMPARE)
+            if stat:
+                intents.append(INTENT_SERIES_STATS)
+            if "pure" in triggers:
+                intents.append(INTENT_PURE_ALUMINUM)
+            if "selection" in triggers:
+                intents.append(INTENT_SELECTION)
+            if len(predicates) >= 2 or (predicates and predicates[0].prop != "tensile"):
+                intents.append(INTENT_CONDITIONS)
+            if "tensile" in triggers or (
+                "strength_word" in triggers and "machining_word" not in triggers
+            ):
+                intents.append(INTENT_STRENGTH)
+            if any(k in keywords for k in PROPERTY_SEARCH_KEYS):
+                intents.append(INTENT_PROPERTIES)
+            # 集計の語の無い系列の言及（「8000系の材料について教えて」）は系列の概要
+            if series and not stat:
+                intents.append(INTENT_SERIES_INFO)
+            intents.append(INTENT_FULL_TEXT)
+            sp.set(intent=intents[0])
+
+            return RoutedQuery(
+                text=q,
+                intent=intents[0],
+                intents=intents,
+                keywords=keywords,
+                temper_symbol=temper_symbol,
+                alloys=alloys,
+                tempers=tempers,
+                numbers=numbers,
+                predicates=predicates,
+                objectives=objectives,
+                triggers=sorted(triggers),
+                series=series,
+                stat=stat,
+            )
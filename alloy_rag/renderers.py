@@ -0,0 +1,926 @@
+# ------------------------------------------------------------
+# 検索結果の描画（Markdown / JSON / 表）
+# ------------------------------------------------------------
+# - results.py のレコードを受け取り、必要になった時点で整形する
+# - iter_markdown は断片を順に yield する（UI でのストリーミング用）
+#   render_markdown はそれを 1 回だけ join する
+# - 大きな一覧は results.paginate で行を切り出してから描画する
+# ------------------------------------------------------------
+
+import math
+from functools import singledispatch
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .capabilities import CAPABILITY_LABELS
+from .column_store import (
+    NUMERIC_COLUMNS,
+    PROPERTY_LABELS,
+    PROPERTY_UNITS,
+    RANK_COLUMNS,
+    RATING_COLUMNS,
+    SCORE_RANKS,
+    SCORE_RATINGS,
+    describe_predicate,
+    format_property,
+)
+from .federation import SOURCE_COLUMN
+from .results import (
+    AlloyDetailResult,
+    ConditionResult,
+    FullTextResult,
+    HelpResult,
+    LoadingResult,
+    PropertyLookupResult,
+    PropertySearchResult,
+    PureAluminumResult,
+    SelectionResult,
+    SeriesStatsResult,
+    SimilarityResult,
+    StrengthResult,
+    TemperCompareResult,
+    TemperInfoResult,
+)
+from .retrieval import SERIES_SHEET_ID
+from .series_stats import STAT_LABELS, STAT_MAX, STAT_MEAN, STAT_MEDIAN, STAT_MIN, STAT_SUMMARY
+from .tracing import traced
+
+HELP_TEXT = (
+    "質問の例:\n"
+    "- T6とは？\n"
+    "- T6 と T651 の違い\n"
+    "- A6061-T6 の詳細\n"
+    "- 引張強さ 400MPa 以上の合金\n"
+    "- 耐食性と溶接性が良い合金\n"
+    "- 強度と耐食性のバランスが良い合金（耐食性 B 以上）\n"
+    "- A7075-T6 に近い合金（耐食性重視）\n"
+    "- 6000系の平均引張強さ / 7000系で最も強い調質 / 5000系の統計\n"
+    "- （続けて）その耐力は？ / T651 と比べて / その中で伸び 10% 以上\n"
+)
+
+
+@traced("render.markdown")
+def render_markdown(result: Any, rag) -> str:
+    return "".join(iter_markdown(result, rag))
+
+
+# ------------------------------------------------------------
+# 共通の断片
+# ------------------------------------------------------------
+def _row_fields(row: pd.Series, skip: List[str]) -> Iterator[str]:
+    for key, val in row.items():
+        if pd.notna(val) and key not in skip:
+            yield f"- **{key}**: {val}\n"
+
+
+def _sheet_row(sheet: str, row: pd.Series) -> Iterator[str]:
+    yield f"### 📄 {sheet}\n"
+    for col, val in row.items():
+        if pd.notna(val) and str(val).strip() and str(val) != "nan":
+            yield f"- **{col}**: {val}\n"
+    yield "\n"
+
+
+def _series_summary(info: Dict[str, str]) -> Iterator[str]:
+    if info["overview"]:
+        yield f"- 概要: {info['overview']}\n"
+    if info["features"]:
+        yield f"- 特性の要点: {info['features']}\n"
+
+
+def _scope_note(scope: Optional[str]) -> Iterator[str]:
+    if scope:
+        yield f"> 直前の結果（{scope}）の中から探しています。\n\n"
+
+
+def _temper_entries(entries) -> Iterator[str]:
+    for info in entries:
+        if info.get("定義"):
+            yield f"- **定義**：{info['定義']}\n"
+        if info.get("意味"):
+            yield f"- **意味**：{info['意味']}\n"
+
+
+# ------------------------------------------------------------
+# Markdown（断片のジェネレーター）
+# ------------------------------------------------------------
+@singledispatch
+def iter_markdown(result: Any, rag) -> Iterator[str]:
+    raise TypeError(f"描画できない結果型です: {type(result).__name__}")
+
+
+@iter_markdown.register
+def _(result: TemperInfoResult, rag) -> Iterator[str]:
+    if not result.entries:
+        yield f"❌ 熱処理 {result.symbol} の情報が見つかりませんでした。"
+        if result.suggestions:
+            yield f"\n\n💡 もしかして: {' / '.join(result.suggestions)}\n"
+        return
+
+    yield f"## 🔥 熱処理 {result.symbol}\n\n"
+    if result.builtin:
+        yield "> 熱処理シートに記載がないため、簡易説明を表示しています。\n\n"
+    for i, info in enumerate(result.entries, start=1):
+        if info.get("定義"):
+            yield f"### 定義 {i}\n- {info['定義']}\n"
+        if info.get("意味"):
+            yield f"- **意味**：{info['意味']}\n"
+        yield "\n"
+
+
+@iter_markdown.register
+def _(result: TemperCompareResult, rag) -> Iterator[str]:
+    if not result.found:
+        yield "❌ 比較する熱処理情報が見つかりませんでした。"
+        return
+
+    yield f"## 🔥 熱処理 {result.t1} と {result.t2} の違い\n\n"
+    yield f"### {result.t1}\n"
+    yield from _temper_entries(result.entries1)
+    yield "\n---\n"
+    yield f"### {result.t2}\n"
+    yield from _temper_entries(result.entries2)
+
+
+@iter_markdown.register
+def _(result: PureAluminumResult, rag) -> Iterator[str]:
+    yield "## 🥈 純アルミニウム（1000系）\n\n"
+
+    info = rag.series_info.get(1000)
+    if info:
+        yield f"### {info['name']}\n"
+        yield from _series_summary(info)
+        yield "\n"
+
+    if result.rows.size:
+        df = rag.mechanical_table.iloc[result.rows]
+        yield "### 代表的な純アルミ合金\n"
+        for a, t in zip(df["Alloy"], df["Temper"]):
+            yield f"- {rag.safe_alloy_format(a, t)}\n"
+
+
+@iter_markdown.register
+def _(result: StrengthResult, rag) -> Iterator[str]:
+    yield f"## 🔍 引張強さ {result.min_strength} MPa 以上の合金\n\n"
+
+    if result.rows is None:
+        yield "データが読み込まれていません。"
+        return
+    if not result.rows.size:
+        yield "該当する合金が見つかりませんでした。"
+        return
+
+    strength = rag.mechanical_store.values["tensile"]
+    for i in result.rows:
+        row = rag.mechanical_table.iloc[i]
+        yield f"### ✨ {rag.safe_alloy_format(row.get('Alloy', ''), row.get('Temper', ''))}\n"
+        yield f"- 引張強さ: {strength[i]} MPa\n"
+        yield from _row_fields(row, ["Alloy", "Temper", "引張強さ (MPa)"])
+        yield "\n"
+
+
+@iter_markdown.register
+def _(result: ConditionResult, rag) -> Iterator[str]:
+    cond = " かつ ".join(describe_predicate(p) for p in result.predicates)
+    yield f"## 🔍 条件検索: {cond}\n\n"
+    yield from _scope_note(result.scope)
+
+    if result.rows is None:
+        yield "データが読み込まれていません。"
+        return
+    if not result.rows.size:
+        yield "該当する合金が見つかりませんでした。"
+        return
+
+    store = rag.mechanical_store
+    props = list(dict.fromkeys(p.prop for p in result.predicates))
+    skip = ["Alloy", "Temper"] + [NUMERIC_COLUMNS[p] for p in props]
+    for i in result.rows:
+        row = rag.mechanical_table.iloc[i]
+        yield f"### ✨ {rag.safe_alloy_format(row.get('Alloy', ''), row.get('Temper', ''))}\n"
+        for p in props:
+            yield f"- {PROPERTY_LABELS[p]}: {store.values[p][i]} {PROPERTY_UNITS[p]}\n"
+        yield from _row_fields(row, skip)
+        yield "\n"
+
+    yield f"（該当 {result.total} 件中 上位 {result.rows.size} 件）\n"
+
+
+def _objective_label(o) -> str:
+    label = PROPERTY_LABELS[o.prop] + ("" if o.maximize else "（小さいほど良い）")
+    return label if o.weight == 1.0 else f"{label} ×{o.weight:g}"
+
+
+def _selection_table(rag, result: SelectionResult, rows, scores, front) -> Iterator[str]:
+    store = rag.mechanical_store
+    props = [o.prop for o in result.objectives]
+    yield "| 合金 | " + " | ".join(PROPERTY_LABELS[p] for p in props) + " | スコア | パレート |\n"
+    yield "|---" * (len(props) + 3) + "|\n"
+    for i, score in zip(rows, scores):
+        row = rag.mechanical_table.iloc[i]
+        name = rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", ""))
+        cells = " | ".join(format_property(p, store.values[p][i]) for p in props)
+        mark = "★" if i in front else ""
+        yield f"| {name} | {cells} | {score:.3f} | {mark} |\n"
+    yield "\n"
+
+
+@iter_markdown.register
+def _(result: SelectionResult, rag) -> Iterator[str]:
+    yield "## ⚖️ 多目的選定: " + " / ".join(_objective_label(o) for o in result.objectives) + "\n\n"
+    yield from _scope_note(result.scope)
+    if result.constraints:
+        yield "- 制約: " + " かつ ".join(describe_predicate(p) for p in result.constraints) + "\n"
+
+    if result.rows is None:
+        yield "データが読み込まれていません。"
+        return
+    if not result.rows.size:
+        yield "該当する合金が見つかりませんでした。"
+        return
+
+    yield f"- 候補 {result.total} 件 / パレート最適 {result.front.size} 件\n\n"
+    front = set(result.front.tolist())
+
+    yield f"### 🏆 重み付きスコア 上位 {result.rows.size} 件\n"
+    yield from _selection_table(rag, result, result.rows, result.scores, front)
+
+    shown = min(result.front.size, max(result.rows.size, 1))
+    yield "### 🧭 パレート最適（どの目的でも他に劣らない合金、スコア順）\n"
+    yield from _selection_table(
+        rag, result, result.front[:shown], result.front_scores[:shown], front
+    )
+    if result.front.size > shown:
+        yield f"（ほか {result.front.size - shown} 件）\n"
+
+
+@iter_markdown.register
+def _(result: SimilarityResult, rag) -> Iterator[str]:
+    yield f"## 🧬 {result.designation.upper()} に近い合金\n\n"
+    if result.requested is not None:
+        yield (
+            f"> 「{result.requested}」は見つからなかったため、"
+            f"最も近い {result.designation} を基準にしています。\n\n"
+        )
+    if result.origin is None:
+        yield "⚠️ 基準にする合金の機械的性質が見つかりませんでした。\n"
+        if result.suggestions:
+            yield f"\n💡 もしかして: {' / '.join(result.suggestions)}\n"
+        return
+    if result.error is not None:
+        yield f"⚠️ {result.error}\n"
+        return
+
+    store = rag.mechanical_store
+    props = [p for p, w in result.weights if w > 0]
+    emphasized = [f"{PROPERTY_LABELS[p]} ×{w:g}" for p, w in result.weights if w not in (0, 1)]
+    yield "- 比較した特性: " + " / ".join(PROPERTY_LABELS[p] for p in props) + "\n"
+    if emphasized:
+        yield "- 重み: " + " / ".join(emphasized) + "\n"
+    base = [f"{PROPERTY_LABELS[p]} {format_property(p, store.values[p][result.origin])}" for p in props]
+    yield "- 基準: " + " / ".join(base) + "\n\n"
+    if not result.rows.size:
+        yield "該当する合金が見つかりませんでした。"
+        return
+
+    # 数値特性は基準との差、順序尺度（評価・ランク）は値だけを示す
+    yield f"### 🔗 近い順 {result.rows.size} 件\n"
+    yield "| 合金 | 距離 | " + " | ".join(PROPERTY_LABELS[p] for p in props) + " |\n"
+    yield "|---" * (len(props) + 2) + "|\n"
+    for i, dist in zip(result.rows, result.distances):
+        row = rag.mechanical_table.iloc[i]
+        name = rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", ""))
+        cells = []
+        for p in props:
+            v = store.values[p][i]
+            cell = format_property(p, v)
+            diff = v - store.values[p][result.origin]
+            if p in NUMERIC_COLUMNS and not np.isnan(diff) and diff:
+                cell += f" ({diff:+g})"
+            cells.append(cell)
+        yield f"| {name} | {dist:.3f} | " + " | ".join(cells) + " |\n"
+    yield "\n"
+
+    # 距離の内訳（特性ごとの寄与の割合）
+    yield "### 📐 距離の内訳（各特性の寄与）\n"
+    yield "| 合金 | " + " | ".join(PROPERTY_LABELS[p] for p in props) + " |\n"
+    yield "|---" * (len(props) + 1) + "|\n"
+    columns = [j for j, (p, w) in enumerate(result.weights) if w > 0]
+    for i, contrib in zip(result.rows, result.contributions):
+        row = rag.mechanical_table.iloc[i]
+        name = rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", ""))
+        total = contrib.sum()
+        shares = [contrib[j] / total * 100 if total > 0 else 0.0 for j in columns]
+        yield f"| {name} | " + " | ".join(f"{v:.0f}%" for v in shares) + " |\n"
+    yield "\n"
+
+
+@iter_markdown.register
+def _(result: AlloyDetailResult, rag) -> Iterator[str]:
+    yield f"## 📋 {result.designation.upper()} の詳細\n\n"
+    if result.requested is not None:
+        yield (
+            f"> 「{result.requested}」は見つからなかったため、"
+            f"最も近い {result.designation} を表示しています。\n\n"
+        )
+
+    # 機械的特性テーブル
+    if result.mechanical_row is not None:
+        row = rag.mechanical_table.iloc[result.mechanical_row]
+        yield "### 📊 機械的性質（aluminum_handbook_table）\n"
+        yield f"- 合金記号: A{int(row['Alloy']):04d}\n"
+        yield f"- 調質: {row['Temper']}\n"
+        yield f"- 引張強さ: {row['引張強さ (MPa)']} MPa\n"
+        yield f"- 耐力: {row['耐力 (MPa)']} MPa\n"
+        yield f"- 伸び: {row['伸び (%)']} %\n"
+        yield f"- 疲れ強さ: {row['疲れ強さ (MPa)']} MPa\n"
+        yield f"- 強度ランク: {row['強度ランク']}\n"
+        yield (
+            f"- 耐食性: {row['耐食性']} / 溶接性: {row['溶接性']} / "
+            f"切削性: {row['切削性']} / 成形性: {row['成形性']}\n"
+        )
+        if pd.notna(row.get("備考", "")):
+            yield f"- 備考: {row['備考']}\n"
+        if pd.notna(row.get(SOURCE_COLUMN)):
+            yield f"- 出典: {row[SOURCE_COLUMN]}\n"
+        yield "\n"
+        # 系列の概要
+        series = row.get("系列", None)
+        if series in rag.series_info:
+            info = rag.series_info[series]
+            yield f"### 🧾 系列 {series} の概要\n"
+            yield f"- 系列名: {info['name']}\n"
+            yield from _series_summary(info)
+            yield "\n"
+
+    # 他シート（ポスティングをここで初めて行に解決する）
+    sheet_names = rag.alloy_index.sheet_names
+    for sid, r in result.postings:
+        sheet = sheet_names[sid]
+        yield from _sheet_row(sheet, rag.data[sheet].iloc[int(r)])
+
+    if not result.found:
+        yield "⚠️ 該当する合金の詳細情報が見つかりませんでした。\n"
+        if result.suggestions:
+            yield f"\n💡 もしかして: {' / '.join(result.suggestions)}\n"
+
+
+@iter_markdown.register
+def _(result: FullTextResult, rag) -> Iterator[str]:
+    if not result.found:
+        return
+
+    yield "## 🔎 関連する情報（全文検索）\n\n"
+    sheet_names = list(rag.data.keys())
+    for doc in result.docs:
+        sid, r = (int(x) for x in rag.retriever.refs[doc])
+        if sid == SERIES_SHEET_ID:
+            info = rag.series_info[r]
+            yield f"### 🧾 {info['name']}\n"
+            yield from _series_summary(info)
+            yield "\n"
+        else:
+            sheet = sheet_names[sid]
+            yield from _sheet_row(sheet, rag.data[sheet].iloc[r])
+
+
+@iter_markdown.register
+def _(result: PropertySearchResult, rag) -> Iterator[str]:
+    if result.fallback is not None and result.fallback.found:
+        yield from iter_markdown(result.fallback, rag)
+        return
+
+    yield "## 🔎 検索結果\n\n"
+    if not result.series and not result.rows.size:
+        yield "❌ 該当する合金がありません。"
+        return
+
+    for series in result.series:
+        info = rag.series_info[series]
+        yield f"### {info['name']}\n"
+        yield from _series_summary(info)
+
+        members = rag.series_stats.members_of(series) if rag.series_stats is not None else ()
+        if members:
+            yield f"- 代表合金: {', '.join(members)}\n"
+        yield "\n"
+
+    if result.rows.size:
+        yield "### 🔧 該当する代表合金\n"
+        for i in result.rows:
+            row = rag.mechanical_table.iloc[i]
+            label = rag.safe_alloy_format(row["Alloy"], row["Temper"])
+            yield (
+                f"- {label} | 耐食性: {row['耐食性']} / "
+                f"溶接性: {row['溶接性']} / 切削性: {row['切削性']}\n"
+            )
+        yield "\n"
+
+
+@iter_markdown.register
+def _(result: PropertyLookupResult, rag) -> Iterator[str]:
+    labels = "・".join(PROPERTY_LABELS[p] for p in result.props)
+    yield f"## 💬 {result.subject}：{labels}\n\n"
+    if not result.rows.size:
+        yield "該当する合金が見つかりませんでした。"
+        return
+
+    store = rag.mechanical_store
+    yield "| 合金 | " + " | ".join(PROPERTY_LABELS[p] for p in result.props) + " |\n"
+    yield "|---" * (len(result.props) + 1) + "|\n"
+    for i in result.rows:
+        row = rag.mechanical_table.iloc[i]
+        name = rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", ""))
+        cells = " | ".join(format_property(p, store.values[p][i]) for p in result.props)
+        yield f"| {name} | {cells} |\n"
+    yield "\n"
+
+
+def _format_stat(prop: str, value: float) -> str:
+    # 評価（A〜E・高中低）の平均・中央値は尺度の値と、最も近い評価
+    if np.isnan(value):
+        return "—"
+    if prop in RATING_COLUMNS or prop in RANK_COLUMNS:
+        if float(value).is_integer():
+            return format_property(prop, value)
+        scale = SCORE_RATINGS if prop in RATING_COLUMNS else SCORE_RANKS
+        return f"{value:.1f}（≈{scale[float(round(value))]}）"
+    return format_property(prop, round(float(value), 1))
+
+
+# 一覧に出す代表合金の上限（系列の統計）
+_MEMBERS_SHOWN = 30
+
+
+@iter_markdown.register
+def _(result: SeriesStatsResult, rag) -> Iterator[str]:
+    names = "・".join(f"{s}系" for s in result.series + result.missing)
+    yield f"## 📊 {names}の{STAT_LABELS[result.stat]}\n\n"
+    for s in result.missing:
+        yield f"❌ {s}系のデータがありません。\n"
+    if not result.found:
+        return
+    stats = rag.series_stats
+
+    if result.stat in (STAT_MAX, STAT_MIN):
+        label = STAT_LABELS[result.stat]
+        for s in result.series:
+            for p in result.props:
+                r = stats.best(s, p, result.stat)
+                if r is None:
+                    yield f"- {s}系の{PROPERTY_LABELS[p]}: データがありません\n"
+                    continue
+                row = rag.mechanical_table.iloc[r]
+                name = rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", ""))
+                value = format_property(p, stats.value(s, p, result.stat))
+                yield f"- {s}系で{PROPERTY_LABELS[p]}が{label}: **{name}**（{value}）\n"
+        yield "\n"
+        return
+
+    if result.stat in (STAT_MEAN, STAT_MEDIAN):
+        yield "| 系列 | 合金数 | " + " | ".join(PROPERTY_LABELS[p] for p in result.props) + " |\n"
+        yield "|---" * (len(result.props) + 2) + "|\n"
+        for s in result.series:
+            cells = " | ".join(_format_stat(p, stats.value(s, p, result.stat)) for p in result.props)
+            yield f"| {s}系 | {stats.size(s)} | {cells} |\n"
+        yield "\n値の無い行は除いて集計しています。\n"
+        return
+
+    # 統計：数値の特性は最小〜最大、評価は分布
+    numeric = [p for p in result.props if p not in stats.distribution]
+    rated = [p for p in result.props if p in stats.distribution]
+    for s in result.series:
+        yield f"### {s}系（{stats.size(s)} 件）\n"
+        if numeric:
+            yield "| 特性 | 件数 | 最小 | 中央値 | 平均 | 最大 |\n"
+            yield "|---|---|---|---|---|---|\n"
+            for p in numeric:
+                cells = " | ".join(
+                    _format_stat(p, stats.value(s, p, st))
+                    for st in (STAT_MIN, STAT_MEDIAN, STAT_MEAN, STAT_MAX)
+                )
+                yield f"| {PROPERTY_LABELS[p]} | {stats.known(s, p)} | {cells} |\n"
+            yield "\n"
+        for p in rated:
+            counts = " / ".join(
+                f"{format_property(p, level)}: {n}"
+                for level, n in zip(stats.levels(p), stats.counts(s, p))
+                if n
+            )
+            yield f"- {PROPERTY_LABELS[p]}: {counts or '—'}\n"
+        members = stats.members_of(s)
+        sample = ", ".join(members[:_MEMBERS_SHOWN])
+        if len(members) > _MEMBERS_SHOWN:
+            sample += f" ほか {len(members) - _MEMBERS_SHOWN} 件"
+        yield f"- 代表合金: {sample}\n\n"
+
+
+@iter_markdown.register
+def _(result: HelpResult, rag) -> Iterator[str]:
+    yield HELP_TEXT
+
+
+@iter_markdown.register
+def _(result: LoadingResult, rag) -> Iterator[str]:
+    pending = "・".join(CAPABILITY_LABELS[c] for c in result.pending)
+    yield f"⏳ データを読み込み中です。**{pending}** は準備ができ次第お使いいただけます。\n\n"
+    if result.ready:
+        yield "現在利用できる機能:\n"
+        for c in result.ready:
+            yield f"- {CAPABILITY_LABELS[c]}\n"
+
+
+# ------------------------------------------------------------
+# JSON（API 向け。dict / list / スカラーのみ）
+# ------------------------------------------------------------
+def _jsonable(v: Any) -> Any:
+    if v is None or v is pd.NA or v is pd.NaT:
+        return None
+    if isinstance(v, (np.bool_, bool)):
+        return bool(v)
+    if isinstance(v, np.integer):
+        return int(v)
+    if isinstance(v, (np.floating, float)):
+        return None if math.isnan(v) else float(v)
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    return v
+
+
+def row_record(row: pd.Series) -> Dict[str, Any]:
+    return {str(k): _jsonable(v) for k, v in row.items()}
+
+
+def _mechanical_records(rag, rows: Optional[np.ndarray]) -> List[Dict[str, Any]]:
+    if rows is None:
+        return []
+    records = []
+    for i in rows:
+        row = rag.mechanical_table.iloc[i]
+        rec = row_record(row)
+        rec["designation"] = rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", ""))
+        records.append(rec)
+    return records
+
+
+def _series_record(rag, series) -> Optional[Dict[str, Any]]:
+    info = rag.series_info.get(series)
+    if not info:
+        return None
+    return {"series": _jsonable(series), **{k: _jsonable(v) for k, v in info.items()}}
+
+
+@singledispatch
+def to_json(result: Any, rag) -> Dict[str, Any]:
+    raise TypeError(f"変換できない結果型です: {type(result).__name__}")
+
+
+@to_json.register
+def _(result: TemperInfoResult, rag) -> Dict[str, Any]:
+    return {
+        "type": "temper_info",
+        "symbol": result.symbol.upper(),
+        "found": result.found,
+        "builtin": result.builtin,
+        "entries": list(result.entries),
+        "suggestions": list(result.suggestions),
+    }
+
+
+@to_json.register
+def _(result: TemperCompareResult, rag) -> Dict[str, Any]:
+    return {
+        "type": "temper_compare",
+        "found": result.found,
+        "tempers": [
+            {"symbol": result.t1, "entries": list(result.entries1)},
+            {"symbol": result.t2, "entries": list(result.entries2)},
+        ],
+    }
+
+
+@to_json.register
+def _(result: PureAluminumResult, rag) -> Dict[str, Any]:
+    return {
+        "type": "pure_aluminum",
+        "series": _series_record(rag, 1000),
+        "results": _mechanical_records(rag, result.rows),
+    }
+
+
+@to_json.register
+def _(result: StrengthResult, rag) -> Dict[str, Any]:
+    return {
+        "type": "strength",
+        "min_strength": result.min_strength,
+        "results": _mechanical_records(rag, result.rows),
+    }
+
+
+@to_json.register
+def _(result: ConditionResult, rag) -> Dict[str, Any]:
+    return {
+        "type": "conditions",
+        "conditions": [
+            {"property": p.prop, "op": p.op, "value": p.value} for p in result.predicates
+        ],
+        "scope": result.scope,
+        "total": result.total,
+        "results": _mechanical_records(rag, result.rows),
+    }
+
+
+def _scored_records(rag, rows, scores, front) -> List[Dict[str, Any]]:
+    records = _mechanical_records(rag, rows)
+    for rec, i, score in zip(records, rows, scores):
+        rec["score"] = float(score)
+        rec["pareto"] = int(i) in front
+    return records
+
+
+@to_json.register
+def _(result: SelectionResult, rag) -> Dict[str, Any]:
+    front = set(result.front.tolist())
+    return {
+        "type": "selection",
+        "objectives": [
+            {"property": o.prop, "weight": o.weight, "maximize": o.maximize}
+            for o in result.objectives
+        ],
+        "constraints": [
+            {"property": p.prop, "op": p.op, "value": p.value} for p in result.constraints
+        ],
+        "scope": result.scope,
+        "total": result.total,
+        "pareto_total": int(result.front.size),
+        "results": _scored_records(rag, result.rows, result.scores, front)
+        if result.rows is not None
+        else [],
+        "pareto": _scored_records(rag, result.front, result.front_scores, front),
+    }
+
+
+@to_json.register
+def _(result: SimilarityResult, rag) -> Dict[str, Any]:
+    origin = None
+    results = []
+    if result.origin is not None:
+        store = rag.mechanical_store
+        origin = _mechanical_records(rag, np.array([result.origin]))[0]
+        records = _mechanical_records(rag, result.rows)
+        for rec, i, dist, contrib in zip(records, result.rows, result.distances, result.contributions):
+            rec["distance"] = float(dist)
+            rec["breakdown"] = {
+                p: {
+                    "value": _jsonable(store.values[p][i]),
+                    "difference": _jsonable(store.values[p][i] - store.values[p][result.origin]),
+                    "contribution": float(c),
+                }
+                for (p, w), c in zip(result.weights, contrib)
+                if w > 0
+            }
+            results.append(rec)
+    return {
+        "type": "similar",
+        "designation": result.designation.upper(),
+        "requested": result.requested,
+        "found": result.found,
+        "error": result.error,
+        "suggestions": list(result.suggestions),
+        "weights": {p: w for p, w in result.weights},
+        "origin": origin,
+        "results": results,
+    }
+
+
+@to_json.register
+def _(result: AlloyDetailResult, rag) -> Dict[str, Any]:
+    mechanical = None
+    series = None
+    if result.mechanical_row is not None:
+        row = rag.mechanical_table.iloc[result.mechanical_row]
+        mechanical = row_record(row)
+        series = _series_record(rag, row.get("系列"))
+
+    sheet_names = rag.alloy_index.sheet_names
+    rows = []
+    for sid, r in result.postings:
+        sheet = sheet_names[sid]
+        rows.append({"sheet": sheet, "row": int(r), "values": row_record(rag.data[sheet].iloc[int(r)])})
+    return {
+        "type": "alloy_detail",
+        "designation": result.designation.upper(),
+        "requested": result.requested,
+        "found": result.found,
+        "suggestions": list(result.suggestions),
+        "mechanical": mechanical,
+        "series": series,
+        "rows": rows,
+    }
+
+
+@to_json.register
+def _(result: FullTextResult, rag) -> Dict[str, Any]:
+    sheet_names = list(rag.data.keys())
+    hits = []
+    for doc, score in zip(result.docs, result.scores):
+        sid, r = (int(x) for x in rag.retriever.refs[doc])
+        if sid == SERIES_SHEET_ID:
+            hits.append({"score": float(score), "series": _series_record(rag, r)})
+        else:
+            sheet = sheet_names[sid]
+            hits.append(
+                {
+                    "score": float(score),
+                    "sheet": sheet,
+                    "row": r,
+                    "values": row_record(rag.data[sheet].iloc[r]),
+                }
+            )
+    return {"type": "full_text", "query": result.query, "results": hits}
+
+
+@to_json.register
+def _(result: PropertySearchResult, rag) -> Dict[str, Any]:
+    return {
+        "type": "properties",
+        "keywords": sorted(result.keywords),
+        "series": [_series_record(rag, s) for s in result.series],
+        "results": _mechanical_records(rag, result.rows),
+        "fallback": to_json(result.fallback, rag) if result.fallback is not None else None,
+    }
+
+
+@to_json.register
+def _(result: PropertyLookupResult, rag) -> Dict[str, Any]:
+    store = rag.mechanical_store
+    results = []
+    for i in result.rows:
+        row = rag.mechanical_table.iloc[i]
+        results.append(
+            {
+                "designation": rag.safe_alloy_format(row.get("Alloy", ""), row.get("Temper", "")),
+                **{p: _jsonable(store.values[p][i]) for p in result.props},
+            }
+        )
+    return {
+        "type": "followup_property",
+        "subject": result.subject,
+        "properties": list(result.props),
+        "results": results,
+    }
+
+
+@to_json.register
+def _(result: SeriesStatsResult, rag) -> Dict[str, Any]:
+    stats = rag.series_stats
+    series = []
+    for s in result.series:
+        series.append(
+            {
+                "series": s,
+                "count": stats.size(s),
+                "stats": {
+                    p: {
+                        "count": stats.known(s, p),
+                        **{
+                            st: _jsonable(stats.value(s, p, st))
+                            for st in (STAT_MIN, STAT_MEDIAN, STAT_MEAN, STAT_MAX)
+                        },
+                    }
+                    for p in result.props
+                },
+                "distribution": {
+                    p: {
+                        format_property(p, level): int(n)
+                        for level, n in zip(stats.levels(p), stats.counts(s, p))
+                    }
+                    for p in result.props
+                    if p in stats.distribution
+                },
+                "members": list(stats.members_of(s)),
+            }
+        )
+    return {
+        "type": "series_stats",
+        "stat": result.stat,
+        "properties": list(result.props),
+        "series": series,
+        "missing": list(result.missing),
+        "results": _mechanical_records(rag, result.rows),
+    }
+
+
+@to_json.register
+def _(result: HelpResult, rag) -> Dict[str, Any]:
+    return {"type": "help", "markdown": HELP_TEXT}
+
+
+@to_json.register
+def _(result: LoadingResult, rag) -> Dict[str, Any]:
+    return {"type": "loading", "pending": list(result.pending), "ready": list(result.ready)}
+
+
+# ------------------------------------------------------------
+# 表（DataFrame。該当しない結果型は None）
+# ------------------------------------------------------------
+@singledispatch
+def to_table(result: Any, rag) -> Optional[pd.DataFrame]:
+    return None
+
+
+def _mechanical_table(rag, rows: Optional[np.ndarray]) -> Optional[pd.DataFrame]:
+    if rows is None or rag.mechanical_table is None:
+        return None
+    return rag.mechanical_table.iloc[rows]
+
+
+@to_table.register
+def _(result: PureAluminumResult, rag) -> Optional[pd.DataFrame]:
+    return _mechanical_table(rag, result.rows)
+
+
+@to_table.register
+def _(result: StrengthResult, rag) -> Optional[pd.DataFrame]:
+    return _mechanical_table(rag, result.rows)
+
+
+@to_table.register
+def _(result: ConditionResult, rag) -> Optional[pd.DataFrame]:
+    return _mechanical_table(rag, result.rows)
+
+
+@to_table.register
+def _(result: SelectionResult, rag) -> Optional[pd.DataFrame]:
+    df = _mechanical_table(rag, result.rows)
+    if df is None:
+        return None
+    return df.assign(スコア=result.scores, パレート=np.isin(result.rows, result.front))
+
+
+@to_table.register
+def _(result: PropertySearchResult, rag) -> Optional[pd.DataFrame]:
+    return _mechanical_table(rag, result.rows)
+
+
+@to_table.register
+def _(result: PropertyLookupResult, rag) -> Optional[pd.DataFrame]:
+    df = _mechanical_table(rag, result.rows)
+    if df is None:
+        return None
+    columns = [
+        NUMERIC_COLUMNS.get(p) or RATING_COLUMNS.get(p) or RANK_COLUMNS.get(p) for p in result.props
+    ]
+    return df[[c for c in dict.fromkeys(["Alloy", "Temper", *columns]) if c in df.columns]]
+
+
+@to_table.register
+def _(result: SeriesStatsResult, rag) -> Optional[pd.DataFrame]:
+    if result.rows.size:
+        return _mechanical_table(rag, result.rows)
+    if not result.found:
+        return None
+    stats = rag.series_stats
+    records = [
+        {
+            "系列": s,
+            "特性": PROPERTY_LABELS[p],
+            "件数": stats.known(s, p),
+            **{
+                STAT_LABELS[st]: stats.value(s, p, st)
+                for st in (STAT_MIN, STAT_MEDIAN, STAT_MEAN, STAT_MAX)
+            },
+        }
+        for s in result.series
+        for p in result.props
+    ]
+    return pd.DataFrame.from_records(records)
+
+
+@to_table.register
+def _(result: SimilarityResult, rag) -> Optional[pd.DataFrame]:
+    if result.origin is None or result.error is not None:
+        return None
+    df = _mechanical_table(rag, result.rows)
+    return df.assign(距離=result.distances)
+
+
+@to_table.register
+def _(result: AlloyDetailResult, rag) -> Optional[pd.DataFrame]:
+    if result.mechanical_row is None:
+        return None
+    return _mechanical_table(rag, np.array([result.mechanical_row]))
+
+
+@to_table.register
+def _(result: TemperInfoResult, rag) -> Optional[pd.DataFrame]:
+    return pd.DataFrame(list(result.entries), columns=["定義", "意味"])
+
+
+@to_table.register
+def _(result: TemperCompareResult, rag) -> Optional[pd.DataFrame]:
+    records = [{"記号": result.t1, **e} for e in result.entries1]
+    records += [{"記号": result.t2, **e} for e in result.entries2]
+    return pd.DataFrame(records, columns=["記号", "定義", "意味"])
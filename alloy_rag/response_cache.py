@@ -0,0 +1,155 @@
+# ------------------------------------------------------------
+# process_query の応答メモ化（LRU + TTL / 任意でディスク層）
+# ------------------------------------------------------------
+# - キーは（ワークブックの内容ハッシュ, 正規化したクエリ）
+#   → 別の Excel をアップロードすれば自然に別キーになり、
+#     invalidate(hash) でそのワークブックの分だけ破棄できる
+# - メモリ層は OrderedDict による LRU、ディスク層は SQLite
+# ------------------------------------------------------------
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query_key(query: str) -> str:
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", query)).strip()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 3600.0,
+        disk_path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._lock = threading.Lock()
+        # (hash, query) -> (作成時刻, 応答)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " workbook TEXT NOT NULL, query TEXT NOT NULL,"
+                " answer TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (workbook, query))"
+            )
+            self._db.commit()
+
+    # --------------------------------------------------------
+    # 取得 / 保存
+    # --------------------------------------------------------
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, workbook_hash: str, query: str) -> Optional[str]:
+        key = (workbook_hash, normalize_query_key(query))
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if not self._expired(item[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT answer, created FROM responses WHERE workbook = ? AND query = ?",
+                    key,
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    self._store(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, workbook_hash: str, query: str, answer: str):
+        key = (workbook_hash, normalize_query_key(query))
+        now = time.time()
+        with self._lock:
+            self._store(key, now, answer)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (*key, answer, now),
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE rowid IN ("
+                    " SELECT rowid FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+
+    def _store(self, key: Tuple[str, str], created: float, answer: str):
+        self._entries[key] = (created, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(
+        self, workbook_hash: Optional[str], query: str, compute: Callable[[], str]
+    ) -> str:
+        # 内容ハッシュが無い（読み込み失敗など）場合はキャッシュしない
+        if not workbook_hash:
+            return compute()
+        answer = self.get(workbook_hash, query)
+        if answer is None:
+            answer = compute()
+            self.put(workbook_hash, query, answer)
+        return answer
+
+    # --------------------------------------------------------
+    # 破棄
+    # --------------------------------------------------------
+    def invalidate(self, workbook_hash: Optional[str] = None, disk: bool = True):
+        # disk=False はメモリ層だけ破棄する（ディスク層は内容ハッシュのキーなので、
+        # 同じワークブックを読み直せばそのまま使える。古い行は TTL で期限切れになる）
+        with self._lock:
+            if workbook_hash is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == workbook_hash]:
+                    del self._entries[key]
+            if self._db is not None and disk:
+                if workbook_hash is None:
+                    self._db.execute("DELETE FROM responses")
+                else:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE workbook = ?", (workbook_hash,)
+                    )
+                self._db.commit()
+
+    # --------------------------------------------------------
+    # 統計
+    # --------------------------------------------------------
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
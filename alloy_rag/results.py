@@ -0,0 +1,214 @@
+# ------------------------------------------------------------
+# 検索結果レコード（描画前の構造化データ）
+# ------------------------------------------------------------
+# - エンジンのメソッドは行番号・スコアなどの軽量なレコードだけを返す
+# - Markdown / JSON / 表への変換は renderers.py で必要になった時だけ行う
+#   （API など UI 以外の呼び出し側は整形コストを払わない）
+# ------------------------------------------------------------
+
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .column_store import Predicate
+from .selection import Objective
+
+_EMPTY_ROWS = np.empty(0, dtype=np.int64)
+_EMPTY_REFS = np.empty((0, 2), dtype=np.int32)
+
+
+@dataclass(frozen=True, slots=True)
+class TemperInfoResult:
+    symbol: str
+    entries: Tuple[Dict[str, str], ...] = ()
+    # 見つからなかった場合の近い記号（編集距離順）
+    suggestions: Tuple[str, ...] = ()
+    # 熱処理シートに記載が無く、組み込みの簡易説明（temper_descriptions）で答えた
+    builtin: bool = False
+
+    @property
+    def found(self) -> bool:
+        return bool(self.entries)
+
+
+@dataclass(frozen=True, slots=True)
+class TemperCompareResult:
+    t1: str
+    t2: str
+    entries1: Tuple[Dict[str, str], ...] = ()
+    entries2: Tuple[Dict[str, str], ...] = ()
+
+    @property
+    def found(self) -> bool:
+        return bool(self.entries1) and bool(self.entries2)
+
+
+@dataclass(frozen=True, slots=True)
+class PureAluminumResult:
+    # 機械特性テーブルの行番号（1000 系）
+    rows: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+
+
+@dataclass(frozen=True, slots=True)
+class StrengthResult:
+    min_strength: float
+    # 機械特性テーブルの行番号（引張強さの降順）。None はデータ未読み込み
+    rows: Optional[np.ndarray] = None
+
+
+@dataclass(frozen=True, slots=True)
+class ConditionResult:
+    predicates: List[Predicate]
+    rows: Optional[np.ndarray] = None
+    # 条件に一致した総件数（rows は上位 limit 件のみ）
+    total: int = 0
+    # 追質問で直前の結果の中だけを検索した場合、その結果の説明（conversation.py）
+    scope: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class AlloyDetailResult:
+    designation: str
+    # 機械特性テーブルの行番号（該当なしは None）
+    mechanical_row: Optional[int] = None
+    # 他シートのポスティング [[シート番号, 行番号], ...]
+    postings: np.ndarray = field(default_factory=lambda: _EMPTY_REFS)
+    # 入力に一致せず近い記号に補正した場合の元の入力
+    requested: Optional[str] = None
+    # 見つからなかった場合の近い記号（編集距離順）
+    suggestions: Tuple[str, ...] = ()
+
+    @property
+    def found(self) -> bool:
+        return self.mechanical_row is not None or bool(len(self.postings))
+
+
+@dataclass(frozen=True, slots=True)
+class FullTextResult:
+    query: str
+    # 検索文書番号とスコア（スコア降順）
+    docs: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+    scores: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+
+    @property
+    def found(self) -> bool:
+        return bool(self.docs.size)
+
+
+@dataclass(frozen=True, slots=True)
+class PropertySearchResult:
+    keywords: List[str]
+    series: Tuple[int, ...] = ()
+    rows: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+    # 完全一致しなかった場合の全文検索結果
+    fallback: Optional[FullTextResult] = None
+
+
+@dataclass(frozen=True, slots=True)
+class SelectionResult:
+    objectives: List[Objective]
+    constraints: List[Predicate] = field(default_factory=list)
+    # 重み付きスコア上位の行番号とスコア。None はデータ未読み込み
+    rows: Optional[np.ndarray] = None
+    scores: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    # パレート最適な行番号とスコア（スコア降順・全件）
+    front: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+    front_scores: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    # 制約を満たした候補の総数
+    total: int = 0
+    # 追質問で直前の結果の中だけを対象にした場合、その結果の説明
+    scope: Optional[str] = None
+
+    @property
+    def found(self) -> bool:
+        return self.rows is not None and bool(self.rows.size)
+
+
+@dataclass(frozen=True, slots=True)
+class SimilarityResult:
+    designation: str
+    # 基準にした機械特性テーブルの行番号（該当なしは None）
+    origin: Optional[int] = None
+    # (特性キー, 重み)。基準の合金で欠損していて比較に使わなかった特性は重み 0
+    weights: Tuple[Tuple[str, float], ...] = ()
+    # 近い順の行番号・距離・特性ごとの寄与（行 × 特性、weights の順。合計が距離の 2 乗）
+    rows: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+    distances: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    contributions: np.ndarray = field(default_factory=lambda: np.empty((0, 0)))
+    # 入力に一致せず近い記号に補正した場合の元の入力
+    requested: Optional[str] = None
+    # 見つからなかった場合の近い記号（編集距離順）
+    suggestions: Tuple[str, ...] = ()
+    # 基準の合金はあるが比較できない場合の理由（重みが正の特性がすべて欠損など）
+    error: Optional[str] = None
+
+    @property
+    def found(self) -> bool:
+        return self.origin is not None and bool(self.rows.size)
+
+
+@dataclass(frozen=True, slots=True)
+class PropertyLookupResult:
+    # 追質問（「その耐力は？」）：直前の回答の行について、聞かれた特性だけを示す
+    subject: str
+    props: Tuple[str, ...]
+    rows: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+
+    @property
+    def found(self) -> bool:
+        return bool(self.rows.size)
+
+
+@dataclass(frozen=True, slots=True)
+class SeriesStatsResult:
+    # 系列の集計（「6000系の平均引張強さ」「7000系で最も強い調質」）。値は rag.series_stats から引く
+    series: Tuple[int, ...]
+    stat: str
+    props: Tuple[str, ...]
+    # 最大・最小の行番号（系列順・特性順。重複なし）
+    rows: np.ndarray = field(default_factory=lambda: _EMPTY_ROWS)
+    # データに行の無い系列
+    missing: Tuple[int, ...] = ()
+
+    @property
+    def found(self) -> bool:
+        return bool(self.series)
+
+
+@dataclass(frozen=True, slots=True)
+class HelpResult:
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class LoadingResult:
+    # バックグラウンド読み込み中で、質問に必要な機能がまだ使えない（capabilities.py）
+    pending: Tuple[str, ...]
+    ready: Tuple[str, ...] = ()
+
+    @property
+    def found(self) -> bool:
+        return False
+
+
+# ------------------------------------------------------------
+# ページ分割（行番号の配列を切り出すだけ。描画は後段）
+# ------------------------------------------------------------
+_PAGED_FIELDS = ("rows", "postings", "docs", "scores", "distances", "contributions")
+
+
+def paged_length(result: Any) -> int:
+    # ページ分割の対象になる件数（行・ポスティング・文書のうち最大のもの）
+    sizes = [getattr(result, name, None) for name in _PAGED_FIELDS]
+    return max((len(v) for v in sizes if isinstance(v, np.ndarray)), default=0)
+
+
+def paginate(result: Any, offset: int = 0, limit: Optional[int] = None) -> Any:
+    stop = None if limit is None else offset + limit
+    changes = {}
+    for name in _PAGED_FIELDS:
+        value = getattr(result, name, None)
+        if isinstance(value, np.ndarray):
+            changes[name] = value[offset:stop]
+    return replace(result, **changes) if changes else result
@@ -0,0 +1,524 @@
+# ------------------------------------------------------------
+# 全シート横断の検索エンジン（BM25 + ローカル埋め込みのハイブリッド）
+# ------------------------------------------------------------
+# - 各シートの行と系列情報（series_info）を 1 件ずつ文書化する
+# - BM25：日本語は文字 bigram、英数字は単語で分割した転置インデックス
+#   （ポスティングごとに BM25 重みを前計算した CSR 配列）
+# - 埋め込み：ALLOY_RAG_EMBEDDING_MODEL が設定され、かつ
+#   sentence-transformers が入っている場合のみ（CPU / float16 行列）
+# - 2 つの順位は Reciprocal Rank Fusion で統合する
+# - インデックスはディスクに保存し、起動のたびに作り直さない
+# - ワークブック編集時は変更されたシートの行だけ文書化し直し、
+#   残りのポスティング（生の語頻度）と合わせて重みを再計算する
+# ------------------------------------------------------------
+
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .workbook_cache import remap_sheet_ids
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT = 2
+EMBEDDING_MODEL_ENV = "ALLOY_RAG_EMBEDDING_MODEL"
+
+# 系列情報の文書は sheet_id = -1、row = 系列番号
+SERIES_SHEET_ID = -1
+
+_TOKEN_RE = re.compile(
+    r"[a-z0-9]+(?:[.\-][a-z0-9]+)*|[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]+"
+)
+_ALLOY_TOKEN_RE = re.compile(r"^a{1,2}(\d{4})$")
+
+Embedder = Callable[[List[str]], np.ndarray]
+
+
+# ------------------------------------------------------------
+# トークナイズ
+# ------------------------------------------------------------
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens: List[str] = []
+    for m in _TOKEN_RE.finditer(text):
+        t = m.group(0)
+        if t[0].isascii():
+            tokens.append(t)
+            parts = re.split(r"[.\-]", t)
+            if len(parts) > 1:
+                tokens.extend(parts)
+            for p in parts:
+                a = _ALLOY_TOKEN_RE.match(p)
+                if a:
+                    tokens.append(a.group(1))
+        elif len(t) == 1:
+            tokens.append(t)
+        else:
+            tokens.extend(t[i : i + 2] for i in range(len(t) - 1))
+    return tokens
+
+
+# ------------------------------------------------------------
+# 文書化（シート行 + 系列情報）
+# ------------------------------------------------------------
+def _present(v) -> bool:
+    # NaN は自分自身と等しくない
+    return v is not None and v == v and v is not pd.NA and str(v).strip() != ""
+
+
+def row_text(columns: List[str], values) -> str:
+    return " ".join(f"{c} {v}" for c, v in zip(columns, values) if _present(v))
+
+
+def build_documents(
+    data: Dict[str, pd.DataFrame],
+    series_info: Dict[int, Dict[str, str]],
+    sheets: Optional[Set[int]] = None,
+    include_series: bool = True,
+) -> Tuple[np.ndarray, List[str]]:
+    # sheets: 文書化するシート番号（None は全シート。差分再インデックス用）
+    refs: List[Tuple[int, int]] = []
+    texts: List[str] = []
+    for sid, df in enumerate(data.values()):
+        if sheets is not None and sid not in sheets:
+            continue
+        columns = [str(c) for c in df.columns]
+        col_values = [df.iloc[:, i].tolist() for i in range(df.shape[1])]
+        for r, values in enumerate(zip(*col_values)):
+            text = row_text(columns, values)
+            if text:
+                refs.append((sid, r))
+                texts.append(text)
+    if include_series:
+        for series, info in series_info.items():
+            refs.append((SERIES_SHEET_ID, series))
+            texts.append(f"{info['name']} {info['overview']} {info['features']}")
+    return np.array(refs, dtype=np.int32).reshape(-1, 2), texts
+
+
+# ------------------------------------------------------------
+# BM25 転置インデックス
+# ------------------------------------------------------------
+class BM25Index:
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        n_docs: int,
+        tf: Optional[np.ndarray] = None,
+        doc_len: Optional[np.ndarray] = None,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+        # 差分更新用の生の語頻度と文書長（重みの再計算に使う）
+        self.tf = tf
+        self.doc_len = doc_len
+
+    @staticmethod
+    def _count(
+        texts: List[str], vocab: Dict[str, int]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        term_ids: List[int] = []
+        post_docs: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+
+        for d, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[d] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                post_docs.append(d)
+                tfs.append(tf)
+
+        return (
+            np.array(term_ids, dtype=np.int32),
+            np.array(post_docs, dtype=np.int32),
+            np.array(tfs, dtype=np.float32),
+            doc_len,
+        )
+
+    @classmethod
+    def build(cls, texts: List[str]) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_arr, doc_arr, tf_arr, doc_len = cls._count(texts, vocab)
+        return cls._from_postings(vocab, term_arr, doc_arr, tf_arr, doc_len)
+
+    @classmethod
+    def _from_postings(
+        cls,
+        vocab: Dict[str, int],
+        term_arr: np.ndarray,
+        doc_arr: np.ndarray,
+        tf_arr: np.ndarray,
+        doc_len: np.ndarray,
+    ) -> "BM25Index":
+        k1, b = cls.K1, cls.B
+        order = np.lexsort((doc_arr, term_arr))
+        doc_ids = doc_arr[order]
+        tf = tf_arr[order]
+        df = np.bincount(term_arr, minlength=len(vocab))
+        indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        # BM25 の重みをポスティングごとに前計算（検索時は加算のみ）
+        n_docs = len(doc_len)
+        n = max(n_docs, 1)
+        avgdl = float(doc_len.mean()) if n_docs else 1.0
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * doc_len / max(avgdl, 1e-9))
+        term_of_posting = term_arr[order]
+        weights = idf[term_of_posting] * tf * (k1 + 1) / (tf + norm[doc_ids])
+
+        return cls(vocab, indptr, doc_ids, weights.astype(np.float32), n_docs, tf, doc_len)
+
+    def updated(
+        self, doc_map: np.ndarray, n_docs: int, texts: List[str], new_docs: np.ndarray
+    ) -> "BM25Index":
+        # doc_map: 旧文書番号 -> 新文書番号（破棄は -1）
+        # texts / new_docs: 追加する文書の本文と新文書番号
+        vocab = dict(self.vocab)
+        term_of_posting = np.repeat(
+            np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr)
+        )
+        new_of_posting = doc_map[self.doc_ids]
+        keep = new_of_posting >= 0
+
+        term_new, doc_new, tf_new, len_new = self._count(texts, vocab)
+        doc_len = np.zeros(n_docs, dtype=np.float32)
+        kept_docs = doc_map >= 0
+        doc_len[doc_map[kept_docs]] = self.doc_len[kept_docs]
+        doc_len[new_docs] = len_new
+
+        return self._from_postings(
+            vocab,
+            np.concatenate([term_of_posting[keep], term_new]),
+            np.concatenate([new_of_posting[keep], new_docs[doc_new]]).astype(np.int32),
+            np.concatenate([self.tf[keep], tf_new]),
+            doc_len,
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            # 1 つの語のポスティング内で文書は重複しない
+            scores[self.doc_ids[lo:hi]] += self.weights[lo:hi]
+        return scores
+
+
+# ------------------------------------------------------------
+# 埋め込み（任意）：float16 行列 + 総当たり / IVF
+# ------------------------------------------------------------
+def load_embedder(model_name: Optional[str] = None) -> Tuple[Optional[str], Optional[Embedder]]:
+    name = model_name or os.environ.get(EMBEDDING_MODEL_ENV)
+    if not name:
+        return None, None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.info("sentence-transformers が無いため埋め込み検索は無効です")
+        return None, None
+
+    model = SentenceTransformer(name, device="cpu")
+
+    def embed(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=64, normalize_embeddings=True)
+
+    return name, embed
+
+
+class EmbeddingIndex:
+    # これを超える文書数では IVF（粗量子化）で候補を絞る
+    IVF_THRESHOLD = 20000
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+        list_order: Optional[np.ndarray] = None,
+        list_ptr: Optional[np.ndarray] = None,
+        nprobe: int = 8,
+    ):
+        self.vectors = vectors.astype(np.float16, copy=False)
+        self.centroids = centroids
+        self.list_order = list_order
+        self.list_ptr = list_ptr
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, seed: int = 0) -> "EmbeddingIndex":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n <= cls.IVF_THRESHOLD:
+            return cls(vectors)
+
+        # 簡易 k-means（球面）でリストを作る
+        nlist = int(np.sqrt(n))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(10):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            nonempty = norms[:, 0] > 0
+            centroids[nonempty] = sums[nonempty] / norms[nonempty]
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        ptr = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+        return cls(vectors, centroids.astype(np.float32), order, ptr.astype(np.int64))
+
+    def search(self, qvec: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.asarray(qvec, dtype=np.float32).ravel()
+        if self.centroids is None:
+            cand = None
+            sims = self.vectors.astype(np.float32) @ q
+        else:
+            probe = np.argsort(-(self.centroids @ q))[: self.nprobe]
+            cand = np.concatenate(
+                [self.list_order[self.list_ptr[c] : self.list_ptr[c + 1]] for c in probe]
+            )
+            sims = self.vectors[cand].astype(np.float32) @ q
+        k = min(k, sims.size)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        ids = top if cand is None else cand[top]
+        return ids, sims[top]
+
+
+# ------------------------------------------------------------
+# ハイブリッド検索（BM25 + 埋め込み → RRF）
+# ------------------------------------------------------------
+class HybridRetriever:
+    RRF_K = 60
+
+    def __init__(
+        self,
+        refs: np.ndarray,
+        bm25: BM25Index,
+        embeddings: Optional[EmbeddingIndex] = None,
+        model_name: Optional[str] = None,
+        embedder: Optional[Embedder] = None,
+    ):
+        # 文書 -> [シート番号, 行番号]
+        self.refs = refs
+        self.bm25 = bm25
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.embedder = embedder
+
+    @classmethod
+    def build(
+        cls,
+        data: Dict[str, pd.DataFrame],
+        series_info: Dict[int, Dict[str, str]],
+        model_name: Optional[str] = None,
+        embedder: Optional[Embedder] = None,
+    ) -> "HybridRetriever":
+        refs, texts = build_documents(data, series_info)
+        bm25 = BM25Index.build(texts)
+        embeddings = None
+        if embedder is not None and texts:
+            embeddings = EmbeddingIndex.build(embedder(texts))
+        return cls(refs, bm25, embeddings, model_name, embedder)
+
+    # --------------------------------------------------------
+    # 差分更新（変更されたシートの行だけを文書化し直す。self は変更しない）
+    # --------------------------------------------------------
+    def updated(
+        self,
+        old_sheets: List[str],
+        data: Dict[str, pd.DataFrame],
+        series_info: Dict[int, Dict[str, str]],
+        touched: Set[str],
+        series_changed: bool,
+    ) -> "HybridRetriever":
+        if self.bm25.tf is None or not old_sheets:
+            return self.build(data, series_info, self.model_name, self.embedder)
+
+        sid_map = remap_sheet_ids(old_sheets, list(data.keys()), touched)
+        old_sid = self.refs[:, 0].astype(np.int64)
+        is_series = old_sid == SERIES_SHEET_ID
+        new_sid = np.where(is_series, SERIES_SHEET_ID, sid_map[np.where(is_series, 0, old_sid)])
+        keep = np.where(is_series, not series_changed, new_sid >= 0)
+
+        kept = np.flatnonzero(keep)
+        kept_refs = np.stack([new_sid[kept], self.refs[kept, 1]], axis=1)
+        reused = set(sid_map[sid_map >= 0].tolist())
+        fresh = {sid for sid in range(len(data)) if sid not in reused}
+        fresh_refs, texts = build_documents(data, series_info, fresh, series_changed)
+
+        # 全体構築と同じ並び（シート順・行順、系列文書は末尾）にそろえる
+        all_refs = np.concatenate([kept_refs, fresh_refs]).astype(np.int32)
+        series_doc = all_refs[:, 0] == SERIES_SHEET_ID
+        primary = np.where(series_doc, len(data), all_refs[:, 0])
+        secondary = np.where(series_doc, np.arange(len(all_refs)), all_refs[:, 1])
+        order = np.lexsort((secondary, primary))
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+
+        doc_map = np.full(len(self.refs), -1, dtype=np.int64)
+        doc_map[kept] = position[: kept.size]
+        new_docs = position[kept.size :]
+        bm25 = self.bm25.updated(doc_map, len(order), texts, new_docs)
+
+        embeddings = None
+        if self.embeddings is not None and self.embedder is not None:
+            old_vectors = self.embeddings.vectors
+            vectors = np.zeros((len(order), old_vectors.shape[1]), dtype=np.float32)
+            vectors[doc_map[kept]] = old_vectors[kept]
+            if texts:
+                vectors[new_docs] = self.embedder(texts)
+            embeddings = EmbeddingIndex.build(vectors)
+
+        return HybridRetriever(
+            all_refs[order], bm25, embeddings, self.model_name, self.embedder
+        )
+
+    def search(self, query: str, k: int = 5, depth: int = 50) -> List[Tuple[int, float]]:
+        scores = self.bm25.scores(query)
+        hit = np.flatnonzero(scores > 0)
+        if hit.size > depth:
+            hit = hit[np.argpartition(-scores[hit], depth - 1)[:depth]]
+        bm25_rank = hit[np.lexsort((hit, -scores[hit]))]
+
+        if self.embeddings is None or self.embedder is None:
+            return [(int(d), float(scores[d])) for d in bm25_rank[:k]]
+
+        dense_rank, _ = self.embeddings.search(self.embedder([query])[0], depth)
+        fused: Dict[int, float] = {}
+        for ranking in (bm25_rank, dense_rank):
+            for rank, d in enumerate(ranking):
+                fused[int(d)] = fused.get(int(d), 0.0) + 1.0 / (self.RRF_K + rank + 1)
+        return sorted(fused.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+    # --------------------------------------------------------
+    # 保存 / 読み込み
+    # --------------------------------------------------------
+    def save(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "refs": self.refs,
+            "indptr": self.bm25.indptr,
+            "doc_ids": self.bm25.doc_ids,
+            "weights": self.bm25.weights,
+            "tf": self.bm25.tf,
+            "doc_len": self.bm25.doc_len,
+        }
+        if self.embeddings is not None:
+            arrays["vectors"] = self.embeddings.vectors
+            if self.embeddings.centroids is not None:
+                arrays["centroids"] = self.embeddings.centroids
+                arrays["list_order"] = self.embeddings.list_order
+                arrays["list_ptr"] = self.embeddings.list_ptr
+        np.savez(directory / "index.npz", **arrays)
+
+        terms = [""] * len(self.bm25.vocab)
+        for term, i in self.bm25.vocab.items():
+            terms[i] = term
+        meta = {
+            "format": INDEX_FORMAT,
+            "n_docs": self.bm25.n_docs,
+            "model": self.model_name if self.embeddings is not None else None,
+            "terms": terms,
+        }
+        with open(directory / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(
+        cls,
+        directory: Path,
+        model_name: Optional[str] = None,
+        embedder: Optional[Embedder] = None,
+    ) -> Optional["HybridRetriever"]:
+        meta_path = directory / "meta.json"
+        if not meta_path.exists():
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        # 埋め込みモデルが変わった場合は作り直す
+        if meta.get("format") != INDEX_FORMAT or meta.get("model") != model_name:
+            return None
+
+        z = np.load(directory / "index.npz")
+        vocab = {t: i for i, t in enumerate(meta["terms"])}
+        bm25 = BM25Index(
+            vocab,
+            z["indptr"],
+            z["doc_ids"],
+            z["weights"],
+            meta["n_docs"],
+            z["tf"],
+            z["doc_len"],
+        )
+        embeddings = None
+        if "vectors" in z.files:
+            embeddings = EmbeddingIndex(
+                z["vectors"],
+                z["centroids"] if "centroids" in z.files else None,
+                z["list_order"] if "list_order" in z.files else None,
+                z["list_ptr"] if "list_ptr" in z.files else None,
+            )
+        return cls(z["refs"], bm25, embeddings, model_name, embedder)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        directory: Optional[Path],
+        data: Dict[str, pd.DataFrame],
+        series_info: Dict[int, Dict[str, str]],
+        model_name: Optional[str] = None,
+        previous: Optional["HybridRetriever"] = None,
+        old_sheets: Optional[List[str]] = None,
+        touched: Optional[Set[str]] = None,
+        series_changed: bool = True,
+    ) -> "HybridRetriever":
+        # previous / old_sheets / touched: 編集前のインデックスと変更シート（差分更新用）
+        requested = model_name or os.environ.get(EMBEDDING_MODEL_ENV) or None
+        if previous is not None and previous.model_name == requested:
+            model_name, embedder = previous.model_name, previous.embedder
+        else:
+            model_name, embedder = load_embedder(model_name)
+
+        if directory is not None:
+            try:
+                loaded = cls.load(directory, model_name, embedder)
+                if loaded is not None:
+                    return loaded
+            except Exception as e:
+                logger.warning("検索インデックスの読み込みに失敗しました（再構築します）: %s", e)
+
+        if previous is not None and touched is not None and previous.model_name == model_name:
+            retriever = previous.updated(
+                old_sheets or [], data, series_info, touched, series_changed
+            )
+        else:
+            retriever = cls.build(data, series_info, model_name, embedder)
+        if directory is not None:
+            try:
+                retriever.save(directory)
+            except OSError as e:
+                logger.warning("検索インデックスを保存できませんでした: %s", e)
+        return retriever
@@ -0,0 +1,251 @@
+# ------------------------------------------------------------
+# 多目的の材料選定（重み付きスコア + パレート最適）
+# ------------------------------------------------------------
+# - 目的（最大化 / 最小化する特性と重み）と制約（Predicate）を受け取り、
+#   MechanicalColumnStore の列（数値・A〜E の順序尺度）だけで評価する
+# - 重み付きスコア：候補内で min-max 正規化した値の加重平均
+# - パレート最適：目的の合計値で降順に並べ、ブロック単位のブロードキャスト
+#   比較で非劣解を求める（支配する側は必ず合計値が大きいので、
+#   各点は自分より前の点とだけ比較すればよい）。10 万行でも対話的に応答できる
+# ------------------------------------------------------------
+
+import re
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .column_store import (
+    PROPERTY_ALIASES,
+    PROPERTY_LABELS,
+    RANK_COLUMNS,
+    RANK_SCORES,
+    RATING_COLUMNS,
+    RATING_SCORES,
+    MechanicalColumnStore,
+    Predicate,
+)
+
+
+class Objective(NamedTuple):
+    prop: str
+    weight: float = 1.0
+    maximize: bool = True
+
+
+# 目的を指定しないときの既定（強度・延性・耐食性・溶接性・切削性）
+DEFAULT_OBJECTIVES: Tuple[Objective, ...] = (
+    Objective("tensile"),
+    Objective("elongation"),
+    Objective("corrosion"),
+    Objective("weldability"),
+    Objective("machinability"),
+)
+
+# 「重視」「優先」を付けた目的の重み
+EMPHASIS_WEIGHT = 2.0
+
+# クエリ中の表記ゆれ -> 特性キー（数値特性 + 定性評価）
+RATING_ALIASES: Dict[str, str] = {
+    "耐食性": "corrosion",
+    "耐食": "corrosion",
+    "corrosion resistance": "corrosion",
+    "corrosion": "corrosion",
+    "溶接性": "weldability",
+    "溶接": "weldability",
+    "weldability": "weldability",
+    "切削性": "machinability",
+    "被削性": "machinability",
+    "切削": "machinability",
+    "machinability": "machinability",
+    "成形性": "formability",
+    "成形": "formability",
+    "formability": "formability",
+}
+OBJECTIVE_ALIASES: Dict[str, str] = {**PROPERTY_ALIASES, "強度": "tensile", **RATING_ALIASES}
+
+_ALIAS_PATTERN = "|".join(
+    re.escape(a) for a in sorted(OBJECTIVE_ALIASES, key=len, reverse=True)
+)
+_OBJECTIVE_RE = re.compile(
+    r"(?P<prop>" + _ALIAS_PATTERN + r")"
+    r"(?:\s*(?:を|は)?\s*(?P<emph>重視|優先)|\s*[×x*]\s*(?P<weight>\d+(?:\.\d+)?))?",
+    re.IGNORECASE,
+)
+_RATING_CONSTRAINT_RE = re.compile(
+    r"(?P<prop>" + "|".join(re.escape(a) for a in sorted(RATING_ALIASES, key=len, reverse=True))
+    + r")\s*(?:が|は|:|：)?\s*(?P<grade>[A-EＡ-Ｅ])\s*(?P<word>以上|以下)?(?![A-Za-z])",
+    re.IGNORECASE,
+)
+# API 用の表記（"tensile:2" / "-elongation" / "tensile>=300" / "corrosion>=B"）
+_SPEC_OBJECTIVE_RE = re.compile(r"\s*(?P<sign>[-+])?(?P<prop>\w+)\s*(?::\s*(?P<weight>\d+(?:\.\d+)?))?\s*")
+_SPEC_CONSTRAINT_RE = re.compile(r"\s*(?P<prop>\w+)\s*(?P<op>>=|<=|>|<)\s*(?P<value>[\w.]+)\s*")
+
+# ブロードキャスト比較 1 回あたりの要素数の上限（bool 配列のメモリを抑える）
+_BLOCK_ELEMENTS = 1 << 22
+
+
+# ------------------------------------------------------------
+# クエリからの目的・制約の抽出
+# ------------------------------------------------------------
+def parse_objectives(query: str) -> List[Objective]:
+    weights: Dict[str, float] = {}
+    for m in _OBJECTIVE_RE.finditer(query):
+        prop = OBJECTIVE_ALIASES[m.group("prop").lower()]
+        if m.group("weight"):
+            w = float(m.group("weight"))
+            # 「強度×0」は目的にしない（重みは正の値だけ）
+            if w <= 0:
+                continue
+        elif m.group("emph"):
+            w = EMPHASIS_WEIGHT
+        else:
+            w = 1.0
+        weights[prop] = max(weights.get(prop, 0.0), w)
+    return [Objective(p, w) for p, w in weights.items()]
+
+
+def parse_rating_constraints(query: str) -> List[Predicate]:
+    # 「耐食性 B 以上」「溶接性が A」 -> 順序尺度の下限（「以下」のみ上限）
+    preds: List[Predicate] = []
+    for m in _RATING_CONSTRAINT_RE.finditer(query):
+        prop = RATING_ALIASES[m.group("prop").lower()]
+        grade = m.group("grade").upper().translate(str.maketrans("ＡＢＣＤＥ", "ABCDE"))
+        op = "<=" if m.group("word") == "以下" else ">="
+        preds.append(Predicate(prop, op, RATING_SCORES[grade]))
+    return preds
+
+
+def parse_objective_spec(spec: str) -> Objective:
+    m = _SPEC_OBJECTIVE_RE.fullmatch(spec)
+    if not m or m.group("prop") not in PROPERTY_LABELS:
+        raise ValueError(f"目的の指定が不正です: {spec!r}")
+    weight = float(m.group("weight")) if m.group("weight") else 1.0
+    if weight <= 0:
+        raise ValueError(f"目的の重みは正の値で指定してください: {spec!r}")
+    return Objective(m.group("prop"), weight, m.group("sign") != "-")
+
+
+def parse_constraint_spec(spec: str) -> Predicate:
+    m = _SPEC_CONSTRAINT_RE.fullmatch(spec)
+    if not m or m.group("prop") not in PROPERTY_LABELS:
+        raise ValueError(f"制約の指定が不正です: {spec!r}")
+    prop, raw = m.group("prop"), m.group("value")
+    if prop in RATING_COLUMNS and raw.upper() in RATING_SCORES:
+        value = RATING_SCORES[raw.upper()]
+    elif prop in RANK_COLUMNS and raw in RANK_SCORES:
+        value = RANK_SCORES[raw]
+    else:
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"制約の値が不正です: {spec!r}")
+    return Predicate(prop, m.group("op"), value)
+
+
+# ------------------------------------------------------------
+# 目的行列（行 = 候補、列 = 目的。すべて「大きいほど良い」に揃える）
+# ------------------------------------------------------------
+def objective_matrix(
+    store: MechanicalColumnStore, objectives: Sequence[Objective], rows: np.ndarray
+) -> np.ndarray:
+    cols = []
+    for o in objectives:
+        v = store.values[o.prop][rows]
+        cols.append(v if o.maximize else -v)
+    return np.column_stack(cols) if cols else np.empty((rows.size, 0))
+
+
+def weighted_scores(points: np.ndarray, weights: Sequence[float]) -> np.ndarray:
+    # 列ごとに min-max 正規化（全候補が同値の列は 1、欠損は 0）して加重平均
+    if not len(points):
+        return np.empty(0, dtype=np.float64)
+    w = np.asarray(weights, dtype=np.float64)
+    if not w.sum() > 0:
+        # 重みがすべて 0 なら均等に（0 で割らない）
+        w = np.ones_like(w)
+    with np.errstate(invalid="ignore"):
+        lo = np.nanmin(np.where(np.isnan(points), np.inf, points), axis=0)
+        hi = np.nanmax(np.where(np.isnan(points), -np.inf, points), axis=0)
+        span = hi - lo
+        norm = np.where(span > 0, (points - lo) / np.where(span > 0, span, 1.0), 1.0)
+    norm = np.where(np.isnan(points), 0.0, norm)
+    return norm @ w / w.sum()
+
+
+# ------------------------------------------------------------
+# 非劣解（パレート最適）
+# ------------------------------------------------------------
+def _fill_missing(points: np.ndarray) -> np.ndarray:
+    # 欠損はその目的の最悪値より 1 小さい値とみなす（有限値のまま比較できるように）
+    points = points.astype(np.float64, copy=True)
+    missing = np.isnan(points)
+    if missing.any():
+        with np.errstate(invalid="ignore"):
+            worst = np.nanmin(np.where(missing, np.inf, points), axis=0)
+        worst = np.where(np.isfinite(worst), worst, 0.0) - 1.0
+        points[missing] = np.broadcast_to(worst, points.shape)[missing]
+    return points
+
+
+def _dominated_by(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # a の各点が b のいずれかの点に支配されるか（b >= a が全目的、かつ b > a がどれか）
+    # b は小さなブロックから順に比較し、支配が確定した a の点は以降の比較から外す
+    out = np.zeros(len(a), dtype=bool)
+    if not len(a) or not len(b):
+        return out
+    alive = np.arange(len(a))
+    start, step = 0, 16
+    while start < len(b) and alive.size:
+        step = min(step, max(1, _BLOCK_ELEMENTS // (alive.size * a.shape[1] or 1)))
+        blk = b[start : start + step]
+        pts = a[alive]
+        ge = (blk[None, :, :] >= pts[:, None, :]).all(axis=2)
+        gt = (blk[None, :, :] > pts[:, None, :]).any(axis=2)
+        hit = (ge & gt).any(axis=1)
+        out[alive[hit]] = True
+        alive = alive[~hit]
+        start += step
+        step *= 4
+    return out
+
+
+def pareto_front(points: np.ndarray, block: int = 1024) -> np.ndarray:
+    # 非劣解の bool マスク（全目的を最大化。同じ値の点は互いに支配しない）
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    points = _fill_missing(points)
+    order = np.argsort(-points.sum(axis=1), kind="stable")
+    ranked = points[order]
+
+    front = np.empty((0, points.shape[1]))
+    front_pos: List[np.ndarray] = []
+    for start in range(0, n, block):
+        chunk = ranked[start : start + block]
+        alive = np.flatnonzero(~_dominated_by(chunk, front))
+        cand = chunk[alive]
+        keep = alive[~_dominated_by(cand, cand)]
+        if keep.size:
+            front = np.vstack([front, chunk[keep]])
+            front_pos.append(keep + start)
+
+    if front_pos:
+        mask[order[np.concatenate(front_pos)]] = True
+    return mask
+
+
+# ------------------------------------------------------------
+# 上位 k 件（スコア降順、同点は行順）
+# ------------------------------------------------------------
+def top_k_by_score(rows: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    if k <= 0 or not rows.size:
+        return np.empty(0, dtype=np.int64)
+    key = -scores
+    if k < rows.size:
+        kth = key[np.argpartition(key, k - 1)[k - 1]]
+        keep = np.flatnonzero(key <= kth)
+    else:
+        keep = np.arange(rows.size)
+    order = np.lexsort((rows[keep], key[keep]))[:k]
+    return keep[order]
@@ -0,0 +1,147 @@
+# ------------------------------------------------------------
+# 系列ごとの集計（索引構築時に 1 度だけ計算する実体化ビュー）
+# ------------------------------------------------------------
+# - 機械特性テーブルの行を系列ごとにまとめ（系列順・行順の 1 本の配列 + 区切り位置）、
+#   特性ごとの件数・最小・中央値・平均・最大と、最大・最小の行、評価（A〜E・高中低）の
+#   分布を (系列 × 特性) の配列に持つ
+# - 系列の行・代表合金の一覧・集計値の参照は配列の添字だけ（系列ごとの絞り込みや
+#   並べ替えをクエリのたびに行わない）
+# ------------------------------------------------------------
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .column_store import (
+    PROPERTY_LABELS,
+    RANK_COLUMNS,
+    RANK_SCORES,
+    RATING_COLUMNS,
+    RATING_SCORES,
+    MechanicalColumnStore,
+)
+
+# 集計の種類
+STAT_MEAN = "mean"
+STAT_MEDIAN = "median"
+STAT_MAX = "max"
+STAT_MIN = "min"
+STAT_SUMMARY = "summary"
+
+STAT_LABELS: Dict[str, str] = {
+    STAT_MEAN: "平均",
+    STAT_MEDIAN: "中央値",
+    STAT_MAX: "最大",
+    STAT_MIN: "最小",
+    STAT_SUMMARY: "統計",
+}
+
+# 分布を数える特性 -> 評価の順序尺度（良い順）
+_LEVELS: Dict[str, np.ndarray] = {
+    **{p: np.array(sorted(RATING_SCORES.values(), reverse=True)) for p in RATING_COLUMNS},
+    **{p: np.array(sorted(RANK_SCORES.values(), reverse=True)) for p in RANK_COLUMNS},
+}
+
+
+class SeriesAggregates:
+    def __init__(self, store: MechanicalColumnStore, labels: Sequence[str]):
+        # labels: 行ごとの合金記号（A6061-T6）。代表合金の一覧に使う
+        self.props: Tuple[str, ...] = tuple(p for p in PROPERTY_LABELS if p in store.values)
+
+        valid = np.flatnonzero(~np.isnan(store.series))
+        codes = store.series[valid].astype(np.int64)
+        # 系列順・同じ系列の中は行順
+        order = np.lexsort((valid, codes))
+        self.rows = valid[order]
+        self.series, starts = np.unique(codes[order], return_index=True)
+        self.offsets = np.append(starts, self.rows.size).astype(np.int64)
+        self._index = {int(s): i for i, s in enumerate(self.series)}
+
+        n, m = len(self.series), len(self.props)
+        self.count = np.zeros((n, m), dtype=np.int64)
+        self.minimum = np.full((n, m), np.nan)
+        self.median = np.full((n, m), np.nan)
+        self.mean = np.full((n, m), np.nan)
+        self.maximum = np.full((n, m), np.nan)
+        # 最大・最小の行番号（同値は先の行。値が無ければ -1）
+        self.argmax = np.full((n, m), -1, dtype=np.int64)
+        self.argmin = np.full((n, m), -1, dtype=np.int64)
+        self.distribution: Dict[str, np.ndarray] = {
+            p: np.zeros((n, len(levels)), dtype=np.int64)
+            for p, levels in _LEVELS.items()
+            if p in self.props
+        }
+        members: List[Tuple[str, ...]] = []
+
+        for i in range(n):
+            rows = self.rows[self.offsets[i] : self.offsets[i + 1]]
+            members.append(tuple(sorted(labels[r] for r in rows)))
+            for j, p in enumerate(self.props):
+                vals = store.values[p][rows]
+                known = ~np.isnan(vals)
+                if not known.any():
+                    continue
+                v = vals[known]
+                self.count[i, j] = v.size
+                self.minimum[i, j] = v.min()
+                self.median[i, j] = np.median(v)
+                self.mean[i, j] = v.mean()
+                self.maximum[i, j] = v.max()
+                self.argmax[i, j] = rows[known][np.argmax(v)]
+                self.argmin[i, j] = rows[known][np.argmin(v)]
+                if p in self.distribution:
+                    self.distribution[p][i] = (v[:, None] == _LEVELS[p][None, :]).sum(axis=0)
+        self.members: Tuple[Tuple[str, ...], ...] = tuple(members)
+
+        self._stats = {
+            STAT_MEAN: self.mean,
+            STAT_MEDIAN: self.median,
+            STAT_MAX: self.maximum,
+            STAT_MIN: self.minimum,
+        }
+
+    @classmethod
+    def build(
+        cls, store: MechanicalColumnStore, alloys, tempers, fmt: Callable[[object, object], str]
+    ) -> "SeriesAggregates":
+        return cls(store, [fmt(a, t) for a, t in zip(alloys, tempers)])
+
+    def __contains__(self, series: int) -> bool:
+        return series in self._index
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    # --------------------------------------------------------
+    # 参照（添字だけ）
+    # --------------------------------------------------------
+    def rows_in(self, series: int) -> np.ndarray:
+        i = self._index.get(series)
+        if i is None:
+            return self.rows[:0]
+        return self.rows[self.offsets[i] : self.offsets[i + 1]]
+
+    def members_of(self, series: int) -> Tuple[str, ...]:
+        i = self._index.get(series)
+        return self.members[i] if i is not None else ()
+
+    def size(self, series: int) -> int:
+        i = self._index.get(series)
+        return int(self.offsets[i + 1] - self.offsets[i]) if i is not None else 0
+
+    def value(self, series: int, prop: str, stat: str) -> float:
+        return float(self._stats[stat][self._index[series], self.props.index(prop)])
+
+    def known(self, series: int, prop: str) -> int:
+        return int(self.count[self._index[series], self.props.index(prop)])
+
+    def best(self, series: int, prop: str, stat: str = STAT_MAX) -> Optional[int]:
+        rows = self.argmax if stat == STAT_MAX else self.argmin
+        r = int(rows[self._index[series], self.props.index(prop)])
+        return r if r >= 0 else None
+
+    def levels(self, prop: str) -> np.ndarray:
+        return _LEVELS[prop]
+
+    def counts(self, series: int, prop: str) -> np.ndarray:
+        return self.distribution[prop][self._index[series]]
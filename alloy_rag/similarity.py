@@ -0,0 +1,222 @@
+# ------------------------------------------------------------
+# 類似合金の検索（特性ベクトルの最近傍・KD 木）
+# ------------------------------------------------------------
+# - 機械特性テーブルの数値特性（引張強さ・耐力・伸び・疲れ強さ）と順序尺度
+#   （強度ランク・耐食性・溶接性・切削性）を列ごとに min-max で [0, 1] に正規化し、
+#   索引構築時に 1 度だけ KD 木を作る
+# - 距離は重み付きユークリッド距離。箱（ノードの範囲）までの距離の下限も同じ重みで
+#   求めるので、問い合わせごとに重みを変えても木を作り直す必要はない
+# - 葉の中は NumPy でまとめて計算し、k 番目の距離より遠い箱は開かない
+#   → 10 万行でも 1 回の検索は数 ms
+# - 距離は特性ごとの寄与（重み × 正規化した差の 2 乗）に分解して返す
+# - 欠損値は列の中央値とみなす。基準の合金で欠損している特性は比較に使わない
+# ------------------------------------------------------------
+
+import heapq
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .column_store import MechanicalColumnStore
+
+# 類似度に使う特性（column_store の特性キー）
+SIMILARITY_PROPERTIES: Tuple[str, ...] = (
+    "tensile",
+    "proof",
+    "elongation",
+    "fatigue",
+    "strength_rank",
+    "corrosion",
+    "weldability",
+    "machinability",
+)
+
+
+# ------------------------------------------------------------
+# 問い合わせの検証（件数・重みの不正な指定は ValueError）
+# ------------------------------------------------------------
+# - 件数 0 や重みがすべて 0 の指定は「近い合金が無い」のではなく入力の誤りとして扱う
+def validate_query(
+    k: int,
+    weights: Optional[Dict[str, float]] = None,
+    props: Sequence[str] = SIMILARITY_PROPERTIES,
+):
+    if k < 1:
+        raise ValueError(f"類似合金の件数は 1 以上で指定してください: {k}")
+    w = {p: float((weights or {}).get(p, 1.0)) for p in props}
+    bad = [f"{p}={v:g}" for p, v in w.items() if not (np.isfinite(v) and v >= 0)]
+    if bad:
+        raise ValueError(f"特性の重みは 0 以上の有限の値で指定してください: {', '.join(bad)}")
+    if not any(v > 0 for v in w.values()):
+        raise ValueError("少なくとも 1 つの特性に正の重みを指定してください")
+
+
+class Neighbors(NamedTuple):
+    # 行番号（距離の昇順、同距離は行順）・距離・特性ごとの寄与（行 × 特性）
+    rows: np.ndarray
+    distances: np.ndarray
+    contributions: np.ndarray
+
+
+# ------------------------------------------------------------
+# KD 木（配列で持つ。ノード i の点は index[start[i]:end[i]]）
+# ------------------------------------------------------------
+class KDTree:
+    def __init__(self, points: np.ndarray, leaf_size: int = 32):
+        points = np.asarray(points, dtype=np.float64)
+        n, dim = points.shape
+        index = np.arange(n, dtype=np.int64)
+        start: List[int] = []
+        end: List[int] = []
+        left: List[int] = []
+        right: List[int] = []
+        lo: List[np.ndarray] = []
+        hi: List[np.ndarray] = []
+
+        def node(s: int, e: int) -> int:
+            pts = points[index[s:e]]
+            start.append(s)
+            end.append(e)
+            left.append(-1)
+            right.append(-1)
+            lo.append(pts.min(axis=0) if e > s else np.zeros(dim))
+            hi.append(pts.max(axis=0) if e > s else np.zeros(dim))
+            return len(start) - 1
+
+        stack = [node(0, n)]
+        while stack:
+            i = stack.pop()
+            s, e = start[i], end[i]
+            if e - s <= leaf_size:
+                continue
+            span = hi[i] - lo[i]
+            d = int(np.argmax(span))
+            if span[d] <= 0:
+                # 全点が同じ値（順序尺度の多い表ではよくある）→ 葉のまま
+                continue
+            # 最も広がった次元の中央値で 2 分割
+            mid = (s + e) // 2
+            sub = index[s:e]
+            index[s:e] = sub[np.argpartition(points[sub, d], mid - s)]
+            left[i] = node(s, mid)
+            right[i] = node(mid, e)
+            stack.extend((left[i], right[i]))
+
+        self.index = index
+        # 葉を連続したメモリで走査できるよう、木の順に並べ替えた点
+        self.points = points[index]
+        self.start = np.array(start, dtype=np.int64)
+        self.end = np.array(end, dtype=np.int64)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.lo = np.array(lo).reshape(-1, dim)
+        self.hi = np.array(hi).reshape(-1, dim)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _box_distance(self, i: int, q: np.ndarray, w: np.ndarray) -> float:
+        gap = np.maximum(np.maximum(self.lo[i] - q, q - self.hi[i]), 0.0)
+        return float(gap * gap @ w)
+
+    def query(
+        self,
+        q: np.ndarray,
+        k: int,
+        weights: np.ndarray,
+        exclude: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # 重み付き距離の 2 乗が小さい順に k 件（行番号, 距離²）。exclude は除外する行の bool マスク
+        best_rows = np.empty(0, dtype=np.int64)
+        best_d2 = np.empty(0, dtype=np.float64)
+        if k <= 0 or not len(self):
+            return best_rows, best_d2
+
+        kth = np.inf
+        heap = [(self._box_distance(0, q, weights), 0)]
+        while heap:
+            dist, i = heapq.heappop(heap)
+            # 同距離の行も行順で選べるよう、k 番目と等しい箱は開く
+            if dist > kth:
+                break
+            if self.left[i] < 0:
+                s, e = self.start[i], self.end[i]
+                diff = self.points[s:e] - q
+                d2 = diff * diff @ weights
+                rows = self.index[s:e]
+                if exclude is not None:
+                    keep = ~exclude[rows]
+                    rows, d2 = rows[keep], d2[keep]
+                best_rows = np.concatenate([best_rows, rows])
+                best_d2 = np.concatenate([best_d2, d2])
+                if best_rows.size > k:
+                    order = np.lexsort((best_rows, best_d2))[:k]
+                    best_rows, best_d2 = best_rows[order], best_d2[order]
+                if best_rows.size == k:
+                    kth = float(best_d2.max())
+            else:
+                for child in (self.left[i], self.right[i]):
+                    heapq.heappush(heap, (self._box_distance(child, q, weights), int(child)))
+
+        order = np.lexsort((best_rows, best_d2))
+        return best_rows[order], best_d2[order]
+
+
+# ------------------------------------------------------------
+# 機械特性テーブルの類似検索
+# ------------------------------------------------------------
+class SimilarityIndex:
+    def __init__(
+        self,
+        store: MechanicalColumnStore,
+        props: Sequence[str] = SIMILARITY_PROPERTIES,
+        leaf_size: int = 64,
+    ):
+        self.props = tuple(props)
+        raw = np.column_stack([store.values[p] for p in self.props]) if store.n else np.empty(
+            (0, len(self.props))
+        )
+        self.missing = np.isnan(raw)
+
+        # 列ごとに [0, 1] へ（全欠損・全同値の列は幅 1 とみなす）
+        lo = np.min(np.where(self.missing, np.inf, raw), axis=0, initial=np.inf)
+        hi = np.max(np.where(self.missing, -np.inf, raw), axis=0, initial=-np.inf)
+        lo = np.where(np.isfinite(lo), lo, 0.0)
+        span = np.where(np.isfinite(hi) & (hi > lo), hi - lo, 1.0)
+        points = (raw - lo) / span
+        for j in np.flatnonzero(self.missing.any(axis=0)):
+            known = points[~self.missing[:, j], j]
+            points[self.missing[:, j], j] = np.median(known) if known.size else 0.0
+
+        self.span = span
+        self.tree = KDTree(points, leaf_size)
+        # 元の行順の座標（基準の合金の座標・寄与の計算に使う）
+        self.points = points
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def weight_vector(self, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        weights = weights or {}
+        return np.array([float(weights.get(p, 1.0)) for p in self.props], dtype=np.float64)
+
+    def query(
+        self,
+        row: int,
+        k: int = 10,
+        weights: Optional[Dict[str, float]] = None,
+        exclude: Optional[np.ndarray] = None,
+    ) -> Neighbors:
+        w = self.weight_vector(weights)
+        w[self.missing[row]] = 0.0
+        total = w.sum()
+        if total <= 0:
+            return Neighbors(
+                np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, len(self.props)))
+            )
+        w = w / total
+
+        q = self.points[row]
+        rows, d2 = self.tree.query(q, k, w, exclude)
+        diff = self.points[rows] - q
+        return Neighbors(rows, np.sqrt(d2), diff * diff * w)
@@ -0,0 +1,419 @@
+# ------------------------------------------------------------
+# 計測（トレーシングスパン・ヒストグラム・エクスポーター・サンプリングプロファイラ）
+# ------------------------------------------------------------
+# - `with span("route"):` / `@traced("engine.search_full_text")` で区間を計測する
+#   入れ子のスパンは contextvars で親子関係を追い、最上位のスパンが終わった時点で
+#   1 本のトレースとしてエクスポーターに渡す
+# - スパン名ごとに固定バケットのヒストグラムを持ち、Prometheus テキスト形式 /
+#   JSON で書き出せる（api.py の GET /metrics、または serve_metrics() の HTTP サーバー）
+# - 標準ライブラリのみ（app.py から import しても起動時間に影響しない。
+#   cProfile / pstats はプロファイラを有効にした時だけ読み込む）
+#
+# 環境変数:
+#   ALLOY_RAG_TRACING=0                 計測を無効化（スパンは何もしない）
+#   ALLOY_RAG_TRACE_LOG_MS=100          この時間を超えたトレースをログに出す
+#   ALLOY_RAG_PROFILE_SAMPLE=0.1        最上位スパンの 10% を cProfile で計測
+#   ALLOY_RAG_PROFILE_THRESHOLD_MS=200  この時間を超えたものだけ統計を残す
+#   ALLOY_RAG_PROFILE_DIR=/tmp/prof     .prof ファイルの保存先（任意）
+#   ALLOY_RAG_METRICS_PORT=9464         Streamlit プロセスでもメトリクスを HTTP で公開
+# ------------------------------------------------------------
+
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ヒストグラムのバケット上限（ms）。Prometheus へは秒で書き出す
+BUCKETS_MS: Tuple[float, ...] = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+
+# ------------------------------------------------------------
+# ヒストグラム
+# ------------------------------------------------------------
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_MS):
+        self.buckets = buckets
+        # 最後の要素は +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def quantile(self, q: float) -> float:
+        # バケット内は線形補間（Prometheus の histogram_quantile と同じ考え方）
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": self.sum_ms,
+            "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                **{str(b): c for b, c in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+# ------------------------------------------------------------
+# トレース（最上位スパン 1 本分の記録）
+# ------------------------------------------------------------
+class SpanRecord(NamedTuple):
+    name: str
+    depth: int
+    start_ms: float
+    duration_ms: float
+    attrs: Dict[str, Any]
+
+
+class Trace(NamedTuple):
+    name: str
+    duration_ms: float
+    attrs: Dict[str, Any]
+    spans: List[SpanRecord]
+    # サンプリングプロファイラが閾値超えを記録した場合の上位関数
+    profile: Optional[str] = None
+
+    def summary(self) -> str:
+        parts = ", ".join(
+            f"{'  ' * (s.depth - 1)}{s.name} {s.duration_ms:.1f} ms"
+            for s in sorted(self.spans, key=lambda s: s.start_ms)
+            if s.depth > 0
+        )
+        return f"{self.name} {self.duration_ms:.1f} ms [{parts}]"
+
+
+# ------------------------------------------------------------
+# エクスポーター
+# ------------------------------------------------------------
+class LogExporter:
+    # 閾値を超えたトレースの内訳を 1 行でログに出す
+    def __init__(self, min_ms: float = 0.0, log: Optional[logging.Logger] = None):
+        self.min_ms = min_ms
+        self.log = log or logger
+
+    def __call__(self, trace: Trace):
+        if trace.duration_ms >= self.min_ms:
+            self.log.info("trace %s %s", trace.summary(), trace.attrs or "")
+
+
+class RecentTraces:
+    # 直近のトレースを保持（サイドバーの診断パネル用）
+    def __init__(self, maxlen: int = 50):
+        self.traces: Deque[Trace] = deque(maxlen=maxlen)
+
+    def __call__(self, trace: Trace):
+        self.traces.append(trace)
+
+
+# ------------------------------------------------------------
+# サンプリングプロファイラ（遅い最上位スパンの cProfile 統計を残す）
+# ------------------------------------------------------------
+class SampledProfiler:
+    def __init__(
+        self,
+        sample_rate: float,
+        threshold_ms: float,
+        out_dir: Optional[str] = None,
+        top: int = 25,
+        keep: int = 20,
+    ):
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.out_dir = out_dir
+        self.top = top
+        self.captured: Deque[Tuple[str, float, str]] = deque(maxlen=keep)
+        # cProfile はプロセス内で同時に 1 つしか有効にできない
+        self._busy = threading.Lock()
+
+    def start(self):
+        import cProfile
+        import random
+
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # 他のプロファイラが動いている
+            self._busy.release()
+            return None
+        return prof
+
+    def stop(self, prof, name: str, duration_ms: float) -> Optional[str]:
+        import io
+        import pstats
+
+        prof.disable()
+        self._busy.release()
+        if duration_ms < self.threshold_ms:
+            return None
+
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(self.top)
+        text = buf.getvalue()
+        self.captured.append((name, duration_ms, text))
+        if self.out_dir is not None:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            prof.dump_stats(os.path.join(self.out_dir, f"{stamp}_{name}_{duration_ms:.0f}ms.prof"))
+        return text
+
+
+# ------------------------------------------------------------
+# トレーサー
+# ------------------------------------------------------------
+# 実行中のトレース（スパン記録のリスト）と現在の深さ
+_current: contextvars.ContextVar[Optional[Tuple[List[SpanRecord], int, float]]] = (
+    contextvars.ContextVar("alloy_rag_trace", default=None)
+)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "_t0", "_token", "_root", "_prof")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        state = _current.get()
+        self._root = state is None
+        self._prof = None
+        if self._root:
+            state = ([], 0, time.perf_counter())
+            if self.tracer.profiler is not None:
+                self._prof = self.tracer.profiler.start()
+        records, depth, origin = state
+        self._token = _current.set((records, depth + 1, origin))
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter()
+        records, depth, origin = _current.get()
+        _current.reset(self._token)
+        ms = (t1 - self._t0) * 1000.0
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        records.append(
+            SpanRecord(self.name, depth - 1, (self._t0 - origin) * 1000.0, ms, self.attrs)
+        )
+        self.tracer.observe(self.name, ms)
+
+        if self._root:
+            profile = None
+            if self._prof is not None:
+                profile = self.tracer.profiler.stop(self._prof, self.name, ms)
+            self.tracer.export(Trace(self.name, ms, self.attrs, records, profile))
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.profiler: Optional[SampledProfiler] = None
+        self.exporters: List[Callable[[Trace], None]] = []
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------------
+    # スパン
+    # --------------------------------------------------------
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attrs)
+
+    def traced(self, name: str):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, name, {}):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    # --------------------------------------------------------
+    # 集計・エクスポート
+    # --------------------------------------------------------
+    def observe(self, name: str, ms: float):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(ms)
+
+    def add_exporter(self, exporter: Callable[[Trace], None]):
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter: Callable[[Trace], None]):
+        if exporter in self.exporters:
+            self.exporters.remove(exporter)
+
+    def export(self, trace: Trace):
+        for exporter in list(self.exporters):
+            try:
+                exporter(trace)
+            except Exception:  # エクスポーターの失敗で検索を止めない
+                logger.exception("トレースのエクスポートに失敗しました")
+
+    def histograms(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: h.snapshot() for name, h in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# ------------------------------------------------------------
+# 書き出し（Prometheus テキスト / JSON）
+# ------------------------------------------------------------
+def _labels(**labels: str) -> str:
+    body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels.items())
+    return "{" + body + "}" if body else ""
+
+
+def render_prometheus(
+    tracer: Optional["Tracer"] = None, gauges: Optional[Dict[str, float]] = None
+) -> str:
+    tracer = tracer or TRACER
+    lines = [
+        "# HELP alloy_rag_span_duration_seconds Duration of traced spans.",
+        "# TYPE alloy_rag_span_duration_seconds histogram",
+    ]
+    for name, snap in tracer.histograms().items():
+        cumulative = 0
+        for le, count in snap["buckets"].items():
+            cumulative += count
+            le_s = le if le == "+Inf" else repr(float(le) / 1000.0)
+            lines.append(
+                f"alloy_rag_span_duration_seconds_bucket{_labels(span=name, le=le_s)} {cumulative}"
+            )
+        lines.append(f"alloy_rag_span_duration_seconds_sum{_labels(span=name)} {snap['sum_ms'] / 1000.0}")
+        lines.append(f"alloy_rag_span_duration_seconds_count{_labels(span=name)} {snap['count']}")
+    for name, value in (gauges or {}).items():
+        metric = f"alloy_rag_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def render_json(tracer: Optional["Tracer"] = None, gauges: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    tracer = tracer or TRACER
+    return {"spans": tracer.histograms(), "gauges": dict(gauges or {})}
+
+
+# ------------------------------------------------------------
+# ローカルのメトリクス HTTP サーバー（Streamlit プロセス用）
+# ------------------------------------------------------------
+_server_lock = threading.Lock()
+_server = None
+
+
+def serve_metrics(port: int, gauges: Optional[Callable[[], Dict[str, float]]] = None):
+    # GET /metrics（Prometheus テキスト）と GET /metrics.json を返すデーモンスレッド。
+    # 同じプロセスで 2 回呼んでも 1 つだけ起動する
+    global _server
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            extra = gauges() if gauges else {}
+            if self.path.startswith("/metrics.json"):
+                body = json.dumps(render_json(gauges=extra), ensure_ascii=False).encode("utf-8")
+                ctype = "application/json; charset=utf-8"
+            elif self.path.startswith("/metrics"):
+                body = render_prometheus(gauges=extra).encode("utf-8")
+                ctype = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("content-type", ctype)
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logger.info("メトリクスを http://127.0.0.1:%d/metrics で公開しています", port)
+    return _server
+
+
+# ------------------------------------------------------------
+# プロセス共通のトレーサー（環境変数で設定）
+# ------------------------------------------------------------
+def _from_env() -> Tracer:
+    tracer = Tracer(enabled=os.environ.get("ALLOY_RAG_TRACING", "1") != "0")
+    log_ms = os.environ.get("ALLOY_RAG_TRACE_LOG_MS")
+    if log_ms:
+        tracer.add_exporter(LogExporter(float(log_ms)))
+    sample = float(os.environ.get("ALLOY_RAG_PROFILE_SAMPLE", "0") or 0)
+    if sample > 0:
+        tracer.profiler = SampledProfiler(
+            sample,
+            float(os.environ.get("ALLOY_RAG_PROFILE_THRESHOLD_MS", "200")),
+            os.environ.get("ALLOY_RAG_PROFILE_DIR") or None,
+        )
+    return tracer
+
+
+TRACER = _from_env()
+span = TRACER.span
+traced = TRACER.traced
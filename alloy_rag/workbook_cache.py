@@ -0,0 +1,599 @@
+# ------------------------------------------------------------
+# Excel ワークブックの一括読み込み & 列指向スナップショット
+# ------------------------------------------------------------
+# - openpyxl でのパースはワークブック 1 回につき 1 度だけ行う
+# - パース結果はソースの内容ハッシュ（SHA-256）をキーにした
+#   列指向スナップショット（NumPy .npy + manifest.json）として
+#   ソースの隣に保存し、次回以降は memory-map で読み込む
+# - シート単位のハッシュも保存し、ワークブックが編集された場合は
+#   内容の変わったシートだけを再パースする（他は前回の結果を再利用）
+# - アップロード（WorkbookBuffer）はディスクに書かずメモリ上でパースする。
+#   パースは共有のプロセスプール（同時実行数に上限）で行い、UI・API のスレッドを止めない
+# ------------------------------------------------------------
+
+import datetime
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from .hashing import WorkbookBuffer, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# パース用プロセスの数（0 は CPU 数。上限を超えたパースは順番待ち）
+PARSE_WORKERS = int(os.environ.get("ALLOY_RAG_LOAD_WORKERS", "0")) or (os.cpu_count() or 1)
+
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_SUFFIX = ".snapshot"
+MANIFEST_NAME = "manifest.json"
+
+# object 列のセル種別（kinds 配列に保存する値）
+_KIND_MISSING = 0
+_KIND_STR = 1
+_KIND_INT = 2
+_KIND_FLOAT = 3
+_KIND_BOOL = 4
+_KIND_TIMESTAMP = 5
+# openpyxl・object 列の datetime / date / time（pd.Timestamp にせず元の型で戻す）
+_KIND_DATETIME = 6
+_KIND_DATE = 7
+_KIND_TIME = 8
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# 共有文字列セル: <c r="A1" t="s"><v>12</v></c>（タグと番号を分けて取り出す）
+_SHARED_CELL_RE = re.compile(rb'(<c\b[^>]*\bt="s"[^>]*>)\s*<v>(\d+)</v>')
+
+
+# ------------------------------------------------------------
+# スナップショットの置き場所
+# ------------------------------------------------------------
+def snapshot_root(excel_path: str) -> Path:
+    p = Path(excel_path)
+    if p.is_dir():
+        # 複数ワークブックのディレクトリ（フェデレーション）はその中に置く
+        return p / SNAPSHOT_SUFFIX
+    return p.with_name(p.name + SNAPSHOT_SUFFIX)
+
+
+def snapshot_dir(excel_path: str, content_hash: str) -> Path:
+    return snapshot_root(excel_path) / content_hash[:16]
+
+
+# ------------------------------------------------------------
+# シート単位の内容ハッシュ（.xlsx の zip 内 XML から直接求める）
+# ------------------------------------------------------------
+# - openpyxl でのパースより桁違いに速く、編集されたシートの判定に使う
+def _shared_strings(zf: zipfile.ZipFile) -> List[bytes]:
+    try:
+        raw = zf.read("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    out = []
+    for si in ElementTree.fromstring(raw).iter(f"{_NS_MAIN}si"):
+        # ふりがな（rPh）は pandas の読み込み結果に含まれないので除く
+        parts = []
+        for child in si:
+            if child.tag == f"{_NS_MAIN}t":
+                parts.append(child.text or "")
+            elif child.tag == f"{_NS_MAIN}r":
+                parts.extend(t.text or "" for t in child.iter(f"{_NS_MAIN}t"))
+        out.append("".join(parts).encode("utf-8"))
+    return out
+
+
+def _sheet_paths(zf: zipfile.ZipFile) -> Dict[str, str]:
+    rels = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {
+        r.get("Id"): r.get("Target") for r in rels.iter(f"{_NS_PKG_REL}Relationship")
+    }
+    workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+    paths: Dict[str, str] = {}
+    for sheet in workbook.iter(f"{_NS_MAIN}sheet"):
+        target = targets.get(sheet.get(f"{_NS_REL}id"), "")
+        if target.startswith("/"):
+            path = target.lstrip("/")
+        else:
+            path = posixpath.normpath(posixpath.join("xl", target))
+        paths[sheet.get("name")] = path
+    return paths
+
+
+def sheet_hashes(source: Union[str, BinaryIO]) -> Optional[Dict[str, str]]:
+    # .xls など zip でない形式は None（呼び出し側は全体を再パースする）
+    try:
+        zf = zipfile.ZipFile(source)
+    except (zipfile.BadZipFile, OSError):
+        return None
+
+    with zf:
+        try:
+            strings = _shared_strings(zf)
+            paths = _sheet_paths(zf)
+        except (KeyError, ElementTree.ParseError):
+            return None
+
+        out: Dict[str, str] = {}
+        for name, path in paths.items():
+            try:
+                raw = zf.read(path)
+            except KeyError:
+                return None
+            # pandas が読むのはセル本体（<sheetData>）だけなので、その範囲だけをハッシュする
+            # （選択セル・表示設定・<dimension> などは保存のたびに変わり得る）
+            start = raw.find(b"<sheetData")
+            end = raw.rfind(b"</sheetData>")
+            if 0 <= start < end:
+                raw = raw[start:end]
+            # 共有文字列の番号は他シートの編集でずれるため、文字列そのものに置き換えてハッシュ
+            parts = _SHARED_CELL_RE.split(raw)
+            for i in range(2, len(parts), 3):
+                n = int(parts[i])
+                parts[i] = strings[n] if n < len(strings) else parts[i]
+            h = hashlib.sha256()
+            for p in parts:
+                h.update(len(p).to_bytes(8, "little"))
+                h.update(p)
+            out[name] = h.hexdigest()
+        return out
+
+
+# ------------------------------------------------------------
+# Excel パース（全シート、または指定シートだけを 1 回で）
+# ------------------------------------------------------------
+def parse_excel(
+    excel_path: str, sheets: Optional[List[str]] = None
+) -> Dict[str, pd.DataFrame]:
+    # sheet_name=None で全シートを 1 回のワークブック読み込みで取得する
+    frames = pd.read_excel(excel_path, sheet_name=sheets, engine="openpyxl")
+    for df in frames.values():
+        df.columns = df.columns.str.strip()
+    return frames
+
+
+def parse_buffer(data: bytes, sheets: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    return parse_excel(io.BytesIO(data), sheets)
+
+
+def parse_sheets(excel_path: Union[str, BinaryIO], names: List[str]) -> Dict[str, pd.DataFrame]:
+    # 指定したシートだけをパースする（存在しないシートは無視）
+    # 起動直後に小さなシートだけを先に読むために使う
+    with pd.ExcelFile(excel_path, engine="openpyxl") as xl:
+        frames = {name: xl.parse(name) for name in names if name in xl.sheet_names}
+    for df in frames.values():
+        df.columns = df.columns.str.strip()
+    return frames
+
+
+# ------------------------------------------------------------
+# パース用のプロセスプール（プロセス内で 1 つを共有）
+# ------------------------------------------------------------
+# - openpyxl のパースは GIL を握ったままなので、スレッドではなく別プロセスで行う
+# - 読み込みスレッドから起動されるので fork ではなく spawn（ロックを引き継がない）
+# - プールが使えない場合（起動失敗・ワーカーの異常終了）は呼び出し元のスレッドで実行する
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _parse_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = ProcessPoolExecutor(
+                    PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, ValueError) as e:
+                logger.warning("パース用プロセスを起動できません（スレッド内でパースします）: %s", e)
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def map_in_pool(fn: Callable, *iterables: Sequence) -> List:
+    # fn はモジュール直下の関数（spawn したプロセスへ pickle で渡す）
+    pool = _parse_pool()
+    if pool is not None:
+        try:
+            return list(pool.map(fn, *iterables))
+        except BrokenProcessPool as e:
+            logger.warning("パース用プロセスが異常終了しました（スレッド内でパースします）: %s", e)
+            _discard_pool(pool)
+    return list(map(fn, *iterables))
+
+
+# ------------------------------------------------------------
+# スカラー値 <-> (種別, 文字列) 変換
+# ------------------------------------------------------------
+def _encode_scalar(v) -> Tuple[int, str]:
+    if v is None:
+        return _KIND_MISSING, ""
+    if isinstance(v, (bool, np.bool_)):
+        return _KIND_BOOL, "1" if v else "0"
+    if isinstance(v, (int, np.integer)):
+        return _KIND_INT, str(int(v))
+    if isinstance(v, (float, np.floating)):
+        if np.isnan(v):
+            return _KIND_MISSING, ""
+        return _KIND_FLOAT, repr(float(v))
+    if isinstance(v, pd.Timestamp):
+        return _KIND_TIMESTAMP, v.isoformat()
+    # datetime は date のサブクラスなので先に判定する
+    if isinstance(v, datetime.datetime):
+        return _KIND_DATETIME, v.isoformat()
+    if isinstance(v, datetime.date):
+        return _KIND_DATE, v.isoformat()
+    if isinstance(v, datetime.time):
+        return _KIND_TIME, v.isoformat()
+    if v is pd.NaT or v is pd.NA:
+        return _KIND_MISSING, ""
+    return _KIND_STR, str(v)
+
+
+def _decode_scalar(kind: int, text: str):
+    if kind == _KIND_STR:
+        return text
+    if kind == _KIND_INT:
+        return int(text)
+    if kind == _KIND_FLOAT:
+        return float(text)
+    if kind == _KIND_BOOL:
+        return text == "1"
+    if kind == _KIND_TIMESTAMP:
+        return pd.Timestamp(text)
+    if kind == _KIND_DATETIME:
+        return datetime.datetime.fromisoformat(text)
+    if kind == _KIND_DATE:
+        return datetime.date.fromisoformat(text)
+    if kind == _KIND_TIME:
+        return datetime.time.fromisoformat(text)
+    return np.nan
+
+
+# ------------------------------------------------------------
+# 列のエンコード（数値列はそのまま / それ以外は UTF-8 バッファ + オフセット）
+# ------------------------------------------------------------
+def _is_native_column(s: pd.Series) -> bool:
+    return s.dtype.kind in "biufM" and isinstance(s.dtype, np.dtype)
+
+
+def _write_column(base: Path, s: pd.Series) -> Dict:
+    if _is_native_column(s):
+        np.save(base.with_suffix(".values.npy"), s.to_numpy())
+        return {"encoding": "native", "dtype": str(s.dtype)}
+
+    kinds = np.empty(len(s), dtype=np.int8)
+    chunks: List[bytes] = []
+    offsets = np.zeros(len(s) + 1, dtype=np.int64)
+    pos = 0
+    for i, v in enumerate(s.tolist()):
+        kind, text = _encode_scalar(v)
+        b = text.encode("utf-8")
+        kinds[i] = kind
+        chunks.append(b)
+        pos += len(b)
+        offsets[i + 1] = pos
+
+    np.save(base.with_suffix(".kinds.npy"), kinds)
+    np.save(base.with_suffix(".offsets.npy"), offsets)
+    np.save(
+        base.with_suffix(".data.npy"),
+        np.frombuffer(b"".join(chunks), dtype=np.uint8),
+    )
+    return {"encoding": "text", "dtype": str(s.dtype)}
+
+
+def _read_column(base: Path, meta: Dict, nrows: int) -> pd.Series:
+    if meta["encoding"] == "native":
+        values = np.load(base.with_suffix(".values.npy"), mmap_mode="r")
+        # memmap サブクラスではなく通常の ndarray ビューとして保持（コピーなし）
+        return pd.Series(values.view(np.ndarray), copy=False)
+
+    kinds = np.load(base.with_suffix(".kinds.npy"), mmap_mode="r")
+    offsets = np.load(base.with_suffix(".offsets.npy"), mmap_mode="r")
+    data = np.load(base.with_suffix(".data.npy"), mmap_mode="r")
+    raw = data.tobytes()
+
+    values = np.empty(nrows, dtype=object)
+    for i in range(nrows):
+        text = raw[offsets[i] : offsets[i + 1]].decode("utf-8")
+        values[i] = _decode_scalar(int(kinds[i]), text)
+
+    s = pd.Series(values, dtype=object)
+    if meta["dtype"] != "object":
+        s = s.astype(meta["dtype"])
+    return s
+
+
+# ------------------------------------------------------------
+# スナップショットの書き込み / 読み込み
+# ------------------------------------------------------------
+def write_snapshot(
+    excel_path: str,
+    content_hash: str,
+    frames: Dict[str, pd.DataFrame],
+    hashes: Optional[Dict[str, str]] = None,
+) -> Path:
+    root = snapshot_root(excel_path)
+    root.mkdir(parents=True, exist_ok=True)
+    target = snapshot_dir(excel_path, content_hash)
+
+    # 旧スナップショットにハッシュの一致するシートがあれば、列ファイルをリンクして再利用
+    # （編集されたシートだけをエンコードし直す）
+    donors: Dict[str, Tuple[Path, Dict]] = {}
+    if hashes:
+        for old, manifest in _previous_manifests(root, target):
+            for sheet in manifest["sheets"]:
+                h = sheet.get("sha256")
+                if h and h not in donors:
+                    donors[h] = (old, sheet)
+
+    # 一時ディレクトリに書き出してから rename（途中で落ちても壊れない）
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=root))
+    try:
+        sheets = []
+        for si, (sheet, df) in enumerate(frames.items()):
+            prefix = f"s{si}"
+            h = (hashes or {}).get(sheet)
+            columns = None
+            if h in donors:
+                columns = _link_sheet(donors[h], tmp, prefix, len(df))
+            if columns is None:
+                columns = []
+                for ci, col in enumerate(df.columns):
+                    meta = _write_column(tmp / f"{prefix}_c{ci}", df.iloc[:, ci])
+                    meta["name"] = list(_encode_scalar(col))
+                    columns.append(meta)
+            sheets.append(
+                {
+                    "name": sheet,
+                    "prefix": prefix,
+                    "nrows": len(df),
+                    "sha256": h,
+                    "columns": columns,
+                }
+            )
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "source": Path(excel_path).name,
+            "sha256": content_hash,
+            "sheets": sheets,
+        }
+        with open(tmp / MANIFEST_NAME, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # 同じソースの古いスナップショットは削除
+    for old in root.iterdir():
+        if old != target and not old.name.startswith(".tmp-"):
+            shutil.rmtree(old, ignore_errors=True)
+
+    return target
+
+
+def _read_manifest(target: Path) -> Optional[Dict]:
+    manifest_path = target / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return manifest
+
+
+def _previous_manifests(root: Path, current: Path) -> List[Tuple[Path, Dict]]:
+    # 同じソースの旧スナップショット（新しい順）
+    candidates = [
+        d for d in root.iterdir() if d != current and not d.name.startswith(".tmp-")
+    ]
+    out = []
+    for target in sorted(candidates, key=lambda d: d.stat().st_mtime, reverse=True):
+        manifest = _read_manifest(target)
+        if manifest is not None:
+            out.append((target, manifest))
+    return out
+
+
+def _link_sheet(
+    donor: Tuple[Path, Dict], tmp: Path, prefix: str, nrows: int
+) -> Optional[List[Dict]]:
+    # 旧スナップショットのシートの列ファイルを新しい番号でハードリンク（できなければコピー）
+    # 行数が合わない・ファイルが欠けているなどの場合は None（呼び出し側でエンコードし直す）
+    old, sheet = donor
+    if sheet.get("nrows") != nrows:
+        return None
+    old_prefix = sheet["prefix"] + "_"
+    try:
+        for src in old.iterdir():
+            if not src.name.startswith(old_prefix):
+                continue
+            dst = tmp / (prefix + "_" + src.name[len(old_prefix) :])
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+    except OSError as e:
+        logger.warning("旧スナップショットの列を再利用できませんでした: %s", e)
+        for dst in tmp.glob(prefix + "_*"):
+            dst.unlink()
+        return None
+    return sheet["columns"]
+
+
+def _read_sheet(target: Path, sheet: Dict) -> pd.DataFrame:
+    nrows = sheet["nrows"]
+    cols = {}
+    names = []
+    for ci, meta in enumerate(sheet["columns"]):
+        cols[ci] = _read_column(target / f"{sheet['prefix']}_c{ci}", meta, nrows)
+        names.append(_decode_scalar(*meta["name"]))
+    df = pd.DataFrame(cols, index=pd.RangeIndex(nrows), copy=False)
+    df.columns = pd.Index(names)
+    return df
+
+
+def has_snapshot(excel_path: str, content_hash: str) -> bool:
+    manifest = _read_manifest(snapshot_dir(excel_path, content_hash))
+    return manifest is not None and manifest.get("sha256") == content_hash
+
+
+def read_snapshot(
+    excel_path: str, content_hash: str
+) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, str]]]:
+    target = snapshot_dir(excel_path, content_hash)
+    manifest = _read_manifest(target)
+    if manifest is None or manifest.get("sha256") != content_hash:
+        return None
+
+    frames: Dict[str, pd.DataFrame] = {}
+    hashes: Dict[str, str] = {}
+    for sheet in manifest["sheets"]:
+        frames[sheet["name"]] = _read_sheet(target, sheet)
+        if sheet.get("sha256"):
+            hashes[sheet["name"]] = sheet["sha256"]
+    return frames, hashes
+
+
+def _reusable_from_snapshots(
+    excel_path: str, content_hash: str, hashes: Dict[str, str], wanted: Set[str]
+) -> Dict[str, pd.DataFrame]:
+    # 同じソースの旧スナップショット（編集前の版）から、ハッシュが一致するシートだけ読む
+    root = snapshot_root(excel_path)
+    if not root.is_dir():
+        return {}
+    out: Dict[str, pd.DataFrame] = {}
+    for target, manifest in _previous_manifests(root, snapshot_dir(excel_path, content_hash)):
+        for sheet in manifest["sheets"]:
+            name = sheet["name"]
+            if name in wanted and name not in out and sheet.get("sha256") == hashes[name]:
+                out[name] = _read_sheet(target, sheet)
+    return out
+
+
+# ------------------------------------------------------------
+# 差分再インデックス用：旧シート番号 -> 新シート番号
+# ------------------------------------------------------------
+def remap_sheet_ids(
+    old_sheets: List[str], new_sheets: List[str], touched: Set[str]
+) -> np.ndarray:
+    # 変更・削除されたシートは -1（そのシート由来のエントリは作り直す）
+    new_pos = {name: i for i, name in enumerate(new_sheets)}
+    out = np.full(len(old_sheets), -1, dtype=np.int64)
+    for i, name in enumerate(old_sheets):
+        if name not in touched and name in new_pos:
+            out[i] = new_pos[name]
+    return out
+
+
+# ------------------------------------------------------------
+# 公開 API：スナップショットがあれば使い、なければパースして保存
+# ------------------------------------------------------------
+def _reuse_previous(
+    hashes: Dict[str, str],
+    previous: Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, str]]],
+) -> Dict[str, pd.DataFrame]:
+    # 編集前の版とハッシュが一致するシートはパースせずにそのまま使う
+    if not hashes or previous is None:
+        return {}
+    prev_frames, prev_hashes = previous
+    return {
+        name: prev_frames[name]
+        for name, h in hashes.items()
+        if prev_hashes.get(name) == h and name in prev_frames
+    }
+
+
+def read_workbook(
+    excel_path: str,
+    use_snapshot: bool = True,
+    previous: Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, str]]] = None,
+) -> Tuple[Dict[str, pd.DataFrame], str, Dict[str, str]]:
+    # previous: 編集前の (frames, シートハッシュ)。一致するシートはパースせず再利用する
+    content_hash = file_sha256(excel_path)
+
+    if use_snapshot:
+        try:
+            loaded = read_snapshot(excel_path, content_hash)
+            if loaded is not None:
+                return loaded[0], content_hash, loaded[1]
+        except Exception as e:
+            logger.warning("スナップショット読み込みに失敗しました（再パースします）: %s", e)
+
+    hashes = sheet_hashes(excel_path) or {}
+    reused = _reuse_previous(hashes, previous)
+    if hashes and use_snapshot and len(reused) < len(hashes):
+        try:
+            reused.update(
+                _reusable_from_snapshots(
+                    excel_path, content_hash, hashes, set(hashes) - set(reused)
+                )
+            )
+        except Exception as e:
+            logger.warning("旧スナップショットを再利用できませんでした: %s", e)
+
+    if reused:
+        changed = [name for name in hashes if name not in reused]
+        logger.info("変更されたシートのみ再パースします: %s", changed)
+        parsed = parse_excel(excel_path, changed) if changed else {}
+        frames = {name: reused[name] if name in reused else parsed[name] for name in hashes}
+    else:
+        frames = parse_excel(excel_path)
+
+    if use_snapshot:
+        try:
+            write_snapshot(excel_path, content_hash, frames, hashes)
+        except OSError as e:
+            # 読み取り専用ディレクトリなどではスナップショットなしで続行
+            logger.warning("スナップショットを保存できませんでした: %s", e)
+
+    return frames, content_hash, hashes
+
+
+def read_workbook_buffer(
+    buffer: WorkbookBuffer,
+    previous: Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, str]]] = None,
+) -> Tuple[Dict[str, pd.DataFrame], str, Dict[str, str]]:
+    # アップロード：メモリ上のバイト列からパースする（一時ファイル・スナップショットは作らない）
+    hashes = sheet_hashes(io.BytesIO(buffer.data)) or {}
+    reused = _reuse_previous(hashes, previous)
+    changed = [name for name in hashes if name not in reused]
+    if reused:
+        logger.info("変更されたシートのみ再パースします: %s", changed)
+        parsed = map_in_pool(parse_buffer, [buffer.data], [changed])[0] if changed else {}
+        frames = {name: reused[name] if name in reused else parsed[name] for name in hashes}
+    else:
+        frames = map_in_pool(parse_buffer, [buffer.data])[0]
+    return frames, buffer.sha256, hashes
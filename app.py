@@ -3,29 +3,24 @@
 # ------------------------------------------------------------
 
 import streamlit as st
-import pandas as pd
-import re
-from typing import Dict, List, Optional
+import os
 from pathlib import Path
+from typing import TYPE_CHECKING, List
 
-# GitHub に置くデフォルトデータのパス
-DEFAULT_DATA_PATH = Path(__file__).parent / "data" / "temp_data.xlsx"
+# エンジン（pandas / numpy）は初回のナレッジベース構築時に読み込む
+from alloy_rag import DEFAULT_DATA_PATH
+from alloy_rag.hashing import WorkbookBuffer, combined_sha256, file_sha256
+from alloy_rag.kb_registry import KnowledgeBaseRegistry
+from alloy_rag.response_cache import ResponseCache
+from alloy_rag.tracing import TRACER, RecentTraces, serve_metrics, span
 
-# ------------------------------------------------------------
-# ページ設定
-# ------------------------------------------------------------
-st.set_page_config(
-    page_title="アルミニウム合金 RAG ChatBot",
-    page_icon="🔧",
-    layout="wide",
-    initial_sidebar_state="expanded",
-)
+if TYPE_CHECKING:
+    from alloy_rag.engine import AluminumAlloyRAG
 
 # ------------------------------------------------------------
 # CSS デザイン
 # ------------------------------------------------------------
-st.markdown(
-    """
+PAGE_CSS = """
 <style>
     .main { background-color: #f8f9fa; }
     .stChatMessage {
@@ -47,467 +42,276 @@ st.markdown(
         color: #1976D2;
     }
 </style>
-""",
-    unsafe_allow_html=True,
-)
+"""
+
 
 # ------------------------------------------------------------
-# RAG クラス
+# ページ設定（import 時ではなく main() の先頭で実行）
 # ------------------------------------------------------------
+def setup_page():
+    st.set_page_config(
+        page_title="アルミニウム合金 RAG ChatBot",
+        page_icon="🔧",
+        layout="wide",
+        initial_sidebar_state="expanded",
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 
-class AluminumAlloyRAG:
-    def __init__(self, excel_path: str):
-        self.data: Dict[str, pd.DataFrame] = {}
-        self.series_info: Dict[int, Dict[str, str]] = {}
-        self.all_alloys: Dict[str, List[Dict]] = {}
-        self.mechanical_table: Optional[pd.DataFrame] = None
-        # 実際の中身は List[Dict[str,str]] なのでコメントだけ補足
-        self.heat_treatment_dict: Dict[str, List[Dict[str, str]]] = {}
-
-        # 調質の概要（簡易説明）
-        self.temper_descriptions = {
-            "T6": "溶体化処理後、人工時効硬化処理を施したもの。",
-            "T651": "T6に加え、残留応力除去のため引張処理。",
-            "T3": "溶体化→冷間加工→自然時効。",
-            "T4": "溶体化→自然時効。",
-            "T5": "高温加工後に人工時効硬化。",
-            "O": "焼なまし材で最も柔らかい。",
-            "H12": "1/4硬化",
-            "H14": "1/2硬化",
-            "H16": "3/4硬化",
-            "H18": "完全硬化",
-        }
+# ------------------------------------------------------------
+# プロセス共有のナレッジベース（全セッションで 1 つ）
+# ------------------------------------------------------------
+def load_knowledge_base(excel_path, base=None):
+    from alloy_rag.engine import AluminumAlloyRAG
+
+    # 索引はバックグラウンドで構築し、できたものから順に使えるようにする
+    return AluminumAlloyRAG(excel_path, base=base, background=True)
+
+
+@st.cache_resource
+def get_registry() -> KnowledgeBaseRegistry:
+    # 破棄されたワークブックの応答・結果レコードをメモリから破棄
+    # （ディスク層は内容ハッシュのキーで、読み直した時にも有効なので残す。TTL で期限切れ）
+    def evict(workbook_hash: str):
+        get_response_cache().invalidate(workbook_hash, disk=False)
+        get_result_cache().invalidate(workbook_hash)
+
+    return KnowledgeBaseRegistry(load_knowledge_base, on_evict=evict)
+
+
+# ------------------------------------------------------------
+# 応答キャッシュ（ワークブックの内容ハッシュ + クエリ）
+# ------------------------------------------------------------
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    ttl = os.environ.get("ALLOY_RAG_CACHE_TTL", "3600")
+    return ResponseCache(
+        max_entries=int(os.environ.get("ALLOY_RAG_CACHE_SIZE", "1024")),
+        ttl=float(ttl) if ttl else None,
+        disk_path=os.environ.get("ALLOY_RAG_CACHE_DB") or None,
+    )
 
-        # 曖昧検索用・同義語辞書
-        self.semantic_dict = {
-            "8000系": ["8000", "al-li", "アルミリチウム", "aluminum lithium", "al li"],
-            "7000系": ["超高強度", "航空機", "7075", "7050"],
-            "6000系": ["汎用", "押出", "6061", "6063"],
-            "1000系": ["純アルミ", "純アルミニウム"],
-            "軽量": ["軽い", "低密度", "軽量化"],
-            "高強度": ["強い", "高強度", "引張"],
-            "耐食": ["耐食", "耐食性", "腐食"],
-            "溶接": ["溶接", "溶接性"],
-            "切削": ["切削", "加工しやすい"],
-            "航空": ["航空", "宇宙", "ロケット", "機体"],
-            "構造材": ["構造", "フレーム", "骨組み"],
+
+@st.cache_resource
+def get_result_cache() -> ResponseCache:
+    # 応答と同じキーで結果レコード（行番号の配列など数 KB）を保持する（メモリ層のみ）
+    # → キャッシュ済みの回答でも、検索し直さずに会話の文脈を更新できる
+    ttl = os.environ.get("ALLOY_RAG_CACHE_TTL", "3600")
+    return ResponseCache(
+        max_entries=int(os.environ.get("ALLOY_RAG_CACHE_SIZE", "1024")),
+        ttl=float(ttl) if ttl else None,
+    )
+
+
+# ------------------------------------------------------------
+# 回答の逐次表示とページ分割
+# ------------------------------------------------------------
+# 1 ページに表示する行数（合金の出現箇所・検索結果など）
+PAGE_SIZE = int(os.environ.get("ALLOY_RAG_PAGE_SIZE", "20"))
+# 毎回描画する直近のメッセージ数（それより前は折りたたむ）
+HISTORY_WINDOW = int(os.environ.get("ALLOY_RAG_HISTORY_WINDOW", "20"))
+
+
+def get_conversation():
+    # セッションごとの会話の文脈（「その耐力は？」などの追質問の解決に使う）
+    from alloy_rag.conversation import ConversationContext
+
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = ConversationContext()
+    return st.session_state.conversation
+
+
+def stream_answer(rag: "AluminumAlloyRAG", q: str) -> dict:
+    # 回答を Markdown の断片ごとに表示し、履歴に積むメッセージを返す
+    # - 振り分けは 1 回だけ。キャッシュを先に引き、当たれば検索も整形もしない
+    #   （会話の文脈はキャッシュした結果レコードから更新する。追質問は文脈ごとに別キー）
+    # - PAGE_SIZE 件を超える結果は 1 ページ目だけを描画し、結果レコード
+    #   （行番号の配列のみ）を履歴に残して残りのページは必要になった時に描画する
+    from alloy_rag.renderers import iter_markdown
+    from alloy_rag.results import LoadingResult, paged_length, paginate
+
+    cache = get_response_cache()
+    results = get_result_cache()
+    context = get_conversation()
+    with span("app.answer"):
+        routed = rag.router.route(q)
+        key = rag.cache_key(q, context, routed)
+        cached = cache.get(rag.source_hash, key) if rag.source_hash else None
+        if cached is not None:
+            result = results.get(rag.source_hash, key)
+            if result is not None:
+                context.remember(result, rag)
+            else:
+                # ディスク層にだけ残っていた回答：文脈の更新のために検索だけ行う
+                results.put(rag.source_hash, key, rag.query(q, context, routed))
+            st.markdown(cached)
+            return {"role": "assistant", "content": cached}
+
+        result = rag.query(q, context, routed)
+        if paged_length(result) <= PAGE_SIZE:
+            text = st.write_stream(iter_markdown(result, rag))
+            # 読み込み中の案内はキャッシュしない
+            if rag.source_hash and not isinstance(result, LoadingResult):
+                cache.put(rag.source_hash, key, text)
+                results.put(rag.source_hash, key, result)
+            return {"role": "assistant", "content": text}
+
+        text = st.write_stream(iter_markdown(paginate(result, 0, PAGE_SIZE), rag))
+        return {
+            "role": "assistant",
+            "content": text,
+            "result": result,
+            "workbook": rag.source_hash,
         }
 
-        # データ読み込み
-        self.load_data(excel_path)
-        self.parse_all_sheets()
-        self.build_indexes()
-
-    # --------------------------------------------------------
-    # 安全な合金名フォーマット
-    # --------------------------------------------------------
-    def safe_alloy_format(self, alloy_value, temper) -> str:
-        s = str(alloy_value)
-        nums = re.findall(r"\d+", s)
-        if nums:
-            n = int(nums[0])
-            return f"A{n:04d}-{temper}"
-        return f"{s}-{temper}"
-
-    # --------------------------------------------------------
-    # Excel 読み込み
-    # --------------------------------------------------------
-    def load_data(self, excel_path: str):
-        try:
-            xls = pd.ExcelFile(excel_path, engine="openpyxl")
-            for sheet in xls.sheet_names:
-                df = pd.read_excel(excel_path, sheet_name=sheet, engine="openpyxl")
-                df.columns = df.columns.str.strip()
-                self.data[sheet] = df
-        except Exception as e:
-            st.error(f"❌ ファイル読み込みエラー: {e}")
-
-    # --------------------------------------------------------
-    # 全シート走査して合金名インデックス作成
-    # --------------------------------------------------------
-    def parse_all_sheets(self):
-        for sheet, df in self.data.items():
-            for col in df.columns:
-                if any(k in str(col).lower() for k in ["合金", "alloy"]):
-                    for _, row in df.iterrows():
-                        name = str(row[col]).strip()
-                        if name and name.lower() != "nan":
-                            self.all_alloys.setdefault(name, []).append(
-                                {"sheet": sheet, "data": row.to_dict()}
-                            )
-
-    # --------------------------------------------------------
-    # 系列情報 & 機械特性テーブル & 熱処理テーブル
-    # --------------------------------------------------------
-    def build_indexes(self):
-        # 機械特性テーブル
-        self.mechanical_table = self.data.get("aluminum_handbook_table")
-
-        # 系列情報
-        series_sheet = self.data.get("アルミニウム合金の特性")
-        if series_sheet is not None:
-            for _, r in series_sheet.iterrows():
-                name = r.get("合金系")
-                if isinstance(name, str) and "系" in name:
-                    m = re.search(r"(\d{4})", name)
-                    if m:
-                        s = int(m.group(1)) // 1000 * 1000
-                        self.series_info[s] = {
-                            "name": name.replace("\n", " "),
-                            "overview": r.get("概要", ""),
-                            "features": r.get(
-                                "代表的な特性（強度、溶接性、耐食性）", ""
-                            ),
-                        }
-
-        # --------------------------------------------------------
-        # 熱処理（調質）ワークシートの読み込み
-        # --------------------------------------------------------
-        heat_sheet = self.data.get("熱処理")
-        if heat_sheet is not None:
-            for _, row in heat_sheet.iterrows():
-                symbol = str(row.get("記号", "")).strip().upper()
-                if not symbol:
-                    continue
-
-                definition = str(row.get("定義", "")).strip()
-                meaning = str(row.get("意味", "")).strip()
-
-                if symbol not in self.heat_treatment_dict:
-                    self.heat_treatment_dict[symbol] = []
-
-                self.heat_treatment_dict[symbol].append(
-                    {
-                        "定義": definition,
-                        "意味": meaning,
-                    }
-                )
 
-    # --------------------------------------------------------
-    # 熱処理情報
-    # --------------------------------------------------------
-    def get_heat_treatment_info(self, symbol: str) -> str:
-        infos = self.heat_treatment_dict.get(symbol.upper())
-        if not infos:
-            return f"❌ 熱処理 {symbol} の情報が見つかりませんでした。"
-
-        res = f"## 🔥 熱処理 {symbol}\n\n"
-
-        for i, info in enumerate(infos, start=1):
-            if info.get("定義"):
-                res += f"### 定義 {i}\n- {info['定義']}\n"
-            if info.get("意味"):
-                res += f"- **意味**：{info['意味']}\n"
-            res += "\n"
-
-        return res
-
-    # --------------------------------------------------------
-    # 熱処理の比較（T6 と T651 など）
-    # --------------------------------------------------------
-    def compare_tempers(self, t1: str, t2: str) -> str:
-        t1 = t1.upper()
-        t2 = t2.upper()
-
-        infos1 = self.heat_treatment_dict.get(t1)
-        infos2 = self.heat_treatment_dict.get(t2)
-
-        if not infos1 or not infos2:
-            return "❌ 比較する熱処理情報が見つかりませんでした。"
-
-        res = f"## 🔥 熱処理 {t1} と {t2} の違い\n\n"
-
-        res += f"### {t1}\n"
-        for info in infos1:
-            if info.get("定義"):
-                res += f"- **定義**：{info['定義']}\n"
-            if info.get("意味"):
-                res += f"- **意味**：{info['意味']}\n"
-
-        res += "\n---\n"
-
-        res += f"### {t2}\n"
-        for info in infos2:
-            if info.get("定義"):
-                res += f"- **定義**：{info['定義']}\n"
-            if info.get("意味"):
-                res += f"- **意味**：{info['意味']}\n"
-
-        return res
-
-    # --------------------------------------------------------
-    # 純アルミ情報
-    # --------------------------------------------------------
-    def get_pure_aluminum_info(self) -> str:
-        resp = "## 🥈 純アルミニウム（1000系）\n\n"
-
-        info = self.series_info.get(1000)
-        if info:
-            resp += f"### {info['name']}\n"
-            if info["overview"]:
-                resp += f"- 概要: {info['overview']}\n"
-            if info["features"]:
-                resp += f"- 特性の要点: {info['features']}\n"
-            resp += "\n"
-
-        if self.mechanical_table is not None:
-            df1000 = self.mechanical_table[self.mechanical_table["系列"] == 1000]
-            if not df1000.empty:
-                resp += "### 代表的な純アルミ合金\n"
-                for _, row in df1000.iterrows():
-                    resp += (
-                        f"- {self.safe_alloy_format(row['Alloy'], row['Temper'])}\n"
-                    )
-
-        return resp
-
-    # --------------------------------------------------------
-    # 引張強さで検索
-    # --------------------------------------------------------
-    def get_alloy_by_strength(self, min_strength: float) -> str:
-        response = f"## 🔍 引張強さ {min_strength} MPa 以上の合金\n\n"
-        results = []
-
-        if self.mechanical_table is None:
-            return response + "データが読み込まれていません。"
-
-        df = self.mechanical_table
-
-        for _, row in df.iterrows():
-            raw_strength = row.get("引張強さ (MPa)", None)
-
-            try:
-                strength = float(raw_strength)
-            except Exception:
-                continue  # 数値でなければスキップ
-
-            if strength >= min_strength:
-                results.append(
-                    {
-                        "alloy": self.safe_alloy_format(
-                            row.get("Alloy", ""), row.get("Temper", "")
-                        ),
-                        "strength": strength,
-                        "series": row.get("系列", ""),
-                        "row": row,
-                    }
-                )
+def render_pages(key: str, m: dict, rag: "AluminumAlloyRAG", streamed: bool = False):
+    # ページ付きの回答（1 ページ目は履歴の content をそのまま使う）
+    from alloy_rag.renderers import render_markdown, to_table
+    from alloy_rag.results import paged_length, paginate
 
-        if not results:
-            return response + "該当する合金が見つかりませんでした。"
-
-        results.sort(key=lambda x: x["strength"], reverse=True)
-
-        for r in results[:10]:
-            response += f"### ✨ {r['alloy']}\n"
-            response += f"- 引張強さ: {r['strength']} MPa\n"
-            for key, val in r["row"].items():
-                if pd.notna(val) and key not in ["Alloy", "Temper", "引張強さ (MPa)"]:
-                    response += f"- **{key}**: {val}\n"
-            response += "\n"
-
-        return response
-
-    # --------------------------------------------------------
-    # 特定合金の詳細表示
-    # --------------------------------------------------------
-    def get_alloy_detailed_info(self, alloy: str) -> str:
-        response = f"## 📋 {alloy.upper()} の詳細\n\n"
-        alloy_clean = alloy.upper().replace("A", "").replace("-", "")
-
-        found = False
-
-        # 機械的特性テーブル
-        if self.mechanical_table is not None:
-            for _, row in self.mechanical_table.iterrows():
-                if str(row["Alloy"]).zfill(4) == alloy_clean[:4]:
-                    found = True
-                    response += "### 📊 機械的性質（aluminum_handbook_table）\n"
-                    response += f"- 合金記号: A{int(row['Alloy']):04d}\n"
-                    response += f"- 調質: {row['Temper']}\n"
-                    response += f"- 引張強さ: {row['引張強さ (MPa)']} MPa\n"
-                    response += f"- 耐力: {row['耐力 (MPa)']} MPa\n"
-                    response += f"- 伸び: {row['伸び (%)']} %\n"
-                    response += f"- 疲れ強さ: {row['疲れ強さ (MPa)']} MPa\n"
-                    response += f"- 強度ランク: {row['強度ランク']}\n"
-                    response += (
-                        f"- 耐食性: {row['耐食性']} / 溶接性: {row['溶接性']} / "
-                        f"切削性: {row['切削性']} / 成形性: {row['成形性']}\n"
-                    )
-                    if pd.notna(row.get("備考", "")):
-                        response += f"- 備考: {row['備考']}\n"
-                    response += "\n"
-                    # 系列の概要
-                    series = row.get("系列", None)
-                    if series in self.series_info:
-                        info = self.series_info[series]
-                        response += f"### 🧾 系列 {series} の概要\n"
-                        response += f"- 系列名: {info['name']}\n"
-                        if info["overview"]:
-                            response += f"- 概要: {info['overview']}\n"
-                        if info["features"]:
-                            response += f"- 特性の要点: {info['features']}\n"
-                        response += "\n"
-                    break
-
-        # 他シートも走査
-        for sheet, df in self.data.items():
-            for _, row in df.iterrows():
-                row_text = " ".join(
-                    [str(v) for v in row.values if pd.notna(v)]
-                ).upper()
-                if alloy_clean in row_text:
-                    found = True
-                    response += f"### 📄 {sheet}\n"
-                    for col, val in row.items():
-                        if pd.notna(val) and str(val).strip() and str(val) != "nan":
-                            response += f"- **{col}**: {val}\n"
-                    response += "\n"
-
-        if not found:
-            response += "⚠️ 該当する合金の詳細情報が見つかりませんでした。\n"
-
-        return response
-
-    # --------------------------------------------------------
-    # 特性ベース検索
-    # --------------------------------------------------------
-    def search_by_properties(self, keywords: List[str]) -> str:
-        response = "## 🔎 検索結果\n\n"
-
-        # 系列レベル
-        series_hit = set()
-        for series, info in self.series_info.items():
-            text = f"{info['name']} {info['overview']} {info['features']}".lower()
-            if all(k.lower() in text for k in keywords):
-                series_hit.add(series)
-
-        # 合金レベル
-        alloy_hit = []
-        if self.mechanical_table is not None:
-            for _, row in self.mechanical_table.iterrows():
-                text = " ".join([str(v) for v in row.values]).lower()
-                if all(k.lower() in text for k in keywords):
-                    alloy_hit.append(row)
-
-        if not series_hit and not alloy_hit:
-            return response + "❌ 該当する合金がありません。"
-
-        for series in sorted(series_hit):
-            info = self.series_info[series]
-            response += f"### {info['name']}\n"
-            if info["overview"]:
-                response += f"- 概要: {info['overview']}\n"
-            if info["features"]:
-                response += f"- 特性の要点: {info['features']}\n"
-
-            if self.mechanical_table is not None:
-                df_s = self.mechanical_table[self.mechanical_table["系列"] == series]
-                sample = ", ".join(
-                    sorted(
-                        [
-                            self.safe_alloy_format(a, t)
-                            for a, t in zip(df_s["Alloy"], df_s["Temper"])
-                        ]
-                    )
-                )
-                response += f"- 代表合金: {sample}\n\n"
-
-        if alloy_hit:
-            response += "### 🔧 該当する代表合金\n"
-            for row in alloy_hit[:10]:
-                label = self.safe_alloy_format(row["Alloy"], row["Temper"])
-                response += (
-                    f"- {label} | 耐食性: {row['耐食性']} / "
-                    f"溶接性: {row['溶接性']} / 切削性: {row['切削性']}\n"
-                )
-            response += "\n"
-
-        return response
-
-    # --------------------------------------------------------
-    # 曖昧検索ワードの正規化
-    # --------------------------------------------------------
-    def normalize_query(self, query: str) -> List[str]:
-        query_l = query.lower()
-        keywords = set()
-
-        for canonical, variants in self.semantic_dict.items():
-            for v in variants:
-                if v.lower() in query_l:
-                    keywords.add(canonical)
-
-        tokens = re.findall(r"[一-龥A-Za-z0-9\-]+", query)
-        keywords.update(tokens)
-
-        return list(keywords)
-
-    # --------------------------------------------------------
-    # クエリ振り分け（確定・安全版）
-    # --------------------------------------------------------
-    def process_query(self, q: str) -> str:
-        text = q.lower()
-        expanded_keywords = self.normalize_query(q)
-        q_u = q.upper()
-
-        # --------------------------------------------------
-        # ① 🔥 熱処理単体（T6とは？ / T6処理について教えて / O材とは？）
-        #    → 「A6061-T6 の詳細」にはマッチしないよう fullmatch で判定
-        # --------------------------------------------------
-        m = re.fullmatch(
-            r"\s*(T\d+|O|O材|H\d+)\s*(処理)?\s*(とは|について|について教えて)?\s*[？?]?\s*",
-            q_u,
-        )
-        if m:
-            symbol = m.group(1).replace("材", "")
-            return self.get_heat_treatment_info(symbol)
-
-        # --------------------------------------------------
-        # ② 🧱 合金記号（A6061-T6 など）※ A + 4桁 必須
-        # --------------------------------------------------
-        alloy_match = re.search(r"A\d{4}(?:-[A-Z0-9]+)?", q_u)
-        if alloy_match:
-            return self.get_alloy_detailed_info(alloy_match.group(0))
-
-        # --------------------------------------------------
-        # ③ 🔥 熱処理の比較（T6 と T651）
-        # --------------------------------------------------
-        temps = re.findall(r"\b(T\d+|O|H\d+)\b", q_u)
-        if len(temps) >= 2:
-            return self.compare_tempers(temps[0], temps[1])
-
-        # --------------------------------------------------
-        # ④ 純アルミ
-        # --------------------------------------------------
-        if "純アルミ" in text or "1000系" in text:
-            return self.get_pure_aluminum_info()
-
-        # --------------------------------------------------
-        # ⑤ 引張強さ
-        # --------------------------------------------------
-        if "引張" in text or ("強度" in text and "切削" not in text):
-            nums = re.findall(r"\d+", text)
-            val = int(nums[0]) if nums else 400
-            return self.get_alloy_by_strength(val)
-
-        # --------------------------------------------------
-        # ⑥ 系列・特性検索
-        # --------------------------------------------------
-        if any(k in expanded_keywords for k in ["耐食", "溶接", "軽量", "高強度", "航空", "8000"]):
-            return self.search_by_properties(expanded_keywords)
-
-        # --------------------------------------------------
-        # デフォルト
-        # --------------------------------------------------
-        return (
-            "質問の例:\n"
-            "- T6とは？\n"
-            "- T6 と T651 の違い\n"
-            "- A6061-T6 の詳細\n"
-            "- 引張強さ 400MPa 以上の合金\n"
-            "- 耐食性と溶接性が良い合金\n"
+    result = m["result"]
+    total = paged_length(result)
+    pages = -(-total // PAGE_SIZE)
+    page = min(int(st.session_state.get(key, 1)), pages)
+    if not streamed:
+        if page == 1:
+            st.markdown(m["content"])
+        else:
+            st.markdown(render_markdown(paginate(result, (page - 1) * PAGE_SIZE, PAGE_SIZE), rag))
+
+    start = (page - 1) * PAGE_SIZE
+    c1, c2 = st.columns([1, 3])
+    c1.number_input(f"ページ（全 {pages}）", min_value=1, max_value=pages, step=1, key=key)
+    c2.caption(f"全 {total} 件中 {start + 1}〜{min(start + PAGE_SIZE, total)} 件を表示")
+
+    table = to_table(result, rag)
+    if table is not None and len(table) > PAGE_SIZE:
+        # st.dataframe は表示範囲の行だけを描画する
+        with st.expander(f"表で表示（{len(table)} 行）"):
+            st.dataframe(table, hide_index=True)
+
+
+def render_message(i: int, m: dict, rag: "AluminumAlloyRAG"):
+    with st.chat_message(m["role"]):
+        # 別のワークブックで得た結果は行番号が合わないので保存済みの本文だけを表示
+        if "result" in m and m.get("workbook") == rag.source_hash:
+            render_pages(f"page_{i}", m, rag)
+        else:
+            st.markdown(m["content"])
+
+
+def render_history(rag: "AluminumAlloyRAG"):
+    messages = st.session_state.messages
+    older = len(messages) - HISTORY_WINDOW
+    if older > 0 and st.toggle(f"以前のメッセージを表示（{older} 件）", key="show_older"):
+        # 折りたたんでいる間は描画しない（長い会話でも再実行のたびに全件を送らない）
+        for i in range(older):
+            render_message(i, messages[i], rag)
+    for i in range(max(0, older), len(messages)):
+        render_message(i, messages[i], rag)
+
+
+def ask(rag: "AluminumAlloyRAG", q: str):
+    # 新しい質問：その場で逐次表示して履歴に積む（再実行で全履歴を描き直さない）
+    messages = st.session_state.messages
+    messages.append({"role": "user", "content": q})
+    with st.chat_message("user"):
+        st.markdown(q)
+    with st.chat_message("assistant"):
+        m = stream_answer(rag, q)
+        messages.append(m)
+        if "result" in m:
+            render_pages(f"page_{len(messages) - 1}", m, rag, streamed=True)
+
+
+# ------------------------------------------------------------
+# 読み込み状況（バックグラウンド読み込み中のみ、1 秒ごとに更新）
+# ------------------------------------------------------------
+def render_readiness(rag: "AluminumAlloyRAG"):
+    from alloy_rag.capabilities import CAPABILITIES, CAPABILITY_LABELS
+
+    if rag.loaded.is_set():
+        return
+
+    @st.fragment(run_every=1.0)
+    def panel():
+        if rag.loaded.is_set():
+            # 完了したらシート一覧・エラー表示も含めて描き直す
+            st.rerun()
+        ready = rag.ready
+        st.subheader("⏳ 読み込み状況")
+        st.progress(len(ready) / len(CAPABILITIES))
+        for c in CAPABILITIES:
+            st.write(f"{'✅' if c in ready else '⏳'} {CAPABILITY_LABELS[c]}")
+
+    with st.sidebar:
+        panel()
+
+
+# ------------------------------------------------------------
+# アップロードはディスクに書かずメモリ上のまま渡す（セッション間で一時ファイルを共有しない）
+# ------------------------------------------------------------
+def upload_buffers(files) -> List[WorkbookBuffer]:
+    # 再実行のたびにハッシュし直さないよう、アップロード ID ごとにセッションへ保持
+    cached = st.session_state.setdefault("upload_buffers", {})
+    buffers = {}
+    for f in files:
+        buf = cached.get(f.file_id)
+        if buf is None:
+            buf = WorkbookBuffer.from_bytes(Path(f.name).name, f.getvalue())
+        buffers[f.file_id] = buf
+    st.session_state.upload_buffers = buffers
+    # フェデレーションは指定順に読むので、ファイル名順に揃えて内容ハッシュも同じ順で求める
+    return sorted(buffers.values(), key=lambda b: (b.name, b.sha256))
+
+
+# ------------------------------------------------------------
+# 計測（直近のトレース・任意でメトリクスの HTTP 公開）
+# ------------------------------------------------------------
+@st.cache_resource
+def get_recent_traces() -> RecentTraces:
+    recent = RecentTraces()
+    TRACER.add_exporter(recent)
+    port = os.environ.get("ALLOY_RAG_METRICS_PORT")
+    if port:
+        cache = get_response_cache()
+        serve_metrics(int(port), lambda: {f"cache_{k}": v for k, v in cache.stats().items()})
+    return recent
+
+
+def render_diagnostics():
+    recent = get_recent_traces()
+    with st.sidebar.expander("🩺 診断（レイテンシ・キャッシュ）"):
+        stats = get_response_cache().stats()
+        c1, c2 = st.columns(2)
+        c1.metric("キャッシュヒット率", f"{stats['hit_rate']:.0%}")
+        c2.metric("ヒット / ミス", f"{stats['hits']} / {stats['misses']}")
+
+        hists = TRACER.histograms()
+        if not hists:
+            st.caption("まだ計測データがありません。")
+            return
+        names = list(hists)
+        default = names.index("app.answer") if "app.answer" in names else 0
+        name = st.selectbox("スパン", names, index=default)
+        h = hists[name]
+        st.caption(
+            f"{h['count']} 回 / p50 {h['p50_ms']:.1f} ms / p95 {h['p95_ms']:.1f} ms / "
+            f"p99 {h['p99_ms']:.1f} ms"
         )
+        st.bar_chart({"件数": {f"≤{le} ms": c for le, c in h["buckets"].items()}})
+
+        slow = sorted(recent.traces, key=lambda t: t.duration_ms, reverse=True)[:5]
+        if slow:
+            st.markdown("**遅いトレース（直近）**")
+            for t in slow:
+                st.code(t.summary(), language=None)
+        if TRACER.profiler is not None and TRACER.profiler.captured:
+            st.markdown("**プロファイル（閾値超え）**")
+            for trace_name, ms, text in reversed(TRACER.profiler.captured):
+                with st.popover(f"{trace_name} {ms:.0f} ms"):
+                    st.code(text, language=None)
 
 
 # ------------------------------------------------------------
@@ -516,6 +320,7 @@ class AluminumAlloyRAG:
 
 
 def main():
+    setup_page()
     st.title("🔧 アルミニウム合金 RAG ChatBot")
     st.markdown("### 材料選定支援システム")
 
@@ -523,43 +328,70 @@ def main():
     # Excel ファイル選択（アップロード or デフォルト）
     # -------------------------------
     uploaded = st.sidebar.file_uploader(
-        "Excelファイルをアップロード", type=["xlsx", "xls"]
+        "Excelファイルをアップロード（複数可）", type=["xlsx", "xls"], accept_multiple_files=True
     )
 
-    if uploaded is not None:
-        # アップロードされたファイルを一時保存
-        temp_path = Path("temp_data_uploaded.xlsx")
-        with open(temp_path, "wb") as f:
-            f.write(uploaded.getbuffer())
-        excel_path = str(temp_path)
-        st.sidebar.success("アップロードした Excel を読み込みます。")
-    else:
-        excel_path = str(DEFAULT_DATA_PATH)
-        st.sidebar.info("デフォルトデータ（data/temp_data.xlsx）を使用しています。")
+    try:
+        buffers = upload_buffers(uploaded)
+        if len(buffers) > 1:
+            # 複数なら 1 つの索引に統合（フェデレーション）
+            excel_path = buffers
+            content_hash = combined_sha256(b.sha256 for b in buffers)
+            st.sidebar.success(f"アップロードした {len(buffers)} 件の Excel を統合して読み込みます。")
+        elif buffers:
+            # 同じ内容のアップロードは共有レジストリで 1 つのナレッジベースにまとまる
+            excel_path = buffers[0]
+            content_hash = excel_path.sha256
+            st.sidebar.success("アップロードした Excel を読み込みます。")
+        else:
+            excel_path = str(DEFAULT_DATA_PATH)
+            content_hash = file_sha256(excel_path)
+            st.sidebar.info("デフォルトデータ（data/temp_data.xlsx）を使用しています。")
+    except OSError as e:
+        st.error(f"❌ データ読み込みに失敗しました: {e}")
+        return
 
     # -------------------------------
-    # RAG 初期化（パスが変わったら再読み込み）
+    # RAG 初期化（内容が変わったら共有レジストリから取得し直す）
+    # 読み込みに失敗していた場合も取得し直す（レジストリが作り直す）
     # -------------------------------
-    need_reload = False
-    if "excel_path" not in st.session_state:
-        need_reload = True
-    elif st.session_state.excel_path != excel_path:
-        need_reload = True
-
-    if need_reload:
+    lease = st.session_state.get("kb_lease")
+    if lease is None or lease.key != content_hash or lease.kb.load_error is not None:
         try:
             with st.spinner("データを読み込んでいます..."):
-                st.session_state.rag = AluminumAlloyRAG(excel_path)
-                st.session_state.excel_path = excel_path
+                # 直前のワークブックを土台に、変更されたシートだけ再インデックス
+                new_lease = get_registry().acquire(
+                    excel_path,
+                    content_hash=content_hash,
+                    pinned=not uploaded,
+                    base=lease.kb if lease is not None else None,
+                )
         except Exception as e:
             st.error(f"❌ データ読み込みに失敗しました: {e}")
             return
+        if lease is not None:
+            lease.release()
+        st.session_state.kb_lease = new_lease
+        st.session_state.excel_path = excel_path
 
-    rag: AluminumAlloyRAG = st.session_state.rag
+    rag = st.session_state.kb_lease.kb
+    if rag.load_error is not None:
+        st.error(f"❌ ファイル読み込みエラー: {rag.load_error}")
+    render_readiness(rag)
 
     # -------------------------------
-    # サイドバー：シート一覧
+    # サイドバー：統合したワークブック・シート一覧
     # -------------------------------
+    if len(rag.sources) > 1:
+        st.sidebar.subheader("📚 統合したワークブック")
+        with st.sidebar.expander("表示"):
+            for src in rag.sources:
+                st.write(f"- {src.label}（{len(src.sheets)} シート）")
+
+    context = st.session_state.get("conversation")
+    if context is not None and context.source_hash == rag.source_hash and context.subject:
+        st.sidebar.caption(f"💬 直前の話題: {context.subject}（「その耐力は？」などで続けて質問できます）")
+
     st.sidebar.subheader("📄 シート一覧")
     with st.sidebar.expander("表示"):
         for s in rag.data.keys():
@@ -580,14 +412,18 @@ def main():
         "T6 と T651 の違い",
         "A8000系の材料について教えて",
         "耐食性と溶接性が良い合金",
+        "6000系の平均引張強さ",
     ]
 
+    pending = None
     for q0 in quick_queries:
         if st.sidebar.button(q0):
-            st.session_state.messages.append({"role": "user", "content": q0})
-            ans0 = rag.process_query(q0)
-            st.session_state.messages.append({"role": "assistant", "content": ans0})
-            st.rerun()
+            pending = q0
+
+    # -------------------------------
+    # サイドバー：診断
+    # -------------------------------
+    render_diagnostics()
 
     # -------------------------------
     # チャット履歴の初期化
@@ -600,20 +436,15 @@ def main():
             }
         ]
 
-    # 履歴表示
-    for m in st.session_state.messages:
-        with st.chat_message(m["role"]):
-            st.markdown(m["content"])
+    # 履歴表示（直近 HISTORY_WINDOW 件）
+    render_history(rag)
 
     # -------------------------------
     # 入力欄
     # -------------------------------
-    q = st.chat_input("質問を入力してください")
+    q = st.chat_input("質問を入力してください") or pending
     if q:
-        st.session_state.messages.append({"role": "user", "content": q})
-        ans = rag.process_query(q)
-        st.session_state.messages.append({"role": "assistant", "content": ans})
-        st.rerun()
+        ask(rag, q)
 
 
 # ------------------------------------------------------------
@@ -0,0 +1,102 @@
+# ------------------------------------------------------------
+# 起動時間（import 時間）ベンチマーク
+# ------------------------------------------------------------
+# 使い方:
+#   python benchmarks/importtime.py              # 予算と比較（超過で終了コード 1）
+#   python benchmarks/importtime.py --update     # 現在の計測値から予算を書き直す
+#
+# - `python -X importtime -c "import <対象>"` を別プロセスで複数回実行し、
+#   インタープリタ起動だけで読み込まれるモジュールを除いた self 時間の
+#   合計（中央値）を対象の import コストとする
+# - 予算ファイルの forbid に挙げたモジュールが読み込まれたら失敗
+#   （例: `import alloy_rag` で pandas を読み込まない）
+# ------------------------------------------------------------
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_PATH = Path(__file__).resolve().parent / "importtime_budget.json"
+
+# --update 時に計測値へ掛ける余裕（小さい値は計測の揺れで落ちないよう下限を設ける）
+HEADROOM = 1.5
+MIN_BUDGET_MS = 10.0
+
+
+def _importtime(code: str) -> Dict[str, int]:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    out: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|", 2)
+        out[name.strip()] = int(self_us)
+    return out
+
+
+def measure(target: str, runs: int, baseline: Set[str]) -> Tuple[float, Set[str]]:
+    totals: List[float] = []
+    modules: Set[str] = set()
+    for _ in range(runs):
+        times = _importtime(f"import {target}")
+        new = {k: v for k, v in times.items() if k not in baseline}
+        totals.append(sum(new.values()) / 1000.0)
+        modules |= set(new)
+    return statistics.median(totals), modules
+
+
+def _forbidden_hits(modules: Set[str], forbid: List[str]) -> List[str]:
+    return sorted(f for f in forbid if any(m == f or m.startswith(f + ".") for m in modules))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="import 時間の予算チェック")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=Path, default=BUDGET_PATH)
+    parser.add_argument("--update", action="store_true", help="計測値から予算を書き直す")
+    args = parser.parse_args(argv)
+
+    budget = json.loads(args.budget.read_text(encoding="utf-8"))
+    baseline = set(_importtime("pass"))
+
+    failed = False
+    print(f"{'target':<28} {'median ms':>10} {'budget ms':>10}  status")
+    for target, spec in budget["targets"].items():
+        ms, modules = measure(target, args.runs, baseline)
+        hits = _forbidden_hits(modules, spec.get("forbid", []))
+        over = ms > spec["budget_ms"]
+        status = "ok"
+        if hits:
+            status = "NG: forbidden " + ", ".join(hits)
+        elif over and not args.update:
+            status = "NG: over budget"
+        failed = failed or bool(hits) or (over and not args.update)
+        print(f"{target:<28} {ms:>10.1f} {spec['budget_ms']:>10.1f}  {status}")
+        if args.update:
+            spec["budget_ms"] = max(round(ms * HEADROOM, 1), MIN_BUDGET_MS)
+
+    if args.update:
+        args.budget.write_text(
+            json.dumps(budget, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"予算を更新しました: {args.budget}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
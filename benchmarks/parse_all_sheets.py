@@ -0,0 +1,114 @@
+# ------------------------------------------------------------
+# 合金名インデックス（parse_all_sheets）のベンチマーク
+# ------------------------------------------------------------
+# 使い方:
+#   python benchmarks/parse_all_sheets.py --rows 200000
+#
+# - 旧実装（iterrows + row.to_dict() を合金列ごとに保持）と
+#   AlloyNamePostings（列単位のベクトル演算 + int32 ポスティング）を
+#   同じ合成データで比較し、構築時間と保持メモリ（tracemalloc）を出力する
+# ------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from alloy_rag.alloy_index import AlloyNamePostings  # noqa: E402
+
+TEMPERS = ["O", "T4", "T6", "T651", "H14", "H18", "H112"]
+
+
+def synthetic_workbook(rows: int, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    codes = rng.choice([1100, 2024, 3003, 5052, 5083, 6061, 6063, 7075], size=rows)
+    tempers = rng.choice(TEMPERS, size=rows)
+    main = pd.DataFrame(
+        {
+            "Alloy": codes,
+            "合金記号": [f"A{c}-{t}" for c, t in zip(codes, tempers)],
+            "Temper": tempers,
+            "引張強さ (MPa)": rng.integers(60, 600, size=rows),
+            "伸び (%)": rng.integers(1, 40, size=rows),
+            "備考": rng.choice(["", "押出材", "板材", "鍛造材"], size=rows),
+        }
+    )
+    sub = pd.DataFrame(
+        {
+            "合金": [f"A{c}" for c in codes[: rows // 4]],
+            "密度": rng.uniform(2.6, 2.9, size=rows // 4),
+        }
+    )
+    return {"機械的性質": main, "物理的性質": sub}
+
+
+def legacy_parse_all_sheets(data: Dict[str, pd.DataFrame]) -> Dict[str, List[Dict]]:
+    all_alloys: Dict[str, List[Dict]] = {}
+    for sheet, df in data.items():
+        for col in df.columns:
+            if any(k in str(col).lower() for k in ["合金", "alloy"]):
+                for _, row in df.iterrows():
+                    name = str(row[col]).strip()
+                    if name and name.lower() != "nan":
+                        all_alloys.setdefault(name, []).append(
+                            {"sheet": sheet, "data": row.to_dict()}
+                        )
+    return all_alloys
+
+
+def measure(build: Callable[[], object]) -> Dict[str, float]:
+    # 時間は tracemalloc なしで、メモリは別の 1 回で計測する（tracemalloc は遅いため）
+    gc.collect()
+    t0 = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - t0
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"seconds": elapsed, "retained_mb": retained / 2**20, "peak_mb": peak / 2**20}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="parse_all_sheets のベンチマーク")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--skip-legacy", action="store_true", help="旧実装を計測しない")
+    parser.add_argument("--json", type=Path, help="結果を JSON で保存")
+    args = parser.parse_args(argv)
+
+    data = synthetic_workbook(args.rows)
+    results = {"rows": args.rows, "postings": measure(lambda: AlloyNamePostings.build(data))}
+    if not args.skip_legacy:
+        results["legacy"] = measure(lambda: legacy_parse_all_sheets(data))
+
+    print(f"{'impl':<10} {'seconds':>10} {'retained MB':>12} {'peak MB':>10}")
+    for name in ("legacy", "postings"):
+        if name in results:
+            r = results[name]
+            print(f"{name:<10} {r['seconds']:>10.3f} {r['retained_mb']:>12.1f} {r['peak_mb']:>10.1f}")
+    if "legacy" in results:
+        speedup = results["legacy"]["seconds"] / max(results["postings"]["seconds"], 1e-9)
+        saved = results["legacy"]["retained_mb"] - results["postings"]["retained_mb"]
+        print(f"速度 {speedup:.1f} 倍 / 保持メモリ {saved:.1f} MB 削減")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
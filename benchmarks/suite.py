@@ -0,0 +1,279 @@
+# ------------------------------------------------------------
+# ベンチマークスイート（読み込み・索引構築・メモリ・意図別レイテンシ）
+# ------------------------------------------------------------
+# 使い方:
+#   python benchmarks/suite.py --rows 100000 --sheets 4 --json bench.json
+#   python benchmarks/suite.py --rows 100000 --sheets 4 --compare bench.json
+#   python benchmarks/suite.py --workbook data/temp_data.xlsx
+#
+# - 合成ワークブック（synthetic_workbook.py）を作業ディレクトリに生成して
+#   計測する（同じ引数の 2 回目以降は生成済みのファイルを使う）
+#   --workbook を指定した場合も作業ディレクトリへコピーしてから計測する
+# - 計測項目
+#     load    read_workbook（スナップショット無し / あり）と
+#             AluminumAlloyRAG の構築（コールド / ウォーム）の秒数
+#     index   parse_all_sheets + build_indexes の秒数（全文検索索引も作り直す）
+#     memory  ウォーム構築時の tracemalloc の保持量・ピークとプロセスの最大 RSS
+#     latency process_query の意図ごとの p50 / p99 / 平均（ms）
+# - --json で結果を保存し、--compare で以前の結果と比べる
+#   （--threshold 倍を超えて遅く・大きくなった項目があれば終了コード 1）
+# ------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from alloy_rag.engine import AluminumAlloyRAG  # noqa: E402
+from alloy_rag.workbook_cache import read_workbook, snapshot_root  # noqa: E402
+from synthetic_workbook import generate_workbook  # noqa: E402
+
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / "alloy_rag_bench"
+
+# 意図ごとの質問（{alloy} は生成データ中の合金記号に置き換える）
+QUERY_TEMPLATES = [
+    "T6とは？",
+    "H14とは",
+    "O材とは？",
+    "{alloy} の詳細",
+    "{alloy} に近い合金",
+    "T6 と T651 の違い",
+    "6000系の平均引張強さ",
+    "7000系で最も強い調質",
+    "純アルミの特徴を教えて",
+    "引張強さが500MPa以上",
+    "強度 300 以上",
+    "引張強さ 400 以上 かつ 伸び 10 以上",
+    "強度と耐食性のバランスが良い合金",
+    "耐食性 B 以上で引張強さを重視、溶接性も",
+    "耐食性と溶接性が良い合金",
+    "軽量な材料",
+    "押出加工性に優れた形材",
+    "こんにちは",
+]
+
+# 秒数・バイト数の指標（大きいほど悪い）を --compare で比べる
+_LOWER_IS_BETTER = ("seconds", "_ms", "_mb")
+
+
+# ------------------------------------------------------------
+# 計測の補助
+# ------------------------------------------------------------
+def _timed(fn: Callable[[], object]) -> Tuple[float, object]:
+    gc.collect()
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def _drop_snapshots(path: Path):
+    shutil.rmtree(snapshot_root(str(path)), ignore_errors=True)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def _percentile(sorted_ms: List[float], q: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+
+# ------------------------------------------------------------
+# 各計測
+# ------------------------------------------------------------
+def bench_load(path: Path) -> Tuple[Dict[str, float], AluminumAlloyRAG]:
+    _drop_snapshots(path)
+    parse_cold, _ = _timed(lambda: read_workbook(str(path)))
+    parse_warm, _ = _timed(lambda: read_workbook(str(path)))
+
+    _drop_snapshots(path)
+    construct_cold, _ = _timed(lambda: AluminumAlloyRAG(str(path)))
+    construct_warm, rag = _timed(lambda: AluminumAlloyRAG(str(path)))
+    return {
+        "read_workbook_cold_seconds": parse_cold,
+        "read_workbook_warm_seconds": parse_warm,
+        "construct_cold_seconds": construct_cold,
+        "construct_warm_seconds": construct_warm,
+    }, rag
+
+
+def bench_index(rag: AluminumAlloyRAG) -> Dict[str, float]:
+    def rebuild():
+        retrieval = rag._retrieval_dir()
+        if retrieval is not None:
+            shutil.rmtree(retrieval, ignore_errors=True)
+        rag.parse_all_sheets()
+        rag.build_indexes()
+
+    seconds, _ = _timed(rebuild)
+    return {"build_seconds": seconds}
+
+
+def bench_memory(path: Path) -> Dict[str, float]:
+    # スナップショットがある状態（通常の起動）で構築したオブジェクトの保持量
+    gc.collect()
+    tracemalloc.start()
+    rag = AluminumAlloyRAG(str(path))
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rag
+    # ru_maxrss は Linux では KB、macOS では B
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    maxrss_mb = maxrss / 2**20 if sys.platform == "darwin" else maxrss / 2**10
+    return {"retained_mb": retained / 2**20, "peak_mb": peak / 2**20, "max_rss_mb": maxrss_mb}
+
+
+def _sample_alloys(rag: AluminumAlloyRAG, n: int, seed: int) -> List[str]:
+    df = rag.mechanical_table
+    if df is None or not len(df):
+        return ["A6061-T6"]
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(df), size=n)
+    return [rag.safe_alloy_format(df["Alloy"].iat[i], df["Temper"].iat[i]) for i in idx]
+
+
+def bench_latency(rag: AluminumAlloyRAG, repeat: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    alloys = _sample_alloys(rag, repeat, seed)
+    samples: Dict[str, List[float]] = {}
+    for template in QUERY_TEMPLATES:
+        for i in range(repeat):
+            q = template.format(alloy=alloys[i % len(alloys)])
+            intent = rag.router.route(q).intent
+            t0 = time.perf_counter()
+            rag.process_query(q)
+            samples.setdefault(intent, []).append((time.perf_counter() - t0) * 1000.0)
+
+    out = {}
+    for intent, ms in sorted(samples.items()):
+        ms.sort()
+        out[intent] = {
+            "n": len(ms),
+            "p50_ms": statistics.median(ms),
+            "p99_ms": _percentile(ms, 0.99),
+            "mean_ms": statistics.fmean(ms),
+        }
+    return out
+
+
+# ------------------------------------------------------------
+# 比較（以前の JSON と）
+# ------------------------------------------------------------
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and name.endswith(_LOWER_IS_BETTER):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[str]:
+    before, after = _flatten(old), _flatten(new)
+    regressions = []
+    print(f"\n{'metric':<52} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name in sorted(set(before) & set(after)):
+        ratio = after[name] / before[name] if before[name] > 0 else 1.0
+        mark = "  NG" if ratio > threshold else ""
+        print(f"{name:<52} {before[name]:>10.3f} {after[name]:>10.3f} {ratio:>7.2f}{mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="アルミ合金 RAG のベンチマークスイート")
+    parser.add_argument("--rows", type=int, default=10000, help="合成データの行数")
+    parser.add_argument("--sheets", type=int, default=2, help="合成データの評価表シート数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workbook", type=Path, help="合成せずにこの Excel を計測する")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR)
+    parser.add_argument("--repeat", type=int, default=30, help="質問ごとの実行回数")
+    parser.add_argument("--json", type=Path, help="結果を JSON で保存")
+    parser.add_argument("--compare", type=Path, help="以前の結果 JSON と比較")
+    parser.add_argument("--threshold", type=float, default=1.25, help="劣化とみなす倍率")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+
+    if args.workbook:
+        # スナップショットを消して計測するので、元ファイルの隣ではなく作業ディレクトリのコピーを使う
+        path = args.workdir / args.workbook.name
+        args.workdir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(args.workbook, path)
+    else:
+        path = args.workdir / f"handbook_r{args.rows}_s{args.sheets}_seed{args.seed}.xlsx"
+        if not path.exists():
+            seconds, _ = _timed(lambda: generate_workbook(path, args.rows, args.sheets, args.seed))
+            print(f"生成: {path}（{seconds:.1f} s）", file=sys.stderr)
+
+    load, rag = bench_load(path)
+    if rag.load_error is not None:
+        print(f"読み込みに失敗しました: {rag.load_error}", file=sys.stderr)
+        return 1
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "workbook": str(path),
+            "rows": int(rag.mechanical_table.shape[0]) if rag.mechanical_table is not None else 0,
+            "sheets": len(rag.data),
+            "cells": int(sum(df.size for df in rag.data.values())),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "load": load,
+        "index": bench_index(rag),
+        "latency": bench_latency(rag, args.repeat, args.seed),
+        "memory": bench_memory(path),
+    }
+
+    meta = results["meta"]
+    print(f"{meta['workbook']}: {meta['sheets']} シート / {meta['cells']} セル")
+    for name, value in {**results["load"], **results["index"], **results["memory"]}.items():
+        print(f"  {name:<32} {value:>10.3f}")
+    print(f"  {'intent':<18} {'n':>5} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for intent, r in results["latency"].items():
+        print(f"  {intent:<18} {r['n']:>5} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['mean_ms']:>9.2f}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    if args.compare:
+        old = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(old, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 項目が {args.threshold} 倍を超えて劣化しました", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
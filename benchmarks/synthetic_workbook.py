@@ -0,0 +1,187 @@
+# ------------------------------------------------------------
+# 合成ハンドブック・ワークブックの生成（ベンチマーク用）
+# ------------------------------------------------------------
+# 使い方:
+#   python benchmarks/synthetic_workbook.py out.xlsx --rows 100000 --sheets 4
+#
+# - 実データ（data/temp_data.xlsx）と同じスキーマのシートを作る
+#     aluminum_handbook_table   機械特性（rows 行）
+#     アルミニウム合金の特性       系列の説明（1000〜8000 系 + 派生行）
+#     熱処理                     調質記号の定義
+#     一般的性質_N               合金 × 質別の評価表（rows 行 × sheets 枚）
+# - 乱数のシードを固定しているので、同じ引数なら同じ内容になる
+# - openpyxl の write_only モードで書き出す（10 万行でも数十秒）
+# ------------------------------------------------------------
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Iterator, List, Sequence
+
+import numpy as np
+from openpyxl import Workbook
+
+MECHANICAL_SHEET = "aluminum_handbook_table"
+SERIES_SHEET = "アルミニウム合金の特性"
+HEAT_TREATMENT_SHEET = "熱処理"
+RATING_SHEET_PREFIX = "一般的性質_"
+
+MECHANICAL_HEADER = [
+    "Alloy", "Temper", "引張強さ (MPa)", "耐力 (MPa)", "伸び (%)", "疲れ強さ (MPa)",
+    "HBW密度 (g/cm³)", "系列", "強度ランク", "耐食性", "溶接性", "切削性", "成形性", "備考",
+]
+SERIES_HEADER = [
+    "合金系", "概要", "特性", "特性", "特性", "特性", "主要な特徴と用途",
+    "代表的な特性（強度、溶接性、耐食性）",
+]
+HEAT_TREATMENT_HEADER = ["記号 ", "定義 ", "意味 "]
+RATING_HEADER = [
+    "合金", "質別", "耐食性", "耐応力腐食割れ性", "成形性", "切削性", "ろう付性",
+    "鍛造性", "ガス溶接", "アルゴン溶接", "抵抗溶接",
+]
+
+# 系列ごとの合金番号の候補・引張強さの範囲・評価の傾向（耐食・溶接・切削・成形）
+SERIES = {
+    1000: ([1050, 1060, 1070, 1080, 1100, 1200], (60, 170), "AAEA"),
+    2000: ([2011, 2014, 2017, 2024, 2219, 2618], (180, 490), "DDBC"),
+    3000: ([3003, 3004, 3005, 3105], (100, 280), "AADA"),
+    4000: ([4032, 4043], (170, 380), "CCCD"),
+    5000: ([5005, 5052, 5056, 5083, 5154, 5182, 5454], (120, 440), "AADB"),
+    6000: ([6005, 6061, 6063, 6082, 6101], (90, 340), "BACB"),
+    7000: ([7003, 7050, 7075, 7178, 7204], (200, 600), "CCBD"),
+    8000: ([8011, 8021, 8079, 8090], (120, 480), "BCCB"),
+}
+SERIES_NAMES = {
+    1000: "純アルミニウム(1000系)",
+    2000: "Al-Cu 系合金 (2000 系)",
+    3000: "Al-Mn 系合金 (3000 系)",
+    4000: "Al-Si 系合金 (4000 系)",
+    5000: "Al-Mg 系合金 (5000 系)",
+    6000: "Al-Mg-Si 系合金 (6000 系)",
+    7000: "Al-Zn-Mg 系合金 (7000 系)",
+    8000: "Al-Li 系合金 (8000 系)",
+}
+TEMPERS = ["O", "F", "H12", "H14", "H16", "H18", "H24", "H32", "H34", "H112",
+           "T3", "T4", "T5", "T6", "T651", "T7", "T73", "T8", "T81"]
+RATINGS = "ABCDE"
+REMARKS = ["", "押出材", "板材", "鍛造材", "船舶・LNG用途。", "サッシ等。", "航空機構造材。"]
+WORDS = ["強度", "耐食性", "溶接性", "切削性", "成形性", "押出加工性", "表面処理性", "軽量",
+         "航空機", "船舶", "建材", "自動車部品", "熱処理", "時効硬化", "加工硬化"]
+
+
+def _shift(grade: str, rng: np.random.Generator, n: int) -> np.ndarray:
+    # 系列の傾向から ±1 段階ばらつかせた評価記号
+    base = RATINGS.index(grade)
+    idx = np.clip(base + rng.integers(-1, 2, size=n), 0, len(RATINGS) - 1)
+    return np.array(list(RATINGS))[idx]
+
+
+def _sentence(rng: np.random.Generator, words: int = 12) -> str:
+    return "、".join(rng.choice(WORDS, size=words)) + "に関する記述。"
+
+
+# ------------------------------------------------------------
+# シートごとの行
+# ------------------------------------------------------------
+def mechanical_rows(rows: int, rng: np.random.Generator) -> Iterator[List]:
+    series = rng.choice(list(SERIES), size=rows)
+    tempers = rng.choice(TEMPERS, size=rows)
+    u = rng.random(rows)
+    for i in range(rows):
+        s = int(series[i])
+        codes, (lo, hi), trend = SERIES[s]
+        tensile = int(lo + (hi - lo) * u[i])
+        proof = int(tensile * rng.uniform(0.3, 0.9))
+        rank = "低" if tensile < 200 else ("中" if tensile < 350 else "高")
+        grades = [_shift(g, rng, 1)[0] for g in trend]
+        yield [
+            int(rng.choice(codes)),
+            str(tempers[i]),
+            tensile,
+            proof,
+            int(rng.integers(2, 45)),
+            float(int(tensile * rng.uniform(0.25, 0.45))) if rng.random() > 0.1 else None,
+            f"{int(tensile / 3.5)} / {rng.uniform(2.6, 2.85):.2f}",
+            s,
+            rank,
+            *grades,
+            str(rng.choice(REMARKS)) or None,
+        ]
+
+
+def series_rows(extra: int, rng: np.random.Generator) -> Iterator[List]:
+    # 実データと同じく 1 行目は「特性」列の小見出し
+    yield [None, None, "切削性", "耐食性", "溶接性", "表面処理性", None, None]
+    for s, name in SERIES_NAMES.items():
+        codes = SERIES[s][0]
+        yield [
+            name,
+            f"{'、'.join(str(c) for c in codes[:3])} 合金が代表的です。" + _sentence(rng, 20),
+            *(RATINGS[RATINGS.index(g)] for g in SERIES[s][2]),
+            _sentence(rng, 6),
+            f"強度は{'高い' if SERIES[s][1][1] > 400 else '中程度'}。" + _sentence(rng, 4),
+        ]
+    for i in range(extra):
+        yield [None, _sentence(rng, 20), None, None, None, None, _sentence(rng, 6), None]
+
+
+def heat_treatment_rows(rng: np.random.Generator) -> Iterator[List]:
+    yield ["F", "製造のままのもの", "加工硬化または熱処理について特別の調整をしないもの。"]
+    yield ["O", "焼なましたもの", "完全焼なましによって最も軟らかい状態を得たもの。"]
+    for a in range(1, 5):
+        yield [f"H{a}", f"加工硬化（区分 {a}）", _sentence(rng)]
+        for b in range(1, 10):
+            yield [f"H{a}{b}", f"H{a} の硬さ {b}/8", _sentence(rng)]
+    for t in range(1, 11):
+        yield [f"T{t}", f"熱処理（区分 {t}）", _sentence(rng)]
+        for suffix in ("1", "51", "510", "511", "52", "54"):
+            yield [f"T{t}{suffix}", f"T{t} の後に応力除去 {suffix}", _sentence(rng)]
+
+
+def rating_rows(rows: int, rng: np.random.Generator) -> Iterator[List]:
+    series = rng.choice(list(SERIES), size=rows)
+    tempers = rng.choice(TEMPERS, size=rows)
+    for i in range(rows):
+        s = int(series[i])
+        grades = _shift(SERIES[s][2][0], rng, len(RATING_HEADER) - 2)
+        yield [int(rng.choice(SERIES[s][0])), str(tempers[i]), *grades]
+
+
+# ------------------------------------------------------------
+# ワークブックの書き出し
+# ------------------------------------------------------------
+def _write_sheet(wb: Workbook, title: str, header: Sequence[str], rows: Iterator[List]):
+    ws = wb.create_sheet(title)
+    ws.append(list(header))
+    for row in rows:
+        ws.append(row)
+
+
+def generate_workbook(path: Path, rows: int, sheets: int = 1, seed: int = 0) -> Path:
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    _write_sheet(wb, HEAT_TREATMENT_SHEET, HEAT_TREATMENT_HEADER, heat_treatment_rows(rng))
+    _write_sheet(wb, MECHANICAL_SHEET, MECHANICAL_HEADER, mechanical_rows(rows, rng))
+    _write_sheet(wb, SERIES_SHEET, SERIES_HEADER, series_rows(max(0, rows // 1000), rng))
+    for n in range(1, sheets + 1):
+        _write_sheet(wb, f"{RATING_SHEET_PREFIX}{n}", RATING_HEADER, rating_rows(rows, rng))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(path)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="合成ハンドブック・ワークブックの生成")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--rows", type=int, default=10000, help="機械特性・評価表の行数")
+    parser.add_argument("--sheets", type=int, default=1, help="評価表シートの枚数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    generate_workbook(args.output, args.rows, args.sheets, args.seed)
+    print(f"{args.output}: {args.rows} 行 × 評価表 {args.sheets} 枚")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# ------------------------------------------------------------
+# 回答の回帰検査・レイテンシ予算の検査（pytest）
+# ------------------------------------------------------------
+# 使い方:
+#   python -m pytest tests                     # 回答の一致とレイテンシ予算を検査
+#   python -m pytest tests --update-golden     # 現在の回答で期待値（golden/*.json）を書き直す
+#   python -m pytest tests --update-budgets    # 現在の計測値でレイテンシ予算を書き直す
+#   python -m pytest tests --latency-scale 2   # 揺れの大きい環境（CI の共有ランナーなど）では予算を 2 倍に
+#
+# - data/temp_data.xlsx と、合成ワークブック（benchmarks/synthetic_workbook.py。
+#   シード固定）を一時ディレクトリにコピー・生成して読み込む（リポジトリには書かない）
+# - 埋め込み検索は結果が環境に依存するので無効にする（BM25 だけ）
+# ------------------------------------------------------------
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+os.environ.pop("ALLOY_RAG_EMBEDDING_MODEL", None)
+
+from alloy_rag.engine import AluminumAlloyRAG  # noqa: E402
+from synthetic_workbook import generate_workbook  # noqa: E402
+
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden"
+BUDGET_PATH = Path(__file__).resolve().parent / "latency_budget.json"
+
+# 合成ワークブックの大きさ（期待値を変えずに変更はできない）
+SYNTHETIC_ROWS = 500
+SYNTHETIC_SHEETS = 1
+SYNTHETIC_SEED = 0
+
+WORKBOOKS = ("temp_data", "synthetic")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("alloy_rag")
+    group.addoption(
+        "--update-golden", action="store_true", help="現在の回答で期待値を書き直す"
+    )
+    group.addoption(
+        "--update-budgets", action="store_true", help="現在の計測値でレイテンシ予算を書き直す"
+    )
+    group.addoption(
+        "--latency-scale", type=float, default=1.0, help="レイテンシ予算に掛ける倍率"
+    )
+
+
+# ------------------------------------------------------------
+# 読み込むワークブック（セッションで 1 回だけ構築）
+# ------------------------------------------------------------
+def _prepare(name: str, workdir: Path) -> Path:
+    if name == "temp_data":
+        path = workdir / "temp_data.xlsx"
+        shutil.copyfile(ROOT / "data" / "temp_data.xlsx", path)
+        return path
+    path = workdir / f"synthetic_r{SYNTHETIC_ROWS}_s{SYNTHETIC_SHEETS}_seed{SYNTHETIC_SEED}.xlsx"
+    return generate_workbook(path, SYNTHETIC_ROWS, SYNTHETIC_SHEETS, SYNTHETIC_SEED)
+
+
+@pytest.fixture(scope="session")
+def engine_for(tmp_path_factory) -> Callable[[str], AluminumAlloyRAG]:
+    engines: Dict[str, AluminumAlloyRAG] = {}
+
+    def get(name: str) -> AluminumAlloyRAG:
+        if name not in engines:
+            rag = AluminumAlloyRAG(str(_prepare(name, tmp_path_factory.mktemp(name))))
+            if rag.load_error is not None:
+                raise rag.load_error
+            engines[name] = rag
+        return engines[name]
+
+    return get
+
+
+# ------------------------------------------------------------
+# 期待値・予算のファイル（更新モードでは終了時にまとめて書く）
+# ------------------------------------------------------------
+def _load_json(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dump_json(path: Path, data: Dict[str, Any]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+@pytest.fixture(scope="session")
+def golden(request) -> Dict[str, Dict[str, Any]]:
+    # ワークブック名 -> {"queries": {質問: 回答}, "sessions": {名前: [回答]}}
+    data = {name: _load_json(GOLDEN_DIR / f"{name}.json") for name in WORKBOOKS}
+    yield data
+    if request.config.getoption("update_golden", default=False):
+        from corpus import QUERIES, SESSIONS
+
+        for name, entries in data.items():
+            queries = entries.get("queries", {})
+            sessions = entries.get("sessions", {})
+            # コーパスの順に並べ、コーパスから消えた質問は捨てる
+            _dump_json(
+                GOLDEN_DIR / f"{name}.json",
+                {
+                    "queries": {q: queries[q] for q in QUERIES if q in queries},
+                    "sessions": {s: sessions[s] for s in SESSIONS if s in sessions},
+                },
+            )
+
+
+@pytest.fixture(scope="session")
+def budgets(request) -> Dict[str, Dict[str, Any]]:
+    # ワークブック名 -> 意図 -> {"p50_ratio": 較正の処理の p50 に対する予算の倍率}
+    data = _load_json(BUDGET_PATH)
+    yield data
+    if request.config.getoption("update_budgets", default=False):
+        _dump_json(BUDGET_PATH, {name: data[name] for name in WORKBOOKS if name in data})
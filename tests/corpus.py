@@ -0,0 +1,87 @@
+# ------------------------------------------------------------
+# 回帰検査の質問コーパス
+# ------------------------------------------------------------
+# - QUERIES は 1 問ずつ（文脈なし）、SESSIONS は同じ会話の文脈で順に答える
+# - 振り分けの境界（熱処理単体の fullmatch と合金記号、数値条件と引張強さ、
+#   系列の集計と純アルミなど）を両側から突く質問を並べている
+# - 質問を追加・変更したら --update-golden で期待値を作り直し、差分を確認してコミットする
+# ------------------------------------------------------------
+
+from typing import Dict, List
+
+QUERIES: List[str] = [
+    # 熱処理単体（fullmatch）と、それに当たらない言い回し
+    # （O は熱処理シートに無いので組み込みの簡易説明で答える）
+    "T6とは？",
+    "T6処理について教えて",
+    "O材とは？",
+    "H14とは",
+    "T6 の意味を詳しく",
+    # 合金記号（表記ゆれ・タイプミス・調質なし）
+    "A6061-T6 の詳細",
+    "6061T6",
+    "AA7075-T651",
+    "Ａ６０６１",
+    "A6016-T6 の詳細",
+    "A5052 の特性",
+    # 「A8000系」は合金記号ではなく系列（接頭辞の無い言い方と同じ系列の概要になる）
+    "A8000系の材料について教えて",
+    "8000系の材料について教えて",
+    # 熱処理の比較
+    "T6 と T651 の違い",
+    # 類似合金
+    "A7075-T6 に近い合金",
+    "A6061-T6 の代替材（耐食性重視）",
+    # 系列の集計・純アルミ
+    "6000系の平均引張強さ",
+    "7000系で最も強い調質",
+    "1000系で一番低い耐力",
+    "5000系の統計",
+    "6000系と7000系の中央値",
+    "純アルミの特徴を教えて",
+    # 多目的選定・数値条件・引張強さ
+    "強度と耐食性のバランスが良い合金",
+    "耐食性 B 以上で引張強さを重視、溶接性も",
+    "引張強さ 400 以上 かつ 伸び 10 以上",
+    "耐力 200MPa 以上",
+    "引張強さが500MPa以上",
+    "強度 300 以上",
+    # 系列・特性検索と全文検索
+    "耐食性と溶接性が良い合金",
+    "軽量な材料",
+    "押出加工性に優れた形材",
+    "航空機",
+    "こんにちは",
+]
+
+SESSIONS: Dict[str, List[str]] = {
+    # 合金の詳細から追質問
+    "alloy": [
+        "A6061-T6 の詳細",
+        "その耐力は？",
+        "T651 と比べて",
+        "それに近い合金",
+        "その詳細",
+    ],
+    # 一覧から絞り込み・順位付け
+    "list": [
+        "引張強さ 300 以上",
+        "その中で伸び 10% 以上",
+        "その中で耐食性が良いもの",
+        "伸びは？",
+    ],
+    # 系列の集計から追質問
+    "series": [
+        "6000系の統計",
+        "その中で耐力 200 以上",
+        "7000系で最も強い調質",
+        "その伸びは？",
+    ],
+    # 文脈に当たらない質問は通常どおり答える
+    "unrelated": [
+        "T6とは？",
+        "T651 と比べて",
+        "耐食性と溶接性が良い合金",
+        "A5052-H34 の詳細",
+    ],
+}
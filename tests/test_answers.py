@@ -0,0 +1,216 @@
+# ------------------------------------------------------------
+# 回答の要点の検査（意図・記号・found・先頭行を明示的に書く）
+# ------------------------------------------------------------
+# - golden は現在の回答を丸ごと記録するので、誤った回答もそのまま期待値になり得る。
+#   ここではハンドブックの内容から正しいと言える要点だけを手で書いて確かめる
+# - 振り分けた意図はコーパスの全質問について書く（質問を足したらここにも足す）
+# - temp_data（実データ）は具体的な値、どちらのワークブックでも成り立つ性質
+#   （条件を満たす・降順・基準の合金を含まない など）は両方で確かめる
+# ------------------------------------------------------------
+
+import json
+from typing import Any, Dict
+
+import pytest
+
+from alloy_rag.renderers import to_json
+from conftest import WORKBOOKS
+from corpus import QUERIES
+
+TENSILE = "引張強さ (MPa)"
+PROOF = "耐力 (MPa)"
+ELONGATION = "伸び (%)"
+
+# 質問 -> 振り分ける意図
+ROUTES: Dict[str, str] = {
+    "T6とは？": "temper_info",
+    "T6処理について教えて": "temper_info",
+    "O材とは？": "temper_info",
+    "H14とは": "temper_info",
+    "T6 の意味を詳しく": "full_text",
+    "A6061-T6 の詳細": "alloy_detail",
+    "6061T6": "alloy_detail",
+    "AA7075-T651": "alloy_detail",
+    "Ａ６０６１": "alloy_detail",
+    "A6016-T6 の詳細": "alloy_detail",
+    "A5052 の特性": "alloy_detail",
+    "A8000系の材料について教えて": "series_info",
+    "8000系の材料について教えて": "series_info",
+    "T6 と T651 の違い": "temper_compare",
+    "A7075-T6 に近い合金": "similar",
+    "A6061-T6 の代替材（耐食性重視）": "similar",
+    "6000系の平均引張強さ": "series_stats",
+    "7000系で最も強い調質": "series_stats",
+    "1000系で一番低い耐力": "series_stats",
+    "5000系の統計": "series_stats",
+    "6000系と7000系の中央値": "series_stats",
+    "純アルミの特徴を教えて": "pure_aluminum",
+    "強度と耐食性のバランスが良い合金": "selection",
+    "耐食性 B 以上で引張強さを重視、溶接性も": "selection",
+    "引張強さ 400 以上 かつ 伸び 10 以上": "conditions",
+    "耐力 200MPa 以上": "conditions",
+    "引張強さが500MPa以上": "strength",
+    "強度 300 以上": "strength",
+    "耐食性と溶接性が良い合金": "properties",
+    "軽量な材料": "properties",
+    "押出加工性に優れた形材": "full_text",
+    "航空機": "properties",
+    "こんにちは": "full_text",
+}
+
+# temp_data の要点（質問 -> 回答 JSON の部分。"top" は results[0] の部分）
+TEMP_DATA: Dict[str, Dict[str, Any]] = {
+    "T6とは？": {"type": "temper_info", "symbol": "T6", "found": True, "builtin": False},
+    "O材とは？": {"type": "temper_info", "symbol": "O", "found": True, "builtin": True},
+    "H14とは": {"type": "temper_info", "symbol": "H14", "found": True},
+    "A6061-T6 の詳細": {
+        "type": "alloy_detail",
+        "designation": "A6061-T6",
+        "found": True,
+        "mechanical": {"Alloy": 6061, "Temper": "T6", TENSILE: 310, PROOF: 275},
+    },
+    "6061T6": {"type": "alloy_detail", "designation": "A6061-T6", "found": True},
+    "AA7075-T651": {"type": "alloy_detail", "designation": "A7075-T651", "found": True},
+    "Ａ６０６１": {"type": "alloy_detail", "designation": "A6061", "found": True},
+    "A6016-T6 の詳細": {
+        "type": "alloy_detail",
+        "designation": "A6061-T6",
+        "requested": "A6016-T6",
+        "found": True,
+    },
+    "A8000系の材料について教えて": {"type": "properties"},
+    "T6 と T651 の違い": {"type": "temper_compare", "found": True},
+    "A7075-T6 に近い合金": {"type": "similar", "designation": "A7075-T6", "found": True},
+    "7000系で最も強い調質": {
+        "type": "series_stats",
+        "stat": "max",
+        "top": {"designation": "A7075-T6", TENSILE: 570},
+    },
+    "1000系で一番低い耐力": {
+        "type": "series_stats",
+        "stat": "min",
+        "top": {"designation": "A1100-O"},
+    },
+    "純アルミの特徴を教えて": {"type": "pure_aluminum"},
+    "引張強さ 400 以上 かつ 伸び 10 以上": {
+        "type": "conditions",
+        "total": 7,
+        "top": {"designation": "A7075-T6"},
+    },
+    "引張強さが500MPa以上": {
+        "type": "strength",
+        "min_strength": 500,
+        "top": {"designation": "A7075-T6", TENSILE: 570},
+    },
+    "強度と耐食性のバランスが良い合金": {
+        "type": "selection",
+        "top": {"designation": "A5083-H321/H116"},
+    },
+    "こんにちは": {"type": "help"},
+}
+
+
+def _answer(rag, q: str) -> Dict[str, Any]:
+    return json.loads(json.dumps(to_json(rag.query(q), rag)))
+
+
+def _subset(expected: Any, actual: Any, path: str = "") -> list:
+    # expected に書いたキーだけを比べ、違った場所を返す
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict):
+            return [f"{path or '/'}: {actual!r}"]
+        out = []
+        for k, v in expected.items():
+            if k not in actual:
+                out.append(f"{path}/{k}: キーがありません")
+            else:
+                out.extend(_subset(v, actual[k], f"{path}/{k}"))
+        return out
+    return [] if expected == actual else [f"{path}: {expected!r} != {actual!r}"]
+
+
+def test_routes_cover_corpus():
+    assert set(ROUTES) == set(QUERIES), "corpus.QUERIES と ROUTES の質問がずれています"
+
+
+@pytest.mark.parametrize("q", QUERIES)
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_route(engine_for, workbook, q):
+    assert engine_for(workbook).router.route(q).intent == ROUTES[q]
+
+
+@pytest.mark.parametrize("q", list(TEMP_DATA))
+def test_temp_data_answer(engine_for, q):
+    expected = dict(TEMP_DATA[q])
+    actual = _answer(engine_for("temp_data"), q)
+    top = expected.pop("top", None)
+    problems = _subset(expected, actual)
+    if top is not None:
+        results = actual.get("results") or []
+        if not results:
+            problems.append("/results: 空です")
+        else:
+            problems.extend(_subset(top, results[0], "/results/0"))
+    assert not problems, f"{q}\n" + "\n".join(problems)
+
+
+# ------------------------------------------------------------
+# どちらのワークブックでも成り立つ性質
+# ------------------------------------------------------------
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_series_mention_is_not_an_alloy(engine_for, workbook):
+    # 「A8000系」は合金記号 A8000 ではなく系列。接頭辞の無い言い方と同じ答えになる
+    rag = engine_for(workbook)
+    a = _answer(rag, "A8000系の材料について教えて")
+    b = _answer(rag, "8000系の材料について教えて")
+    assert a["type"] == "properties"
+    assert [s["series"] for s in a["series"]] == [8000]
+    assert {k: v for k, v in a.items() if k != "keywords"} == {
+        k: v for k, v in b.items() if k != "keywords"
+    }
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_strength_results(engine_for, workbook):
+    for q, minimum in (("引張強さが500MPa以上", 500), ("強度 300 以上", 300)):
+        results = _answer(engine_for(workbook), q)["results"]
+        tensile = [r[TENSILE] for r in results]
+        assert tensile, q
+        assert all(t >= minimum for t in tensile), q
+        assert tensile == sorted(tensile, reverse=True), q
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_condition_results(engine_for, workbook):
+    rag = engine_for(workbook)
+    results = _answer(rag, "引張強さ 400 以上 かつ 伸び 10 以上")["results"]
+    assert results
+    assert all(r[TENSILE] >= 400 and r[ELONGATION] >= 10 for r in results)
+    results = _answer(rag, "耐力 200MPa 以上")["results"]
+    assert results
+    assert all(r[PROOF] >= 200 for r in results)
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_similar_results(engine_for, workbook):
+    for q in ("A7075-T6 に近い合金", "A6061-T6 の代替材（耐食性重視）"):
+        answer = _answer(engine_for(workbook), q)
+        assert answer["found"] and answer["error"] is None, q
+        distances = [r["distance"] for r in answer["results"]]
+        assert distances == sorted(distances), q
+        # 基準と同じ合金 × 調質は候補に含めない
+        origin = answer["origin"]["designation"]
+        assert all(r["designation"] != origin for r in answer["results"]), q
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_series_extremes(engine_for, workbook):
+    rag = engine_for(workbook)
+    for q, series, prop, column, stat in (
+        ("7000系で最も強い調質", 7000, "tensile", TENSILE, "max"),
+        ("1000系で一番低い耐力", 1000, "proof", PROOF, "min"),
+    ):
+        answer = _answer(rag, q)
+        top = answer["results"][0]
+        assert top["系列"] == series, q
+        assert top[column] == answer["series"][0]["stats"][prop][stat], q
@@ -0,0 +1,93 @@
+# ------------------------------------------------------------
+# HTTP/JSON API の入力検査（ASGI アプリを直接呼び出す。サーバーは起動しない）
+# ------------------------------------------------------------
+# - 不正な指定は「該当なし」の 200 ではなく 400 で返すことを確かめる
+# - ナレッジベースは conftest の temp_data を共有する（読み込みは 1 回）
+# ------------------------------------------------------------
+
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import pytest
+
+from alloy_rag.api import AlloyAPI
+from alloy_rag.response_cache import ResponseCache
+
+
+@pytest.fixture
+def api(engine_for) -> AlloyAPI:
+    api = AlloyAPI(cache=ResponseCache())
+    api.rag = engine_for("temp_data")
+    return api
+
+
+def call(
+    api: AlloyAPI, method: str, path: str, query: str = "", body: Optional[Dict[str, Any]] = None
+) -> Tuple[int, Any]:
+    sent = []
+    messages = [{"type": "http.request", "body": json.dumps(body).encode() if body else b""}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode()}
+    asyncio.run(api(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.mark.parametrize("limit", ["0", "-1"])
+@pytest.mark.parametrize("path", ["/strength", "/select", "/similar"])
+def test_limit_below_one_is_rejected(api, path, limit):
+    query = f"limit={limit}" + ("&alloy=A7075-T6" if path == "/similar" else "")
+    status, body = call(api, "GET", path, query)
+    assert status == 400
+    assert body["error"]
+
+
+@pytest.mark.parametrize(
+    "path, query",
+    [
+        ("/strength", "min=400&limit=1"),
+        ("/select", "objective=tensile&limit=1"),
+        ("/similar", "alloy=A7075-T6&limit=1"),
+    ],
+)
+def test_limit_one(api, path, query):
+    status, body = call(api, "GET", path, query)
+    assert status == 200
+    assert len(body["results"]) == 1
+
+
+def test_engine_rejects_limit_below_one(engine_for):
+    rag = engine_for("temp_data")
+    with pytest.raises(ValueError):
+        rag.get_alloy_by_strength(400, 0)
+    with pytest.raises(ValueError):
+        rag.select_materials(limit=-1)
+
+
+def test_query_cache_hit_skips_query(api, monkeypatch):
+    # 2 回目はキャッシュから返し、検索（rag.query）を呼ばない
+    rag = api.rag
+    calls = []
+    query = rag.query
+    monkeypatch.setattr(rag, "query", lambda *a: calls.append(a[0]) or query(*a))
+    first = call(api, "POST", "/query", body={"q": "A6061-T6 の詳細"})
+    second = call(api, "POST", "/query", body={"q": "A6061-T6 の詳細"})
+    assert first == second
+    assert first[0] == 200
+    assert calls == ["A6061-T6 の詳細"]
+
+
+def test_query_cache_hit_keeps_session_context(api):
+    # キャッシュから返した回答も会話の文脈に残り、続く追質問に答えられる
+    call(api, "POST", "/query", body={"q": "A6061-T6 の詳細"})
+    status, body = call(api, "POST", "/query", body={"q": "A6061-T6 の詳細", "session": "s"})
+    assert status == 200
+    status, body = call(api, "POST", "/query", body={"q": "その耐力は？", "session": "s"})
+    assert status == 200
+    assert body["followup"] is not None
@@ -0,0 +1,101 @@
+# ------------------------------------------------------------
+# 回答の回帰検査（振り分けた意図・構造化データ・Markdown を期待値と比較）
+# ------------------------------------------------------------
+# - 期待値は golden/<ワークブック>.json。--update-golden で現在の回答から書き直す
+# - 浮動小数は有効数字 6 桁に丸めて比べる（BLAS などによる末尾の桁の揺れを無視）
+# ------------------------------------------------------------
+
+import difflib
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from alloy_rag.conversation import ConversationContext
+from alloy_rag.renderers import render_markdown, to_json
+from conftest import WORKBOOKS
+from corpus import QUERIES, SESSIONS
+
+# 失敗時に表示する差分の行数の上限
+MAX_DIFF_LINES = 60
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, float):
+        return float(f"{value:.6g}")
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def answer(rag, q: str, context: Optional[ConversationContext] = None) -> Dict[str, Any]:
+    # process_query と同じ回答を、振り分け・構造化データ・Markdown の 3 つで記録する
+    followup = rag.followup_for(q, context)
+    intent = f"followup.{followup.kind}" if followup else rag.router.route(q).intent
+    result = rag.query(q, context)
+    return {
+        "intent": intent,
+        "result": _normalize(json.loads(json.dumps(to_json(result, rag)))),
+        "markdown": render_markdown(result, rag),
+    }
+
+
+def _diff(expected: str, actual: str) -> str:
+    lines = list(
+        difflib.unified_diff(
+            expected.splitlines(), actual.splitlines(), "expected", "actual", lineterm=""
+        )
+    )
+    if len(lines) > MAX_DIFF_LINES:
+        lines = lines[:MAX_DIFF_LINES] + [f"...（ほか {len(lines) - MAX_DIFF_LINES} 行）"]
+    return "\n".join(lines)
+
+
+def _check(label: str, expected: Optional[Dict[str, Any]], actual: Dict[str, Any]):
+    if expected is None:
+        pytest.fail(f"{label}: 期待値がありません（--update-golden で作成）")
+    problems: List[str] = []
+    if actual["intent"] != expected["intent"]:
+        problems.append(f"意図: {expected['intent']} -> {actual['intent']}")
+    if actual["result"] != expected["result"]:
+        problems.append(
+            "構造化データ:\n"
+            + _diff(
+                json.dumps(expected["result"], ensure_ascii=False, indent=1),
+                json.dumps(actual["result"], ensure_ascii=False, indent=1),
+            )
+        )
+    if actual["markdown"] != expected["markdown"]:
+        problems.append("Markdown:\n" + _diff(expected["markdown"], actual["markdown"]))
+    if problems:
+        pytest.fail(f"{label}: 回答が期待値と異なります\n" + "\n".join(problems))
+
+
+@pytest.mark.parametrize("q", QUERIES)
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_query(engine_for, golden, request, workbook, q):
+    actual = answer(engine_for(workbook), q)
+    entries = golden[workbook].setdefault("queries", {})
+    if request.config.getoption("update_golden", default=False):
+        entries[q] = actual
+        return
+    _check(f"[{workbook}] {q}", entries.get(q), actual)
+
+
+@pytest.mark.parametrize("session", list(SESSIONS))
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_session(engine_for, golden, request, workbook, session):
+    rag = engine_for(workbook)
+    context = ConversationContext()
+    actual = [answer(rag, q, context) for q in SESSIONS[session]]
+    entries = golden[workbook].setdefault("sessions", {})
+    if request.config.getoption("update_golden", default=False):
+        entries[session] = actual
+        return
+    expected = entries.get(session)
+    if expected is None or len(expected) != len(actual):
+        pytest.fail(f"[{workbook}] {session}: 期待値がありません（--update-golden で作成）")
+    for q, e, a in zip(SESSIONS[session], expected, actual):
+        _check(f"[{workbook}] {session}: {q}", e, a)
@@ -0,0 +1,66 @@
+# ------------------------------------------------------------
+# ナレッジベース・レジストリ（共有・返却・読み込み失敗からの作り直し）
+# ------------------------------------------------------------
+# - 実際のワークブックは読まず、load_error と loaded だけを持つ代わりのオブジェクトで確かめる
+# ------------------------------------------------------------
+
+import threading
+from typing import List, Optional
+
+from alloy_rag.kb_registry import KnowledgeBaseRegistry
+
+
+class _BackgroundKB:
+    # AluminumAlloyRAG(background=True) と同じく、コンストラクタはすぐに戻り、
+    # 読み込みの失敗は後から load_error に現れる
+    def __init__(self, path: str, base=None):
+        self.path = path
+        self.load_error: Optional[Exception] = None
+        self.loaded = threading.Event()
+
+    def fail(self):
+        self.load_error = OSError("壊れたワークブック")
+        self.loaded.set()
+
+
+def _registry(built: List[_BackgroundKB], evicted: Optional[List[str]] = None):
+    def factory(path, base=None):
+        kb = _BackgroundKB(path, base)
+        built.append(kb)
+        return kb
+
+    return KnowledgeBaseRegistry(factory, on_evict=None if evicted is None else evicted.append)
+
+
+def test_shared_until_released():
+    built: List[_BackgroundKB] = []
+    registry = _registry(built)
+    a = registry.acquire("a.xlsx", content_hash="a")
+    b = registry.acquire("a.xlsx", content_hash="a")
+    assert a.kb is b.kb and len(built) == 1
+    assert registry.stats()["a"]["refcount"] == 2
+    a.release()
+    b.release()
+    assert registry.stats()["a"]["refcount"] == 0
+
+
+def test_background_failure_is_rebuilt():
+    built: List[_BackgroundKB] = []
+    evicted: List[str] = []
+    registry = _registry(built, evicted)
+    first = registry.acquire("data.xlsx", content_hash="h", pinned=True)
+    # 貸し出した後にバックグラウンド読み込みが失敗する
+    first.kb.fail()
+
+    second = registry.acquire("data.xlsx", content_hash="h")
+    assert second.kb is not first.kb
+    assert second.kb.load_error is None
+    assert len(built) == 2
+    assert evicted == ["h"]
+    # 作り直したエントリは固定（pinned）を引き継ぎ、失敗した方の返却は数に入らない
+    first.release()
+    assert registry.stats()["h"] == {"refcount": 1, "pinned": True, "ready": True}
+
+    # 作り直したものが読み込めていれば、以降は使い回す
+    third = registry.acquire("data.xlsx", content_hash="h")
+    assert third.kb is second.kb and len(built) == 2
@@ -0,0 +1,95 @@
+# ------------------------------------------------------------
+# 意図ごとのレイテンシ予算（process_query の p50）
+# ------------------------------------------------------------
+# - コーパスの質問を意図ごとにまとめ、1 回空打ちしてから REPEAT 回ずつ計測する
+# - 予算は latency_budget.json（ワークブック -> 意図 -> p50_ratio）。絶対値の ms ではなく、
+#   同じ回に測る較正用の固定の処理（calibrate）の p50 に対する倍率で持つ。
+#   機械の速さの差は較正の時間に出るので、別のマシンでもそのまま検査できる
+# - 検査の予算は max(倍率 × 今回の較正 ms, MIN_BUDGET_MS) × --latency-scale。
+#   --update-budgets で計測値 × HEADROOM の倍率に書き直す
+# - 予算の無い意図（コーパスに質問を足した直後など）は失敗にする
+# ------------------------------------------------------------
+
+import re
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from conftest import WORKBOOKS
+from corpus import QUERIES
+
+REPEAT = 15
+
+# --update-budgets 時に計測値へ掛ける余裕（較正で吸収しきれない機械差・揺れの分）
+HEADROOM = 3.0
+# 予算の下限。1 ms 未満の処理は計測の揺れが大きいので、倍率だけでは判定しない
+MIN_BUDGET_MS = 5.0
+
+# 較正用の固定の処理：正規化・正規表現・辞書（ルーター・索引の引き当て）と
+# NumPy の配列演算（列ストア・類似検索）を混ぜたもの
+_CALIBRATION_RE = re.compile(r"[\s\-]+")
+_rng = np.random.default_rng(0)
+_CALIBRATION_WORDS = [f"a{n:04d} - t{n % 9}" for n in _rng.integers(0, 10000, 4000)]
+_CALIBRATION_VALUES = _rng.random(50000)
+
+
+def _calibration_work() -> float:
+    counts: Dict[str, int] = {}
+    for w in _CALIBRATION_WORDS:
+        key = _CALIBRATION_RE.sub("", w.upper())
+        counts[key] = counts.get(key, 0) + 1
+    order = np.argsort(_CALIBRATION_VALUES, kind="stable")
+    return len(counts) + float(_CALIBRATION_VALUES[order[-10:]].sum())
+
+
+def calibrate() -> float:
+    # 較正の処理の p50（ms）
+    _calibration_work()
+    samples = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        _calibration_work()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples)
+
+
+def measure(rag) -> Dict[str, float]:
+    samples: Dict[str, List[float]] = {}
+    for q in QUERIES:
+        intent = rag.router.route(q).intent
+        rag.process_query(q)
+        for _ in range(REPEAT):
+            t0 = time.perf_counter()
+            rag.process_query(q)
+            samples.setdefault(intent, []).append((time.perf_counter() - t0) * 1000.0)
+    return {intent: statistics.median(ms) for intent, ms in sorted(samples.items())}
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_latency_budget(engine_for, budgets, request, workbook):
+    rag = engine_for(workbook)
+    calibration_ms = calibrate()
+    p50 = measure(rag)
+    if request.config.getoption("update_budgets", default=False):
+        budgets[workbook] = {
+            intent: {"p50_ratio": round(ms * HEADROOM / calibration_ms, 2)}
+            for intent, ms in p50.items()
+        }
+        return
+
+    scale = request.config.getoption("latency_scale", default=1.0)
+    limits = budgets.get(workbook, {})
+    over = []
+    for intent, ms in p50.items():
+        if intent not in limits:
+            over.append(f"{intent}: 予算がありません（--update-budgets で作成）")
+            continue
+        budget = max(limits[intent]["p50_ratio"] * calibration_ms, MIN_BUDGET_MS) * scale
+        if ms > budget:
+            over.append(f"{intent}: p50 {ms:.2f} ms > 予算 {budget:.1f} ms")
+    assert not over, (
+        f"[{workbook}] レイテンシ予算の超過（較正 {calibration_ms:.2f} ms）\n" + "\n".join(over)
+    )
@@ -0,0 +1,24 @@
+# ------------------------------------------------------------
+# 応答キャッシュ（メモリ層 + ディスク層）の破棄
+# ------------------------------------------------------------
+
+from alloy_rag.response_cache import ResponseCache
+
+
+def test_invalidate_memory_only_keeps_disk(tmp_path):
+    # ナレッジベースをメモリから追い出しても、ディスク層の回答は読み直し後に使える
+    cache = ResponseCache(disk_path=str(tmp_path / "responses.db"))
+    cache.put("wb", "T6とは？", "answer")
+    cache.invalidate("wb", disk=False)
+    assert cache.stats()["entries"] == 0
+    assert cache.get("wb", "T6とは？") == "answer"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_invalidate_drops_disk(tmp_path):
+    cache = ResponseCache(disk_path=str(tmp_path / "responses.db"))
+    cache.put("wb", "T6とは？", "answer")
+    cache.put("other", "T6とは？", "other answer")
+    cache.invalidate("wb")
+    assert cache.get("wb", "T6とは？") is None
+    assert cache.get("other", "T6とは？") == "other answer"
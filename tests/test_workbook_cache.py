@@ -0,0 +1,52 @@
+# ------------------------------------------------------------
+# 列指向スナップショットの往復（初回のパースと 2 回目のスナップショット読み込みで同じ値・型）
+# ------------------------------------------------------------
+
+import datetime
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+
+from alloy_rag.workbook_cache import _decode_scalar, _encode_scalar, read_workbook, snapshot_root
+
+
+def _cells(df: pd.DataFrame):
+    return [[(type(v), v) for v in row] for row in df.itertuples(index=False)]
+
+
+def test_snapshot_round_trip_keeps_cell_types(tmp_path: Path):
+    # 日付と文字列が混ざった列は object 列になり、openpyxl の datetime / time がそのまま入る
+    path = tmp_path / "dates.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "改訂履歴"
+    ws.append(["版", "日付", "時刻", "備考"])
+    ws.append([1, datetime.datetime(2024, 4, 1, 9, 30), datetime.time(9, 30), "初版"])
+    ws.append([2, "未定", datetime.time(17, 0, 5), 1.5])
+    ws.append([3, datetime.datetime(2025, 1, 15), "—", None])
+    wb.save(path)
+
+    cold, content_hash, _ = read_workbook(str(path))
+    assert snapshot_root(str(path)).is_dir()
+    warm, warm_hash, _ = read_workbook(str(path))
+
+    assert warm_hash == content_hash
+    assert list(warm) == list(cold)
+    for name, df in cold.items():
+        assert list(warm[name].columns) == list(df.columns)
+        assert _cells(warm[name]) == _cells(df)
+    assert isinstance(warm["改訂履歴"]["日付"][0], datetime.datetime)
+    assert isinstance(warm["改訂履歴"]["時刻"][0], datetime.time)
+
+
+def test_scalar_round_trip_keeps_date_types():
+    for value in (
+        datetime.date(2024, 4, 1),
+        datetime.datetime(2024, 4, 1, 9, 30, 15, 250),
+        datetime.time(23, 59, 59),
+        pd.Timestamp("2024-04-01 09:30"),
+    ):
+        decoded = _decode_scalar(*_encode_scalar(value))
+        assert type(decoded) is type(value)
+        assert decoded == value